@@ -54,7 +54,7 @@ setup(
     packages=find_packages('src'),
     package_dir={'': 'src'},
     package_data={
-        "rng2doc": ["schemas/*.rng", "xslt/*.xslt"],
+        "rng2doc": ["schemas/*.rng", "xslt/*.xslt", "js/*.js"],
     },
     py_modules=[splitext(basename(path))[0] for path in glob('src/*.py')],
     include_package_data=True,
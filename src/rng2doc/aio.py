@@ -0,0 +1,275 @@
+"""Creating the documentation without blocking an asyncio event loop
+
+The graphviz layouts run as asyncio subprocesses and the transformations
+in an executor, so the event loop stays free for other tasks while
+:func:`iterparse` yields the documentation of every element.
+
+.. code-block:: python
+
+    async for result in iterparse("foo.rng", concurrency=4):
+        print(result.key)
+"""
+
+# Standard Library
+import asyncio
+import logging
+import os
+import subprocess
+from collections import Counter, namedtuple
+from functools import partial
+
+# Third Party Libraries
+from lxml import etree
+
+# Local imports
+from .common import RNG_ELEMENT
+from .ir import Schema
+from .render import layout_attempts
+from .rng import (attribute_groups,
+                  define_graph,
+                  element_graph,
+                  finish_job,
+                  load_schema,
+                  prepare_job,
+                  select_elements,
+                  select_subset,
+                  share_values)
+from .transforms.xml import XML
+
+LOG = logging.getLogger(__name__)
+
+
+class Result(namedtuple("Result", ["position", "key", "node"])):
+    """The finished documentation node of an element or define
+
+    position is the place of the node in the documentation of
+    :func:`rng2doc.rng.parse`, key is "element:<id>", "define:<name>" or
+    "attribute-group:<name>".
+    """
+    __slots__ = ()
+
+
+async def run_layout(graph, prog, timeout=None):
+    """Runs a graphviz layout engine on a graph in an asyncio subprocess
+
+    The subprocess is killed, if it runs out of time or the task is
+    cancelled.
+
+    :param graph: The graph which should be rendered
+    :type graph: pydot.Dot
+    :param str prog: The graphviz program (dot, twopi, ...)
+    :param timeout: The maximum number of seconds for the layout
+    :type timeout: float
+    :raises: :class:`subprocess.TimeoutExpired`, :class:`RuntimeError`
+    :return: The SVG output of graphviz
+    :rtype: bytes
+    """
+    process = await asyncio.create_subprocess_exec(
+        prog, "-Tsvg", stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(graph.to_string().encode("utf-8")), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired([prog, "-Tsvg"], timeout)
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode:
+        raise RuntimeError("{} failed: {}".format(
+            prog, stderr.decode("utf-8", "replace").strip()))
+    return stdout
+
+
+async def render_svg(graph, **kwargs):
+    """Renders a pydot graph into a SVG element like
+    :func:`rng2doc.render.render_svg`, but with :func:`run_layout`
+
+    :param graph: The graph which should be rendered
+    :type graph: pydot.Dot
+    :param kwargs: Options for the rendering
+    :return: The SVG root element without fixed dimensions, its
+             serialization or None
+    :rtype: etree.Element or bytes
+    """
+    attempts = layout_attempts(graph, **kwargs)
+    try:
+        layout = next(attempts)
+        while True:
+            try:
+                output = await run_layout(*layout)
+            except subprocess.TimeoutExpired as error:
+                layout = attempts.throw(error)
+            else:
+                layout = attempts.send(output)
+    except StopIteration as stop:
+        return stop.value
+
+
+def load_elements(rngfile, **kwargs):
+    """Loads a RNG file and selects the elements like :func:`rng2doc.rng.parse`
+
+    :param rngfile: path to the RNG file (in XML format)
+    :type rngfile: str
+    :param kwargs: Options for the selection
+    :return: The schema, the selected elements and if other elements
+             have the same name
+    :rtype: tuple
+    """
+    rngtree = load_schema(rngfile, simplify=kwargs.pop("simplify", False),
+                          cache_dir=kwargs.pop("cache_dir", None),
+                          large_input=kwargs.pop("large_input", False))
+    schema = Schema(rngtree)
+    subset = select_subset(schema, prune=kwargs.pop("prune", False),
+                           roots=kwargs.pop("roots", None), elements=kwargs.pop("elements", None))
+    elements, names = select_elements(rngtree, kwargs.pop("stable_ids", False),
+                                      kwargs.pop("shard", None), subset)
+    dupes = [names[element.get("name", "anyName")] > 1 for element in elements]
+    return schema, elements, dupes
+
+
+async def iterparse(rngfile, **kwargs):
+    """Creates the documentation of a RNG file and yields the node of
+    every element and define as soon as it is finished, and the attribute
+    groups after them
+
+    The keyword concurrency is the number of graphviz subprocesses, which
+    run at the same time (defaults to the number of CPUs). The schema is
+    loaded and the elements are transformed in the keyword executor (None
+    uses the default executor of the event loop), one after another. Every
+    diagram is rendered once like in :func:`rng2doc.rng.parse`, a failed
+    element or define gets an error node.
+
+    The keywords ref_depth, max_values, attribute_groups, stable_ids,
+    shard, simplify, cache_dir, large_input, prune, roots, elements, summary
+    and fragments are the same as in :func:`rng2doc.rng.parse`, all other
+    keywords are passed on to :func:`render_svg`.
+
+    :param rngfile: path to the RNG file (in XML format)
+    :type rngfile: str
+    :param kwargs: Options for the transformation
+    :return: The finished nodes in the order they are finished
+    :rtype: async iterator of :class:`Result`
+    """
+    # get_event_loop returns the running loop in a coroutine and, unlike
+    # get_running_loop, exists in Python 3.6
+    loop = asyncio.get_event_loop()
+    executor = kwargs.pop("executor", None)
+    semaphore = asyncio.Semaphore(kwargs.pop("concurrency", None) or os.cpu_count() or 1)
+    ref_depth = kwargs.pop("ref_depth", None)
+    max_values = kwargs.pop("max_values", None)
+    grouped = kwargs.pop("attribute_groups", False)
+    summary = kwargs.get("summary")
+    fragments = kwargs.get("fragments")
+    selection = dict((option, kwargs.pop(option)) for option in (
+        "stable_ids", "shard", "simplify", "cache_dir", "large_input", "prune", "roots",
+        "elements") if option in kwargs)
+    # Checkpoints and threads only exist in the blocking API
+    for option in ("workdir", "resume", "threads", "workers"):
+        kwargs.pop(option, None)
+    options = dict((key, value) for key, value in kwargs.items()
+                   if key not in ("summary", "fragments"))
+
+    queue = asyncio.Queue()
+    renders = {}
+    diagrams = {}
+    finished = []
+
+    async def render(graph):
+        async with semaphore:
+            counter = Counter()
+            try:
+                svg = await render_svg(graph, fragment=fragments is not None,
+                                       summary=counter, **options)
+            except Exception as error:
+                svg = error
+        if summary is not None:
+            summary.update(counter)
+        return svg
+
+    async def finish(position, job):
+        if job.graph is not None:
+            svg = await renders[job.digest]
+            node = finish_job(job, diagrams, rendered={job.digest: svg}, **kwargs)
+        else:
+            node = job.node
+        if selection.get("shard") is not None and job.refs:
+            # Lets merge put the defines in the order of a complete run
+            node.attrib["refs"] = " ".join(job.refs)
+        finished.append(node)
+        await queue.put(Result(position, job.key, node))
+
+    async def produce():
+        finishers = []
+        try:
+            schema, elements, dupes = await loop.run_in_executor(
+                executor, partial(load_elements, rngfile, **selection))
+            groups = None
+            if grouped:
+                groups = await loop.run_in_executor(executor, schema.attribute_defines)
+            builds = [("element:" + element.get("id"),
+                       partial(element_graph, schema.pattern(element), dupe,
+                               ref_depth=ref_depth, max_values=max_values, groups=groups),
+                       XML[RNG_ELEMENT](element, root=True, dupe=dupe))
+                      for element, dupe in zip(elements, dupes)]
+            # The list grows with the collapsed defines, which follow the
+            # elements in the order of their first reference like in parse
+            refs = []
+            for position, (key, build, placeholder) in enumerate(builds):
+                job = await loop.run_in_executor(
+                    executor, partial(prepare_job, key, build, placeholder, {},
+                                      summary=summary))
+                if job.graph is not None and job.digest not in renders:
+                    renders[job.digest] = loop.create_task(render(job.graph))
+                finishers.append(loop.create_task(finish(position, job)))
+                for name in job.refs:
+                    if name not in refs:
+                        refs.append(name)
+                        builds.append(("define:" + name,
+                                       partial(define_graph, schema.defines[name],
+                                               ref_depth=ref_depth, max_values=max_values),
+                                       etree.Element("define", name=name)))
+            await asyncio.gather(*finishers)
+            if groups is not None:
+                nodes = await loop.run_in_executor(
+                    executor, partial(attribute_groups, finished, schema, groups, summary))
+                for position, node in enumerate(nodes, len(builds)):
+                    await queue.put(Result(position, "attribute-group:" + node.get("name"),
+                                           node))
+        finally:
+            await queue.put(None)
+
+    producer = loop.create_task(produce())
+    try:
+        while True:
+            result = await queue.get()
+            if result is None:
+                break
+            yield result
+        # Raises the error of the producer, if any
+        await producer
+    finally:
+        for task in [producer] + list(renders.values()):
+            task.cancel()
+
+
+async def parse(rngfile, **kwargs):
+    """Reads a RNG file and transforms it to the XML documentation like
+    :func:`rng2doc.rng.parse` without blocking the event loop
+
+    :param rngfile: path to the RNG file (in XML format)
+    :type rngfile: str
+    :param kwargs: Options for :func:`iterparse`
+    :return: The ElementTree of the new XML document
+    :rtype: etree.ElementTree
+    """
+    shard = kwargs.get("shard")
+    results = [result async for result in iterparse(rngfile, **kwargs)]
+    documentation = etree.Element("documentation")
+    if shard is not None:
+        documentation.attrib["shard"] = "{}/{}".format(*shard)
+    for result in sorted(results):
+        documentation.append(result.node)
+    return etree.ElementTree(share_values(documentation))
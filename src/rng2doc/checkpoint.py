@@ -0,0 +1,145 @@
+"""Checkpoints of finished elements to resume interrupted runs
+"""
+
+# Standard Library
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+# Third Party Libraries
+from lxml import etree
+
+# Local imports
+from . import __version__
+from .writer import write_file
+
+LOG = logging.getLogger(__name__)
+
+#: The file which identifies the run of a work directory
+MANIFEST = "manifest.json"
+
+#: The directory of the checkpoints in the work directory
+CHECKPOINTS = "checkpoints"
+
+
+def fingerprint(rngfile, options, dependencies=()):
+    """Identifies a run by its input files and its options
+
+    :param str rngfile: path to the RNG file
+    :param dict options: The options of the run
+    :param dependencies: The paths of the files, which the RNG file
+                         includes (see :func:`rng2doc.simplify.simplify`)
+    :type dependencies: list(str)
+    :return: The fingerprint of the run
+    :rtype: str
+    """
+    digest = hashlib.sha256(__version__.encode("utf-8"))
+    for path in [rngfile] + list(dependencies):
+        digest.update(path.encode("utf-8") + b"\0")
+        with open(path, "rb") as rng:
+            for chunk in iter(lambda: rng.read(1 << 16), b""):
+                digest.update(chunk)
+    digest.update(json.dumps(options, sort_keys=True, default=repr).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def prepare_workdir(workdir, rngfile, options, resume=False, dependencies=()):
+    """Prepares the work directory for a run
+
+    The checkpoints of a previous run are kept, if the run should be
+    resumed and neither the input files nor the options changed.
+    Otherwise they are removed.
+
+    :param str workdir: The work directory
+    :param str rngfile: path to the RNG file
+    :param dict options: The options of the run
+    :param bool resume: Resume the previous run
+    :param dependencies: The paths of the files, which the RNG file includes
+    :type dependencies: list(str)
+    :return: True if the checkpoints can be used
+    :rtype: bool
+    """
+    current = fingerprint(rngfile, options, dependencies)
+    manifest = os.path.join(workdir, MANIFEST)
+    try:
+        with open(manifest) as manifestfile:
+            previous = json.load(manifestfile).get("fingerprint")
+    except (OSError, ValueError):
+        previous = None
+
+    if resume and previous == current:
+        LOG.info("Resuming from %r", workdir)
+        return True
+    if resume:
+        LOG.warning("Cannot resume from %r, the input or the options changed", workdir)
+    shutil.rmtree(os.path.join(workdir, CHECKPOINTS), ignore_errors=True)
+    write_file(manifest, json.dumps(dict(fingerprint=current, input=str(rngfile)),
+                                    indent=2).encode("utf-8"))
+    return False
+
+
+def checkpoint_path(workdir, key):
+    """Returns the path of the checkpoint for a key
+    """
+    name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(workdir, CHECKPOINTS, name[:2], name + ".xml")
+
+
+def has_checkpoint(workdir, key):
+    """Checks if there is a checkpoint for a key
+
+    :param str workdir: The work directory
+    :param str key: The unique key of the result
+    :rtype: bool
+    """
+    return os.path.exists(checkpoint_path(workdir, key))
+
+
+def save_checkpoint(workdir, key, node, digest, refs, fragment=None):
+    """Saves the result of an element or define
+
+    :param str workdir: The work directory
+    :param str key: The unique key of the result
+    :param node: The documentation node
+    :type node: etree.Element
+    :param str digest: The hash of the graph
+    :param refs: The names of the collapsed defines
+    :type refs: list(str)
+    :param bytes fragment: The serialized SVG or the DOT source, if any
+    :return: None
+    """
+    record = etree.Element("checkpoint", key=key, digest=digest)
+    for name in refs:
+        etree.SubElement(record, "ref", name=name)
+    record.append(node)
+    if fragment is not None:
+        etree.SubElement(record, "fragment").text = base64.b64encode(fragment)
+    write_file(checkpoint_path(workdir, key), etree.tostring(record, encoding="utf-8"))
+    # The node stays part of the documentation
+    record.remove(node)
+
+
+def load_checkpoint(workdir, key):
+    """Loads the result of an element or define
+
+    :param str workdir: The work directory
+    :param str key: The unique key of the result
+    :return: The documentation node, the hash of the graph, the names of the
+             collapsed defines and the serialized SVG or None
+    :rtype: tuple
+    """
+    try:
+        record = etree.parse(checkpoint_path(workdir, key)).getroot()
+    except (OSError, etree.XMLSyntaxError):
+        return None
+    if record.get("key") != key:
+        return None
+    refs = [ref.get("name") for ref in record.iterchildren("ref")]
+    fragment = record.find("fragment")
+    if fragment is not None:
+        fragment = base64.b64decode(fragment.text)
+    node = next(child for child in record if child.tag not in ("ref", "fragment"))
+    return node, record.get("digest"), refs, fragment
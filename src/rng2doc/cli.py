@@ -2,10 +2,16 @@
 
 Usage:
     rng2doc [-h | --help]
+    rng2doc merge [-v ...] [options] PARTIAL...
+    rng2doc inject [-v ...] [options] MANIFEST
+    rng2doc serve [-v ...] [options] RNGFILE
     rng2doc [-v ...] [options] RNGFILE
 
 Required Arguments:
     RNGFILE          Path to RELAX NG file (file extension .rng)
+    PARTIAL          XML documentation of a shard (see --shard)
+    MANIFEST         The dot/manifest.json of the dot output format, whose
+                     graphs were rendered into SVG files next to them
 
 Options:
     -h, --help        Shows this help
@@ -18,14 +24,106 @@ Options:
     --output=<OUTFILE>, -o <OUTFILE>
                       Optional file where results are written to
     --output-format=<FORMAT>, -f <FORMAT>
-                      Specifies the format of the output. (xml, html) [default: xml]
+                      Specifies the format of the output. (xml, html, dot)
+                      The dot format writes the XML documentation and the
+                      graphs with a manifest into the dot directory next to
+                      it without rendering them, see "inject".
+                      [default: xml]
+    --ref-depth=<DEPTH>
+                      Stop expanding references in the diagrams after DEPTH
+                      levels and link to a separate define diagram instead.
+                      0 stops at every rng:ref.
+    --max-nodes=<NODES>
+                      Truncate diagrams with more than NODES nodes and mark
+                      the cut with a "more..." node.
+    --max-values=<N>  Show a choice of more than N values as a single node in
+                      the diagrams and list its values once on their own
+                      HTML pages.
+    --attribute-groups
+                      Document the attributes of a define, which only
+                      contains attributes, once as an attribute group, which
+                      the elements refer to.
+    --render-timeout=<SECONDS>
+                      Maximum time for the layout of a single diagram. When
+                      it is exceeded, the fallback layout is tried and after
+                      that the diagram is omitted.
+    --fallback-layout=<PROG>
+                      The graphviz layout engine used after a timeout.
+                      (twopi, neato, sfdp, circo, fdp, none)
+                      [default: twopi]
+    --external-svg    Write every diagram once into its own file in the svg
+                      directory next to the output and show it in the HTML
+                      pages with an object instead of embedding it.
+    --optimize-svg    Minify the diagrams: remove comments, titles and unused
+                      ids, round the coordinates and merge repeated styles
+                      into classes.
+    --svg-precision=<DIGITS>
+                      Number of decimals of the coordinates in optimized
+                      diagrams. [default: 2]
+    --svg-fragments   Keep the diagrams serialized and splice them into the
+                      output instead of parsing each of them.
+    --search-index    Write a search index of the element and attribute
+                      names, values and descriptions for the HTML output
+                      and add a search box to the index page.
+    --index-size=<N>  Split the HTML index into pages of at most N elements
+                      per first letter, linked from a short landing page.
+    --profile-xslt    Profile the HTML stylesheet and write the number of
+                      calls and the time of every template as a table and as
+                      XML next to the output.
+    --compress=<FORMATS>
+                      Write precompressed siblings of the HTML, SVG and
+                      script files for a comma separated list of formats.
+                      (gz, br)
+    --stable-ids      Derive the element ids from the element name, define
+                      and structural path instead of the position, so they
+                      do not change when other elements are added.
+    --shard=<I/N>     Only transform and render the I-th of N shards of the
+                      elements (counting from 0) into XML documentation. The
+                      "merge" command combines the XML documentation of all
+                      shards into the complete output.
+    --workdir=<DIR>   Save a checkpoint of every finished element and define
+                      diagram in DIR.
+    --resume          Reuse the checkpoints in the --workdir of an
+                      interrupted run, if the input and the options did not
+                      change, and only transform the remaining elements.
+    --jobs=<N>, -j <N>
+                      Number of diagrams rendered in parallel, the most
+                      expensive first. [default: 1]
+    --workers=<N>     Create the XML documentation of the elements in N
+                      worker processes.
+    --simplify        Simplify the grammar first: resolve includes, flatten
+                      divs, merge combined defines and replace references
+                      to defines without elements by their content.
+    --cache-dir=<DIR> Keep the simplified grammars in DIR and reuse them
+                      while the input file and its includes do not change.
+    --large-input     Read very large or deeply nested input files in
+                      chunks, without the size limits of the parser, and
+                      drop the annotations, which are not documented.
+    --prune           Only document the elements, which can be reached from
+                      the start of the grammar.
+    --root=<NAMES>    Only document the elements, which can be reached from
+                      the elements with one of these comma separated names.
+    --elements=<NAMES>
+                      Only document the elements with one of these comma
+                      separated names.
+    --dry-run         Print the estimated cost of every element diagram
+                      (nodes, depth, choice width) without rendering.
+    --port=<PORT>     The port on localhost for the "serve" command, which
+                      creates the HTML pages when they are requested.
+                      [default: 8000]
+    --cache-size=<PAGES>
+                      Number of pages the "serve" command keeps. [default: 128]
+    --warm=<PAGES>    Let the "serve" command create the pages of this many
+                      elements with the most parents before it starts.
 """
 
 # Standard Library
 import logging
 import os
 import sys
+import tempfile
 import time
+from collections import Counter
 from logging.config import dictConfig
 from pkg_resources import resource_filename
 
@@ -35,12 +133,25 @@ from lxml import etree
 
 # Local imports
 from . import __version__
-from .common import DEFAULT_LOGGING_DICT, LOGLEVELS, errorcode
-from .rng import parse
+from .common import DEFAULT_LOGGING_DICT, LOGLEVELS, SVG_SVG, errorcode
+from .dot import inject_svg, write_graphs
+from .exceptions import IncompleteDocumentationError
+from .rng import estimate, merge, parse
+from .render import FALLBACK_LAYOUTS
+from .search import SEARCH_DIR, write_search_index
+from .serve import serve
+from .writer import COMPRESSIONS, sync_tree, write_file
 
 #: Use __package__, not __name__ here to set overall LOGging level:
 LOG = logging.getLogger(__package__)
 
+#: libxslt measures the time of the templates in ticks of 10 microseconds
+PROFILE_TICKS_PER_MS = 100
+
+#: The subdirectories of the HTML directory, which hold only staged files, so
+#: their files of removed elements or defines are deleted
+GENERATED_DIRS = ("elements", "defines", "index", "values", "groups", "svg", SEARCH_DIR)
+
 
 def parsecli(cliargs=None):
     """Parse CLI arguments with docopt
@@ -67,44 +178,344 @@ def checkargs(args):
     :raises: :class:`docopt.DocoptExit`, :class:`FileNotFoundError`
     :return:
     """
-    rng = args['RNGFILE']
-    if rng is None:
-        raise DocoptExit()
-    if not os.path.exists(rng):
-        raise FileNotFoundError(rng)
+    if args.get('merge'):
+        for partial in args['PARTIAL']:
+            if not os.path.exists(partial):
+                raise FileNotFoundError(partial)
+    elif args.get('inject'):
+        if not os.path.exists(args['MANIFEST']):
+            raise FileNotFoundError(args['MANIFEST'])
+    else:
+        rng = args['RNGFILE']
+        if rng is None:
+            raise DocoptExit()
+        if not os.path.exists(rng):
+            raise FileNotFoundError(rng)
     oformat = args['--output-format'].lower()
-    if oformat not in ('html', 'xml'):
+    if oformat not in ('html', 'xml', 'dot'):
         raise RuntimeError("Wrong format.")
+    if oformat == 'dot':
+        if args.get('merge') or args.get('inject') or args.get('serve'):
+            raise RuntimeError("The dot output format needs a RNGFILE.")
+        if not args.get('--output'):
+            raise RuntimeError("The dot output format needs an --output file.")
+    shard = args.get('--shard')
+    if shard is not None:
+        index, _, count = shard.partition("/")
+        if not (index.isdigit() and count.isdigit() and int(index) < int(count)):
+            raise RuntimeError("--shard must be I/N with 0 <= I < N.")
+        if oformat != 'xml':
+            raise RuntimeError("A shard can only be written as XML, use merge for HTML.")
+    if args.get('--search-index') and oformat != 'html':
+        raise RuntimeError("--search-index needs the html output format.")
+    if args.get('--index-size') is not None and oformat != 'html':
+        raise RuntimeError("--index-size needs the html output format.")
+    if args.get('--profile-xslt') and (oformat != 'html' or not args.get('--output')):
+        raise RuntimeError("--profile-xslt needs the html output format and an --output file.")
+    if args.get('--cache-dir') and not args.get('--simplify'):
+        raise RuntimeError("--cache-dir needs --simplify.")
+    if args.get('--resume') and not args.get('--workdir'):
+        raise RuntimeError("--resume needs a --workdir.")
+    fallback = args.get('--fallback-layout')
+    if fallback is not None and fallback.lower() not in FALLBACK_LAYOUTS + ("none",):
+        raise RuntimeError("--fallback-layout must be one of {}, none.".format(
+            ", ".join(FALLBACK_LAYOUTS)))
+    if args.get('--external-svg') and not args.get('--output'):
+        raise RuntimeError("--external-svg needs an --output file.")
+    for option in ('--jobs', '--workers', '--cache-size', '--index-size'):
+        value = args.get(option)
+        if value is not None and not (value.isdigit() and int(value) > 0):
+            raise RuntimeError("{} must be a positive integer.".format(option))
+    for option in ('--ref-depth', '--max-nodes', '--max-values', '--svg-precision', '--port',
+                   '--warm'):
+        value = args.get(option)
+        if value is not None and not value.isdigit():
+            raise RuntimeError("{} must be a non-negative integer.".format(option))
+    compressions = args.get('--compress')
+    if compressions is not None:
+        for compression in compressions.split(","):
+            if compression not in COMPRESSIONS:
+                raise RuntimeError("Unknown compression {!r}.".format(compression))
+    timeout = args.get('--render-timeout')
+    if timeout is not None:
+        try:
+            float(timeout)
+        except ValueError:
+            raise RuntimeError("--render-timeout must be a number of seconds.")
+
+
+def splice_svg(result, fragments):
+    """Replaces the first diagram reference to every serialized SVG
+       with the parsed SVG.
+
+    :param result: The results of the transform method
+    :type result: ElementTree
+    :param fragments: The serialized SVGs by their id
+    :type fragments: dict
+    :return: The result with embedded SVGs
+    :rtype: ElementTree
+    """
+    for svg_id, fragment in fragments.items():
+        diagram = result.find(".//diagram[@ref='{}']".format(svg_id))
+        if diagram is None:
+            continue
+        svg = etree.fromstring(fragment)
+        svg.tail = diagram.tail
+        diagram.getparent().replace(diagram, svg)
+    return result
+
+
+def serialize(result, fragments):
+    """Serializes the result and splices the serialized SVGs in at the
+       first diagram reference to them.
+
+    :param result: The results of the transform method
+    :type result: ElementTree
+    :param fragments: The serialized SVGs by their id
+    :type fragments: dict
+    :return: The serialized result
+    :rtype: bytes
+    """
+    data = etree.tostring(result, pretty_print=True, xml_declaration=True, encoding="UTF-8")
+    for svg_id, fragment in fragments.items():
+        data = data.replace('<diagram ref="{}"/>'.format(svg_id).encode(), fragment, 1)
+    return data
+
+
+def externalize_svg(result, path, fragments, **kwargs):
+    """Writes every SVG of the result into its own file and replaces it
+       with a diagram reference to this file.
+
+    :param result: The results of the transform method
+    :type result: ElementTree
+    :param path: The directory which gets the svg directory
+    :type path: str
+    :param fragments: The serialized SVGs by their id
+    :type fragments: dict
+    :param kwargs: Options for :func:`rng2doc.writer.write_file`
+    :return: The result without embedded SVGs
+    :rtype: ElementTree
+    """
+    svgdir = os.path.join(path, "svg")
+    fragments = dict(fragments)
+    for svg in list(result.iter(SVG_SVG.text)):
+        fragments[svg.get("id")] = etree.tostring(svg, encoding="utf-8")
+        diagram = etree.Element("diagram", ref=svg.get("id"))
+        diagram.tail = svg.tail
+        svg.getparent().replace(svg, diagram)
+    for svg_id, fragment in fragments.items():
+        write_file(os.path.join(svgdir, "{}.svg".format(svg_id)),
+                   b'<?xml version="1.0" encoding="utf-8"?>\n' + fragment, **kwargs)
+    for diagram in result.iter("diagram"):
+        diagram.attrib["href"] = "svg/{}.svg".format(diagram.get("ref"))
+    return result
+
+
+def profile_table(profile):
+    """Formats the XSLT profile of libxslt as a table, the template with
+    the most time first
+
+    :param profile: The profile of the transformation
+    :type profile: etree.ElementTree
+    :return: The table
+    :rtype: str
+    """
+    # The tag names of the profile are not found by iterchildren("template")
+    templates = sorted((node for node in profile.getroot() if node.tag == "template"),
+                       key=lambda template: (-int(template.get("time")),
+                                             -int(template.get("calls"))))
+    lines = ["{:>10} {:>8} {:>10}  {}".format("time (ms)", "calls", "avg (ms)", "template")]
+    for template in templates:
+        time_ms = int(template.get("time")) / PROFILE_TICKS_PER_MS
+        calls = int(template.get("calls"))
+        name = template.get("name") or "match={}".format(template.get("match"))
+        if template.get("mode"):
+            name += " mode={}".format(template.get("mode"))
+        lines.append("{:>10.2f} {:>8} {:>10.3f}  {}".format(time_ms, calls,
+                                                            time_ms / (calls or 1), name))
+    total = sum(int(template.get("time")) for template in templates) / PROFILE_TICKS_PER_MS
+    lines.append("{:>10.2f} {:>8} {:>10}  {} templates".format(
+        total, sum(int(template.get("calls")) for template in templates), "",
+        len(templates)))
+    return "\n".join(lines) + "\n"
+
 
+def write_profile(profile, file_path, **kwargs):
+    """Writes the XSLT profile as a table and as XML next to the output
 
-def output(result, file_path, oformat):
+    :param profile: The profile of the transformation
+    :type profile: etree.ElementTree
+    :param str file_path: The output file, the profile files get its name
+                          with the extensions .xslt-profile.txt and
+                          .xslt-profile.xml
+    :param kwargs: Options for :func:`rng2doc.writer.write_file`
+    :return: None
+    """
+    stem = os.path.splitext(file_path)[0] + ".xslt-profile"
+    write_file(stem + ".txt", profile_table(profile).encode("utf-8"), **kwargs)
+    write_file(stem + ".xml", etree.tostring(profile, pretty_print=True, xml_declaration=True,
+                                             encoding="UTF-8"), **kwargs)
+    LOG.info("XSLT profile written to %s.txt", stem)
+
+
+def output(result, file_path, oformat, **kwargs):
     """Write the result to a file if the --output argument is set otherwise
        the result will be printed on stdout.
 
+       Files are only written if their content changed. The keyword
+       external_svg writes the diagrams into separate files, fragments
+       are the serialized SVGs by their id, search_index writes the
+       search index of the HTML pages and index_size splits the index
+       into pages of this many elements. If profile_xslt is True, the
+       HTML stylesheet is profiled (see :func:`write_profile`). The dot
+       format writes the graphs (the DOT sources by their diagram id, see
+       :func:`rng2doc.dot.write_graphs`) next to the XML documentation.
+       All other keywords are passed on to
+       :func:`rng2doc.writer.write_file`.
+
     :param result: The results of the transform method
     :type result: ElementTree
     :param file_path: The file path to the output file
     :type file_path: str
+    :param kwargs: Options for the output
     :return: None
     """
+    external_svg = kwargs.pop("external_svg", False)
+    fragments = kwargs.pop("fragments", None)
+    search_index = kwargs.pop("search_index", False)
+    index_size = kwargs.pop("index_size", None)
+    graphs = kwargs.pop("graphs", None)
+    profile_xslt = kwargs.pop("profile_xslt", False)
+    if fragments is None:
+        fragments = {}
     path, filename = os.path.split(file_path)
-    if path != "":
-        os.makedirs(path, exist_ok=True)
     if oformat == "html":
         path = os.path.join(path, "html")
-        os.makedirs(os.path.join(path, "elements"), exist_ok=True)
         xslt_html = etree.parse(resource_filename(__package__, "xslt/html.xslt"))
         transform = etree.XSLT(xslt_html)
-        result = transform(
-            result, basedir="'{}'".format(path),
-            filename="'{}'".format(filename))
+        # The pages and SVG files are created in a staging directory first,
+        # so only the changed ones replace the existing files and stale ones
+        # are deleted
+        with tempfile.TemporaryDirectory(prefix="rng2doc-") as staging:
+            if external_svg:
+                result = externalize_svg(result, staging, fragments)
+            else:
+                result = splice_svg(result, fragments)
+            directories = ["elements", "defines"]
+            if index_size:
+                directories.append("index")
+            if next(result.iter("values"), None) is not None:
+                directories.append("values")
+            if result.getroot().find("attribute-group") is not None:
+                directories.append("groups")
+            for directory in directories:
+                os.makedirs(os.path.join(staging, directory))
+            if search_index:
+                write_search_index(result.getroot(), staging)
+            result = transform(
+                result, basedir="'{}'".format(staging),
+                filename="'{}'".format(filename),
+                external_svg="'{}'".format("yes" if external_svg else ""),
+                search="'{}'".format("yes" if search_index else ""),
+                index_size="'{}'".format(index_size or ""),
+                profile_run=profile_xslt)
+            sync_tree(staging, path, prune=GENERATED_DIRS, **kwargs)
+        if profile_xslt:
+            write_profile(result.xslt_profile, file_path, **kwargs)
+        fragments = {}
+    elif oformat == "dot":
+        write_graphs(result, path, filename, graphs or {}, **kwargs)
+    elif external_svg:
+        result = externalize_svg(result, path, fragments, **kwargs)
+        fragments = {}
     if file_path:
-        result.write(
-            os.path.join(path, filename), pretty_print=True, xml_declaration=True, encoding="utf-8")
+        write_file(os.path.join(path, filename), serialize(result, fragments), **kwargs)
+    elif fragments:
+        print(serialize(result, fragments).decode("utf-8"))
     else:
         print(etree.tostring(result, pretty_print=True, encoding="unicode"))
 
 
+def render_options(args):
+    """Collects the options for the transformation from the arguments
+
+    :param args: parsed arguments from :class:`docopt.docopt`
+    :type args: dict
+    :return: keyword arguments for :func:`rng2doc.rng.parse`
+    :rtype: dict
+    """
+    options = {}
+    if args.get('--ref-depth') is not None:
+        options["ref_depth"] = int(args['--ref-depth'])
+    if args.get('--max-nodes') is not None:
+        options["max_nodes"] = int(args['--max-nodes'])
+    if args.get('--max-values') is not None:
+        options["max_values"] = int(args['--max-values'])
+    if args.get('--attribute-groups'):
+        options["attribute_groups"] = True
+    if args.get('--render-timeout') is not None:
+        options["timeout"] = float(args['--render-timeout'])
+    fallback = args.get('--fallback-layout')
+    if fallback is not None:
+        options["fallback"] = None if fallback.lower() == "none" else fallback.lower()
+    if args.get('--stable-ids'):
+        options["stable_ids"] = True
+    if args.get('--shard') is not None:
+        index, count = args['--shard'].split("/")
+        options["shard"] = (int(index), int(count))
+    if args.get('--workdir') is not None:
+        options["workdir"] = args['--workdir']
+        options["resume"] = bool(args.get('--resume'))
+    if args.get('--jobs') is not None:
+        options["threads"] = int(args['--jobs'])
+    if args.get('--workers') is not None:
+        options["workers"] = int(args['--workers'])
+    if args.get('--prune'):
+        options["prune"] = True
+    for option, key in (('--root', "roots"), ('--elements', "elements")):
+        if args.get(option) is not None:
+            options[key] = args[option].split(",")
+    if args.get('--simplify'):
+        options["simplify"] = True
+        options["cache_dir"] = args.get('--cache-dir')
+    if args.get('--large-input'):
+        options["large_input"] = True
+    if args.get('--optimize-svg'):
+        options["optimize"] = dict(precision=int(args.get('--svg-precision') or 2))
+    return options
+
+
+def print_costs(costs):
+    """Prints the estimated costs of the element diagrams
+
+    :param costs: The element ids, names and costs from :func:`rng2doc.rng.estimate`
+    :type costs: list(tuple)
+    :return: None
+    """
+    print("{:>8} {:>6} {:>6}  {}".format("nodes", "depth", "width", "element"))
+    for element_id, name, cost in costs:
+        print("{:>8} {:>6} {:>6}  {} ({})".format(cost.nodes, cost.depth, cost.width,
+                                                  name, element_id))
+    print("{:>8} {:>6} {:>6}  {} elements".format(
+        sum(cost.nodes for _, _, cost in costs), "", "", len(costs)))
+
+
+def log_summary(summary):
+    """Logs the summary of the run
+
+    :param summary: The counters collected during the run
+    :type summary: :class:`collections.Counter`
+    :return: None
+    """
+    if not summary:
+        return
+    message = ", ".join("{} {}".format(summary[key], key) for key in sorted(summary))
+    if set(summary) - {"rendered", "shared", "resumed", "exported", "injected"}:
+        LOG.warning("Diagrams: %s", message)
+    else:
+        LOG.info("Diagrams: %s", message)
+
+
 def main(cliargs=None):
     """Entry point for the application script
 
@@ -121,8 +532,48 @@ def main(cliargs=None):
         LOG.debug('Python version: %s', sys.version.split()[0])
         LOG.debug("CLI result: %s", args)
         checkargs(args)
-        result = parse(args['RNGFILE'])
-        output(result, args['--output'], args["--output-format"])
+        summary = Counter()
+        fragments = {} if args['--svg-fragments'] else None
+        graphs = {} if args["--output-format"] == "dot" else None
+        if args['--dry-run'] and not (args.get('merge') or args.get('inject')):
+            options = render_options(args)
+            print_costs(estimate(args['RNGFILE'], **dict(
+                (key, value) for key, value in options.items()
+                if key in ("ref_depth", "max_values", "stable_ids", "shard", "simplify",
+                           "cache_dir", "large_input", "prune", "roots", "elements"))))
+            return 0
+        if args.get('serve'):
+            serve(args['RNGFILE'], port=int(args['--port']),
+                  cache_size=int(args['--cache-size']), warm=int(args['--warm'] or 0),
+                  **render_options(args))
+            return 0
+        if args.get('merge'):
+            result = merge(args['PARTIAL'])
+        elif args.get('inject'):
+            result = inject_svg(args['MANIFEST'], summary=summary, fragments=fragments,
+                                optimize=render_options(args).get("optimize"))
+        elif graphs is not None:
+            result = parse(args['RNGFILE'], summary=summary, graphs=graphs,
+                           **render_options(args))
+        else:
+            result = parse(args['RNGFILE'], summary=summary, fragments=fragments,
+                           **render_options(args))
+        compressions = args['--compress']
+        files = Counter()
+        output(result, args['--output'], args["--output-format"],
+               external_svg=args['--external-svg'], fragments=fragments,
+               search_index=args['--search-index'],
+               index_size=int(args['--index-size'] or 0), graphs=graphs,
+               profile_xslt=args['--profile-xslt'],
+               compressions=compressions.split(",") if compressions else (),
+               stats=files)
+        log_summary(summary)
+        if files:
+            LOG.info("Files: %d written, %d unchanged, %d deleted",
+                     files["written"], files["unchanged"], files["deleted"])
+        if summary["failed"]:
+            raise IncompleteDocumentationError(
+                "{} elements or defines failed".format(summary["failed"]))
         if args['--timing']:
             elapsed_time_perf = time.perf_counter() - t_perf
             elapsed_time_proc = time.process_time() - t_proc
@@ -141,6 +592,10 @@ def main(cliargs=None):
         LOG.fatal("File not found '%s'", error)
         return errorcode(error)
 
+    except IncompleteDocumentationError as error:
+        LOG.fatal("The documentation is incomplete, %s", error)
+        return errorcode(error)
+
     except etree.XMLSyntaxError as error:
         LOG.fatal("Failed to parse the XML input file  '%s'", error)
         return errorcode(error)
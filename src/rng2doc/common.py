@@ -23,6 +23,9 @@
 from docopt import DocoptExit
 from lxml.etree import QName, XMLSyntaxError
 
+# Local imports
+from .exceptions import IncompleteDocumentationError
+
 from logging import (CRITICAL,  # isort:skip
                      DEBUG,
                      ERROR,
@@ -40,6 +43,7 @@ from logging import (CRITICAL,  # isort:skip
 ERROR_CODES = dict()
 for _error, _rc in [  # exception class, return value:
                     (XMLSyntaxError, 20),
+                    (IncompleteDocumentationError, 30),
                     (FileNotFoundError, 40),
                     (OSError, 40),
                     (DocoptExit, 50),
@@ -66,6 +70,7 @@ NSMAP = dict(a="http://relaxng.org/ns/compatibility/annotations/1.0",
              rng="http://relaxng.org/ns/structure/1.0",
              xlink="http://www.w3.org/1999/xlink",
              sch="http://purl.oclc.org/dsdl/schematron",
+             svg="http://www.w3.org/2000/svg",
              xml="http://www.w3.org/XML/1998/namespace",
              )
 
@@ -106,6 +111,9 @@ SCH_RULE = QName(NSMAP['sch'], "rule")
 
 A_DOC = QName(NSMAP['a'], "documentation")
 
+# SVG namespace
+SVG_SVG = QName(NSMAP['svg'], "svg")
+
 #: Stylesheets
 HTML_XSLT = "xslt/html.xslt"
 
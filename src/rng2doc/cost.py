@@ -0,0 +1,79 @@
+"""Estimating the rendering cost of a diagram from the RELAX NG structure
+"""
+
+# Standard Library
+from collections import namedtuple
+
+# Local imports
+from .ir import Kind
+from .transforms.svg import SVG
+
+
+class Cost(namedtuple("Cost", ["nodes", "depth", "width"])):
+    """The estimated size of a diagram
+
+    nodes is the number of graph nodes, depth the longest path from the
+    root and width the largest number of alternatives of a choice. Costs
+    compare by their number of nodes first.
+    """
+    __slots__ = ()
+
+
+def pattern_cost(pattern, ref_depth, depth, memo, max_values=None):
+    """Estimates the cost of the children of a pattern
+
+    References are followed like in :func:`rng2doc.rng.transform`, but
+    every define is estimated only once per remaining reference depth.
+    The values of a large enumeration are a single node.
+    """
+    nodes, height = 0, 0
+    children = pattern.children
+    if max_values is not None and pattern.kind == Kind.CHOICE:
+        values = [child for child in children if child.kind == Kind.VALUE]
+        if len(values) > max_values:
+            children = [child for child in children if child.kind != Kind.VALUE]
+            nodes, height = 1, 1
+    width = len(children) + nodes if pattern.kind == Kind.CHOICE else 0
+    for child in children:
+        if child.kind == Kind.REF:
+            if child.target is None or ref_depth is not None and depth >= ref_depth:
+                # A collapsed reference is a single node
+                cost = Cost(1, 1, 0)
+            else:
+                key = (child.name, None if ref_depth is None else ref_depth - depth)
+                if key not in memo:
+                    # Guards against a define which refers to itself
+                    memo[key] = Cost(0, 0, 0)
+                    memo[key] = pattern_cost(child.target, ref_depth, depth + 1, memo,
+                                             max_values)
+                cost = memo[key]
+        elif child.kind == Kind.ELEMENT:
+            # Nested elements have their own diagram
+            cost = Cost(1, 1, 0)
+        else:
+            cost = pattern_cost(child, ref_depth, depth, memo, max_values)
+            if child.tag in SVG:
+                cost = Cost(cost.nodes + 1, cost.depth + 1, cost.width)
+        nodes += cost.nodes
+        height = max(height, cost.depth)
+        width = max(width, cost.width)
+    return Cost(nodes, height, width)
+
+
+def estimate_cost(pattern, ref_depth=None, memo=None, max_values=None):
+    """Estimates the cost of the diagram of an element or define without
+    creating the graph
+
+    :param pattern: A RELAX NG element or define
+    :type pattern: :class:`rng2doc.ir.Pattern`
+    :param int ref_depth: The number of references to expand
+    :param dict memo: The costs of the already estimated defines, which
+                      can be shared between all estimates of a schema
+    :param int max_values: The number of values of a large enumeration
+    :return: The estimated cost
+    :rtype: :class:`Cost`
+    """
+    if memo is None:
+        memo = {}
+    cost = pattern_cost(pattern, ref_depth, 0, memo, max_values)
+    return Cost(cost.nodes + 1, cost.depth + 1, cost.width)
@@ -0,0 +1,166 @@
+"""Rendering the diagrams outside of rng2doc
+
+The dot output format writes the XML documentation with a diagram
+reference for every diagram, the DOT source of every graph and a manifest
+instead of running graphviz. The graphs can then be rendered by any
+number of machines or another graphviz version, every ``<id>.dot`` file
+into an ``<id>.svg`` file next to it:
+
+.. code-block:: bash
+
+    ls dot/*.dot | xargs -P 8 -I{} sh -c 'dot -Tsvg "$1" -o "${1%.dot}.svg"' - {}
+
+:func:`inject_svg` reads the manifest and puts the rendered SVGs back into
+the documentation, which can then be written as XML or HTML.
+"""
+
+# Standard Library
+import json
+import logging
+import os
+from collections import Counter
+
+# Third Party Libraries
+from lxml import etree
+
+# Local imports
+from .render import DEFAULT_LAYOUT, svg_result
+from .writer import write_file
+
+LOG = logging.getLogger(__name__)
+
+#: The directory of the graphs next to the documentation
+DOT_DIR = "dot"
+
+#: The file name of the manifest in :data:`DOT_DIR`
+MANIFEST = "manifest.json"
+
+#: The version of the manifest format
+MANIFEST_VERSION = 1
+
+
+def diagram_users(documentation):
+    """Returns the elements and defines, which show a diagram
+
+    :param documentation: The XML documentation
+    :type documentation: etree.Element
+    :return: The keys "element:<id>" or "define:<name>" by the diagram id
+    :rtype: dict
+    """
+    users = {}
+    for node in documentation:
+        diagram = node.find("diagram")
+        if diagram is None:
+            continue
+        if node.tag == "element":
+            key = "element:" + node.get("id")
+        else:
+            key = "{}:{}".format(node.tag, node.get("name"))
+        users.setdefault(diagram.get("ref"), []).append(key)
+    return users
+
+
+def write_graphs(result, path, filename, graphs, **kwargs):
+    """Writes the DOT source of every graph and the manifest into the dot
+    directory
+
+    The manifest lists the diagrams, the largest first, so they can be
+    scheduled like :func:`rng2doc.rng.render_jobs` does.
+
+    :param result: The documentation with diagram references
+    :type result: etree.ElementTree
+    :param str path: The directory of the documentation
+    :param str filename: The file name of the documentation
+    :param graphs: The DOT sources by their diagram id
+    :type graphs: dict
+    :param kwargs: Options for :func:`rng2doc.writer.write_file`
+    :return: None
+    """
+    kwargs.pop("compressions", None)
+    directory = os.path.join(path, DOT_DIR)
+    users = diagram_users(result.getroot())
+    diagrams = []
+    for svg_id, source in sorted(graphs.items(), key=lambda item: (-len(item[1]), item[0])):
+        write_file(os.path.join(directory, svg_id + ".dot"), source, **kwargs)
+        diagrams.append(dict(id=svg_id, dot=svg_id + ".dot", svg=svg_id + ".svg",
+                             size=len(source), used_by=users.get(svg_id, [])))
+    manifest = dict(version=MANIFEST_VERSION, layout=DEFAULT_LAYOUT,
+                    documentation=os.path.join(os.pardir, filename), diagrams=diagrams)
+    write_file(os.path.join(directory, MANIFEST),
+               json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8") + b"\n", **kwargs)
+
+
+def load_manifest(manifest_path):
+    """Reads a manifest of :func:`write_graphs`
+
+    :param str manifest_path: The path to the manifest
+    :raises: :class:`RuntimeError` if the manifest has another version
+    :return: The manifest
+    :rtype: dict
+    """
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise RuntimeError("{} is not a manifest of version {}.".format(
+            manifest_path, MANIFEST_VERSION))
+    return manifest
+
+
+def inject_svg(manifest_path, **kwargs):
+    """Replaces the diagram references of the documentation with the SVGs,
+    which were rendered from the graphs of the manifest
+
+    Like :func:`rng2doc.rng.render_diagram`, the first reference to a
+    diagram gets the SVG and all others keep referring to it. If fragments
+    is a dict, the serialized SVGs are stored there instead and all
+    references stay. A missing or broken SVG is logged and its references
+    are removed, like a diagram, which could not be rendered.
+
+    :param str manifest_path: The path to the manifest
+    :param kwargs: The keywords optimize (see :func:`rng2doc.render.svg_result`),
+                   fragments and summary
+    :return: The documentation
+    :rtype: etree.ElementTree
+    """
+    optimize = kwargs.pop("optimize", None)
+    fragments = kwargs.pop("fragments", None)
+    summary = kwargs.pop("summary", None)
+    if summary is None:
+        summary = Counter()
+    manifest = load_manifest(manifest_path)
+    directory = os.path.dirname(manifest_path)
+    # Without the indentation the serialization indents the SVGs, too
+    result = etree.parse(os.path.join(directory, manifest["documentation"]),
+                         etree.XMLParser(remove_blank_text=True))
+
+    references = {}
+    for diagram in result.iter("diagram"):
+        references.setdefault(diagram.get("ref"), []).append(diagram)
+
+    for entry in manifest["diagrams"]:
+        svg_id = entry["id"]
+        nodes = references.get(svg_id, [])
+        svg_path = os.path.join(directory, entry["svg"])
+        try:
+            with open(svg_path, "rb") as svg_file:
+                svg = svg_result(svg_file.read(), optimize, fragments is not None)
+        except FileNotFoundError:
+            LOG.warning("Omitting diagram %s, %s is missing", svg_id, svg_path)
+            summary["omitted"] += 1
+            svg = None
+        except (etree.XMLSyntaxError, KeyError) as error:
+            LOG.error("Omitting diagram %s, %s is not a graphviz SVG: %s",
+                      svg_id, svg_path, error)
+            summary["failed"] += 1
+            svg = None
+        if svg is None:
+            for node in nodes:
+                node.getparent().remove(node)
+            continue
+        summary["injected"] += 1
+        if fragments is not None:
+            fragments[svg_id] = svg.replace(b"<svg", '<svg id="{}"'.format(svg_id).encode(), 1)
+        elif nodes:
+            svg.attrib["id"] = svg_id
+            nodes[0].getparent().replace(nodes[0], svg)
+    return result
@@ -17,3 +17,23 @@ class NoMatchinRootException(RNGBaseException):
     allowed according to the RELAX NG spec
     """
     pass
+
+
+class IncompleteDocumentationError(RNGBaseException):
+    """
+    Raised when the documentation of some elements or defines
+    failed and was replaced by an error placeholder
+    """
+    pass
+
+
+class FailedPageError(RNGBaseException):
+    """
+    Raised when the diagram of a served page failed, so the page
+    with the error message is not cached. The page attribute holds
+    the page.
+    """
+
+    def __init__(self, message, page):
+        super().__init__(message)
+        self.page = page
@@ -0,0 +1,197 @@
+"""A compact representation of the RELAX NG patterns, built once from the
+validated grammar and shared by all transformations
+"""
+
+# Standard Library
+import sys
+from enum import IntEnum
+
+# Third Party Libraries
+from lxml import etree
+
+# Local imports
+from .common import (NSMAP,
+                     RNG_ATTRIBUTE,
+                     RNG_CHOICE,
+                     RNG_DEFINE,
+                     RNG_ELEMENT,
+                     RNG_EMPTY,
+                     RNG_GROUP,
+                     RNG_INTERLEAVE,
+                     RNG_ONE_OR_MORE,
+                     RNG_OPTIONAL,
+                     RNG_REF,
+                     RNG_START,
+                     RNG_VALUE,
+                     RNG_ZERO_OR_MORE)
+
+
+class Kind(IntEnum):
+    """The kinds of patterns, which the transformations treat differently"""
+    OTHER = 0
+    ELEMENT = 1
+    DEFINE = 2
+    REF = 3
+    CHOICE = 4
+    VALUE = 5
+
+
+#: The kind of a pattern by its tag
+KINDS = {
+    RNG_ELEMENT.text: Kind.ELEMENT,
+    RNG_DEFINE.text: Kind.DEFINE,
+    RNG_REF.text: Kind.REF,
+    RNG_CHOICE.text: Kind.CHOICE,
+    RNG_VALUE.text: Kind.VALUE,
+}
+
+
+#: The patterns, which can combine attributes without adding other content
+ATTRIBUTE_CONTAINERS = frozenset(tag.text for tag in (
+    RNG_CHOICE, RNG_EMPTY, RNG_GROUP, RNG_INTERLEAVE, RNG_ONE_OR_MORE, RNG_OPTIONAL,
+    RNG_ZERO_OR_MORE))
+
+
+class Pattern:
+    """A node of the RELAX NG tree
+
+    The template functions of :mod:`rng2doc.transforms` still get the
+    source node, but the walk over the children and the references does
+    not touch the lxml tree anymore.
+    """
+    __slots__ = ("kind", "tag", "name", "children", "source", "target")
+
+    def __init__(self, source, children=()):
+        self.tag = sys.intern(source.tag)
+        self.kind = KINDS.get(self.tag, Kind.OTHER)
+        name = source.get("name")
+        self.name = None if name is None else sys.intern(name)
+        self.children = children
+        self.source = source
+        #: The define of a reference
+        self.target = None
+
+    def __repr__(self):
+        return "<Pattern {} {!r}>".format(self.kind.name, self.name)
+
+
+class Schema:
+    """All patterns of a RELAX NG tree with resolved references
+
+    :param rngtree: The RELAX NG tree
+    :type rngtree: etree.ElementTree
+    """
+    __slots__ = ("root", "defines", "patterns")
+
+    def __init__(self, rngtree):
+        self.patterns = {}
+        self.root = self.build(rngtree.getroot())
+        # If a name is defined several times, the last define wins
+        self.defines = {}
+        for pattern in self.patterns.values():
+            if pattern.kind == Kind.DEFINE:
+                self.defines[pattern.name] = pattern
+        for pattern in self.patterns.values():
+            if pattern.kind == Kind.REF:
+                pattern.target = self.defines.get(pattern.name)
+
+    def build(self, source):
+        """Creates the patterns of a node and all its descendants
+
+        The patterns are created in document order without recursion, so
+        a deeply nested grammar does not exceed the recursion limit.
+        """
+        # The patterns keep their source nodes alive, so these are unique keys
+        for node in source.iter(etree.Element):
+            self.patterns[node] = Pattern(node)
+        for node in source.iter(etree.Element):
+            self.patterns[node].children = tuple(
+                self.patterns[child] for child in node.iterchildren(etree.Element))
+        return self.patterns[source]
+
+    def pattern(self, source):
+        """Returns the pattern of a node of the RELAX NG tree
+
+        :param source: A node of the RELAX NG tree
+        :type source: etree.Element
+        :rtype: :class:`Pattern`
+        """
+        return self.patterns[source]
+
+    def elements(self):
+        """Returns the patterns of all elements in document order
+
+        :rtype: list(Pattern)
+        """
+        return [pattern for pattern in self.patterns.values() if pattern.kind == Kind.ELEMENT]
+
+    def reachable(self, roots=None):
+        """Returns all elements, which can be reached from the start
+        patterns or from the elements with one of the root names
+
+        :param roots: Names of the root elements
+        :type roots: list(str)
+        :raises: :class:`RuntimeError` if no element has one of the root names
+        :return: The reachable element patterns
+        :rtype: set(Pattern)
+        """
+        if roots is not None:
+            stack = [element for element in self.elements() if element.name in roots]
+            if not stack:
+                raise RuntimeError("No element with the name {}.".format(", ".join(roots)))
+        else:
+            stack = [pattern for pattern in self.patterns.values()
+                     if pattern.tag == RNG_START.text]
+            if not stack:
+                # A grammar which is just an element
+                stack = [self.root]
+
+        seen = set()
+        while stack:
+            pattern = stack.pop()
+            if pattern in seen:
+                continue
+            seen.add(pattern)
+            stack.extend(pattern.children)
+            if pattern.target is not None:
+                stack.append(pattern.target)
+        return set(pattern for pattern in seen if pattern.kind == Kind.ELEMENT)
+
+    def attribute_defines(self):
+        """Returns the names of the defines, which only contain attributes
+
+        Such a define can be documented once as an attribute group instead
+        of in every element, which refers to it. A define, which refers to
+        itself, is not an attribute group.
+
+        :rtype: set(str)
+        """
+        memo = {}
+
+        def content(pattern):
+            # Returns if a pattern has attributes and if it has other content
+            attributes, other = False, False
+            for child in pattern.children:
+                if child.tag == RNG_ATTRIBUTE.text:
+                    found = True, False
+                elif child.kind == Kind.REF:
+                    found = (False, True) if child.target is None else define(child.target)
+                elif child.tag in ATTRIBUTE_CONTAINERS:
+                    found = content(child)
+                elif child.tag.startswith("{{{}}}".format(NSMAP["rng"])):
+                    found = False, True
+                else:
+                    # Annotations
+                    continue
+                attributes = attributes or found[0]
+                other = other or found[1]
+            return attributes, other
+
+        def define(pattern):
+            if pattern not in memo:
+                memo[pattern] = False, True
+                memo[pattern] = content(pattern)
+            return memo[pattern]
+
+        return set(name for name, pattern in self.defines.items()
+                   if define(pattern) == (True, False))
@@ -0,0 +1,140 @@
+/*
+   Purpose:
+     Instant search in the HTML documentation of rng2doc, without a
+     server and without network access
+
+   Usage:
+     Load this script, then search/index.js, and call
+     rng2docSearch.start(inputId, resultsId). The shards of the index are
+     loaded as scripts when a word needs them, so the search works from
+     the local file system, too.
+*/
+var rng2docSearch = (function () {
+    "use strict";
+
+    // Must match FIELD_BITS in rng2doc/search.py
+    var FIELD_BITS = 4;
+    var MAX_RESULTS = 50;
+
+    var index = null;
+    var shards = {};
+    var loading = {};
+    var input = null;
+    var results = null;
+
+    function words(text) {
+        return text.toLowerCase().match(/\w+/g) || [];
+    }
+
+    function shardKey(word) {
+        return /[a-z0-9]/.test(word.charAt(0)) ? word.charAt(0) : "_";
+    }
+
+    function load(key) {
+        if (loading[key] || index.shards.indexOf(key) < 0) {
+            return;
+        }
+        loading[key] = true;
+        var script = document.createElement("script");
+        script.src = "search/shard-" + key + ".js";
+        document.head.appendChild(script);
+    }
+
+    // Returns the fields of every document with a word starting with
+    // prefix, or null while the shard is not loaded yet
+    function lookup(prefix) {
+        var key = shardKey(prefix);
+        if (index.shards.indexOf(key) < 0) {
+            return {};
+        }
+        var shard = shards[key];
+        if (shard === undefined) {
+            load(key);
+            return null;
+        }
+        var found = {};
+        Object.keys(shard).forEach(function (word) {
+            if (word.lastIndexOf(prefix, 0) === 0) {
+                shard[word].forEach(function (entry) {
+                    var position = entry >> FIELD_BITS;
+                    found[position] = (found[position] || 0) | (entry & ((1 << FIELD_BITS) - 1));
+                });
+            }
+        });
+        return found;
+    }
+
+    function fieldNames(bits) {
+        return index.fields.filter(function (field, position) {
+            return bits & (1 << position);
+        }).join(", ");
+    }
+
+    function show(matches) {
+        results.innerHTML = "";
+        var positions = Object.keys(matches).map(Number);
+        // Matches in the name first, then by name
+        positions.sort(function (first, second) {
+            var lowest = (matches[first] & -matches[first]) - (matches[second] & -matches[second]);
+            return lowest || index.documents[first][0].localeCompare(index.documents[second][0]);
+        });
+        positions.slice(0, MAX_RESULTS).forEach(function (position) {
+            var entry = index.documents[position];
+            var item = document.createElement("li");
+            var link = document.createElement("a");
+            var fields = document.createElement("small");
+            item.className = "list-group-item";
+            link.href = entry[1];
+            link.textContent = entry[0] + (entry[2] ? " (" + entry[2] + ")" : "");
+            fields.className = "text-muted";
+            fields.textContent = " " + fieldNames(matches[position]);
+            item.appendChild(link);
+            item.appendChild(fields);
+            results.appendChild(item);
+        });
+    }
+
+    function search() {
+        if (index === null || input === null) {
+            return;
+        }
+        var query = words(input.value);
+        var matches = null;
+        for (var number = 0; number < query.length; number++) {
+            var found = lookup(query[number]);
+            if (found === null) {
+                // Searches again, when the shard is loaded
+                return;
+            }
+            if (matches === null) {
+                matches = found;
+            } else {
+                Object.keys(matches).forEach(function (candidate) {
+                    if (found[candidate] === undefined) {
+                        delete matches[candidate];
+                    } else {
+                        matches[candidate] |= found[candidate];
+                    }
+                });
+            }
+        }
+        show(matches || {});
+    }
+
+    return {
+        index: function (data) {
+            index = data;
+            search();
+        },
+        shard: function (key, data) {
+            shards[key] = data;
+            search();
+        },
+        start: function (inputId, resultsId) {
+            input = document.getElementById(inputId);
+            results = document.getElementById(resultsId);
+            input.addEventListener("input", search);
+            search();
+        }
+    };
+}());
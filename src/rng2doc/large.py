@@ -0,0 +1,109 @@
+"""Loading very large or generated RNG files
+
+libxml2 refuses documents, which are nested deeper than 256 levels or
+have a text node of more than 10 MB, unless the parser has the
+``huge_tree`` option. :func:`parse_large` sets it, but neither resolves
+entities nor loads DTDs or anything from the network, so a large file
+cannot expand into an even larger tree. The file is fed to the parser in
+chunks of :data:`CHUNK_SIZE` bytes and the annotations, which rng2doc does
+not document (all foreign elements in RELAX NG elements except
+``a:documentation``), are dropped as soon as they are parsed.
+
+The transformations recurse along the nesting of the patterns, so
+:func:`raise_recursion_limit` lets them follow the 2048 levels, which
+libxml2 accepts at most.
+"""
+
+# Standard Library
+import logging
+import sys
+
+# Third Party Libraries
+from lxml import etree
+
+# Local imports
+from .common import A_DOC, NSMAP
+
+LOG = logging.getLogger(__name__)
+
+#: The number of bytes, which are fed to the parser at once
+CHUNK_SIZE = 1 << 16
+
+#: The recursion limit for the deepest nesting of a large file
+RECURSION_LIMIT = 3 * 2048
+
+#: The tag prefix of the RELAX NG elements
+RNG_PREFIX = "{{{}}}".format(NSMAP["rng"])
+
+
+def large_parser(**kwargs):
+    """Returns a parser for large files, which reports the end of every
+    element
+
+    :param kwargs: Options for :class:`lxml.etree.XMLPullParser`
+    :rtype: etree.XMLPullParser
+    """
+    return etree.XMLPullParser(events=("end",), remove_blank_text=True, remove_comments=True,
+                               huge_tree=True, resolve_entities=False, load_dtd=False,
+                               no_network=True, **kwargs)
+
+
+def is_unused(node):
+    """Returns True for an annotation, which is not documented
+
+    :param node: A parsed element
+    :type node: etree.Element
+    :rtype: bool
+    """
+    parent = node.getparent()
+    return (parent is not None and parent.tag.startswith(RNG_PREFIX) and
+            not node.tag.startswith(RNG_PREFIX) and node.tag != A_DOC.text)
+
+
+def parse_large(source):
+    """Parses a large RNG file in chunks and drops the annotations, which
+    are not documented
+
+    :param source: The path to the RNG file or a file object
+    :type source: str or file
+    :raises: :class:`lxml.etree.XMLSyntaxError`
+    :return: The RNG tree, whose URL is the path of the file
+    :rtype: etree.ElementTree
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as rngfile:
+            return parse_large(rngfile)
+
+    parser = large_parser(base_url=getattr(source, "name", None))
+    dropped = 0
+
+    def drop_unused():
+        # An element has been parsed completely at its end event, so it
+        # can be removed while the parser continues with its next sibling
+        nonlocal dropped
+        for _, node in parser.read_events():
+            if is_unused(node):
+                node.getparent().remove(node)
+                dropped += 1
+
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        drop_unused()
+    root = parser.close()
+    drop_unused()
+    LOG.info("Dropped %d annotations", dropped)
+    return root.getroottree()
+
+
+def raise_recursion_limit(limit=RECURSION_LIMIT):
+    """Raises the recursion limit of Python, if it is lower than limit
+
+    :param int limit: The new recursion limit
+    :return: None
+    """
+    if sys.getrecursionlimit() < limit:
+        LOG.debug("Raising the recursion limit to %d", limit)
+        sys.setrecursionlimit(limit)
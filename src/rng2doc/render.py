@@ -0,0 +1,356 @@
+"""Rendering of graphviz graphs into SVG with size and time budgets
+"""
+
+# Standard Library
+import hashlib
+import logging
+import re
+import subprocess
+from collections import Counter
+
+# Third Party Libraries
+import pydot
+from lxml import etree
+
+# Local imports
+from .common import NSMAP
+
+LOG = logging.getLogger(__name__)
+
+#: The layout engine for all diagrams
+DEFAULT_LAYOUT = "dot"
+
+#: The cheaper layout engine, if the default one runs out of time
+FALLBACK_LAYOUT = "twopi"
+
+#: The layout engines, which can be the fallback
+FALLBACK_LAYOUTS = ("twopi", "neato", "sfdp", "circo", "fdp")
+
+#: SVG attributes which contain coordinates
+COORDINATE_ATTRIBUTES = ("x", "y", "x1", "y1", "x2", "y2", "cx", "cy", "r", "rx", "ry",
+                         "width", "height", "points", "d", "transform", "viewBox")
+
+#: SVG presentation attributes which can be merged into classes
+STYLE_ATTRIBUTES = ("fill", "stroke", "stroke-width", "stroke-dasharray",
+                    "font-family", "font-size", "font-weight", "text-anchor")
+
+#: Presentation attributes which need a unit in CSS
+LENGTH_ATTRIBUTES = ("font-size", "stroke-width")
+
+NUMBER = re.compile(r"-?\d+\.\d+")
+SVG_ID_REFERENCE = re.compile(r"url\(#([^)]+)\)")
+SVG_PROLOG = re.compile(rb"^.*?(?=<svg\b)", re.S)
+SVG_DIMENSION = re.compile(rb"""(<svg\b[^>]*?)\s(?:width|height)=("[^"]*"|'[^']*')""")
+
+
+def truncate_graph(graph, max_nodes):
+    """Keeps the first max_nodes nodes of a graph and marks every
+    node, which lost some of its children, with a "more..." node.
+
+    :param graph: The graph which should be truncated
+    :type graph: pydot.Dot
+    :param int max_nodes: The maximum number of nodes to keep
+    :return: The truncated graph
+    :rtype: pydot.Dot
+    """
+    nodes = graph.get_nodes()
+    kept = set(node.get_name() for node in nodes[:max_nodes])
+    for node in nodes[max_nodes:]:
+        graph.del_node(node.get_name())
+
+    parents = []
+    for edge in graph.get_edges():
+        source, destination = edge.get_source(), edge.get_destination()
+        if destination in kept:
+            continue
+        graph.del_edge(source, destination)
+        if source in kept and source not in parents:
+            parents.append(source)
+
+    for index, parent in enumerate(parents):
+        more = pydot.Node(name="more{}".format(index),
+                          label='"more…"', shape="plaintext")
+        graph.add_node(more)
+        graph.add_edge(pydot.Edge(parent, more.get_name()))
+    return graph
+
+
+def round_numbers(value, precision):
+    """Rounds all decimal numbers in an attribute value
+
+    >>> round_numbers("1.123456,2.500000 -3.0", 2)
+    '1.12,2.5 -3'
+    """
+    def shorten(match):
+        number = "{:.{}f}".format(float(match.group()), precision)
+        number = number.rstrip("0").rstrip(".")
+        return "0" if number == "-0" else number
+    return NUMBER.sub(shorten, value)
+
+
+def merge_styles(svg):
+    """Moves repeated presentation attributes into classes
+
+    The class names are derived from the style, so the same style gets the
+    same class in every diagram and several diagrams can share one page.
+
+    :param svg: The SVG root element
+    :type svg: etree.Element
+    :return: The SVG root element with a style element
+    :rtype: etree.Element
+    """
+    styled = []
+    counter = Counter()
+    for node in svg.iter(etree.Element):
+        style = tuple((name, node.get(name)) for name in STYLE_ATTRIBUTES
+                      if node.get(name) is not None)
+        if style:
+            styled.append((node, style))
+            counter[style] += 1
+
+    rules = {}
+    for node, style in styled:
+        if counter[style] < 2:
+            continue
+        declarations = ";".join(
+            "{}:{}{}".format(name, value,
+                             "px" if name in LENGTH_ATTRIBUTES and
+                             re.match(r"^[\d.]+$", value) else "")
+            for name, value in style)
+        name = "s" + hashlib.sha1(declarations.encode("utf-8")).hexdigest()[:6]
+        rules[name] = declarations
+        for attribute, _ in style:
+            del node.attrib[attribute]
+        classes = node.get("class")
+        node.attrib["class"] = name if classes is None else "{} {}".format(classes, name)
+
+    if rules:
+        style = etree.Element(etree.QName(NSMAP["svg"], "style"))
+        style.text = "".join(".{}{{{}}}".format(name, rules[name]) for name in sorted(rules))
+        svg.insert(0, style)
+    return svg
+
+
+def optimize_svg(svg, **kwargs):
+    """Minifies the SVG output of graphviz
+
+    Every step can be switched off by its keyword: comments, titles, ids,
+    classes. The keyword precision sets the number of decimals of the
+    coordinates (None keeps them).
+
+    :param svg: The SVG root element
+    :type svg: etree.Element
+    :param kwargs: Options for the optimization
+    :return: The optimized SVG root element
+    :rtype: etree.Element
+    """
+    precision = kwargs.pop("precision", 2)
+
+    if kwargs.pop("comments", True):
+        for comment in svg.xpath("//comment()"):
+            parent = comment.getparent()
+            if parent is not None:
+                parent.remove(comment)
+
+    if kwargs.pop("titles", True):
+        for title in svg.findall(".//{%s}title" % NSMAP["svg"]):
+            title.getparent().remove(title)
+
+    if kwargs.pop("ids", True):
+        used = set()
+        for node in svg.iter(etree.Element):
+            for name, value in node.attrib.items():
+                used.update(SVG_ID_REFERENCE.findall(value))
+                if name.endswith("href") and value.startswith("#"):
+                    used.add(value[1:])
+        for node in svg.iterdescendants(etree.Element):
+            if node.get("id") is not None and node.get("id") not in used:
+                del node.attrib["id"]
+
+    if precision is not None:
+        for node in svg.iter(etree.Element):
+            for name in COORDINATE_ATTRIBUTES:
+                value = node.get(name)
+                if value is not None:
+                    node.attrib[name] = round_numbers(value, precision)
+
+    if kwargs.pop("classes", True):
+        svg = merge_styles(svg)
+    return svg
+
+
+def svg_fragment(output):
+    """Turns the SVG output of graphviz into a fragment, which can be
+    spliced into another document without parsing it
+
+    >>> svg_fragment(b'<?xml version="1.0"?>\\n<svg width="1pt" height="2pt" x="0"/>')
+    b'<svg x="0"/>'
+    """
+    output = SVG_PROLOG.sub(b"", output, count=1)
+    while SVG_DIMENSION.match(output):
+        output = SVG_DIMENSION.sub(rb"\1", output, count=1)
+    return output.strip()
+
+
+def run_layout(graph, prog, timeout=None):
+    """Runs a graphviz layout engine on a graph
+
+    :param graph: The graph which should be rendered
+    :type graph: pydot.Dot
+    :param str prog: The graphviz program (dot, twopi, ...)
+    :param timeout: The maximum number of seconds for the layout
+    :type timeout: float
+    :raises: :class:`subprocess.TimeoutExpired`, :class:`RuntimeError`
+    :return: The SVG output of graphviz
+    :rtype: bytes
+    """
+    process = subprocess.run([prog, "-Tsvg"],
+                             input=graph.to_string().encode("utf-8"),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             timeout=timeout)
+    if process.returncode:
+        raise RuntimeError("{} failed: {}".format(
+            prog, process.stderr.decode("utf-8", "replace").strip()))
+    return process.stdout
+
+
+def limit_graph(graph, max_nodes=None, summary=None):
+    """Truncates a graph with more than max_nodes nodes (see
+    :func:`truncate_graph`) and counts it in the summary
+
+    :param graph: The graph which should be rendered
+    :type graph: pydot.Dot
+    :param int max_nodes: The maximum number of nodes or None
+    :param summary: Counts the truncated graphs
+    :type summary: :class:`collections.Counter`
+    :return: The graph or the truncated graph
+    :rtype: pydot.Dot
+    """
+    if max_nodes is not None and len(graph.get_nodes()) > max_nodes:
+        LOG.warning("Diagram %s has more than %d nodes, truncating it",
+                    graph.get_name(), max_nodes)
+        graph = truncate_graph(graph, max_nodes)
+        if summary is not None:
+            summary["truncated"] += 1
+    return graph
+
+
+def layout_programs(fallback=FALLBACK_LAYOUT):
+    """Returns the layout engines to try one after another
+
+    :param str fallback: The fallback layout engine or None
+    :raises: :class:`ValueError` if fallback is not one of
+             :data:`FALLBACK_LAYOUTS`
+    :rtype: list(str)
+    """
+    if fallback and fallback not in FALLBACK_LAYOUTS + (DEFAULT_LAYOUT,):
+        raise ValueError("Unknown layout engine {!r}.".format(fallback))
+    layouts = [DEFAULT_LAYOUT]
+    if fallback and fallback != DEFAULT_LAYOUT:
+        layouts.append(fallback)
+    return layouts
+
+
+def svg_result(output, optimize=None, fragment=False):
+    """Turns the SVG output of graphviz into the result of
+    :func:`render_svg`
+
+    :param bytes output: The SVG output of graphviz
+    :param dict optimize: Options for :func:`optimize_svg` or None
+    :param bool fragment: Return the serialized SVG
+    :return: The SVG root element without fixed dimensions or its
+             serialization
+    :rtype: etree.Element or bytes
+    """
+    if fragment and optimize is None:
+        return svg_fragment(output)
+
+    parser = etree.XMLParser(remove_comments=optimize is not None)
+    svg = etree.fromstring(output, parser)
+    svg.attrib.pop("width")
+    svg.attrib.pop("height")
+    if optimize is not None:
+        svg = optimize_svg(svg, **optimize)
+    if fragment:
+        return etree.tostring(svg, encoding="utf-8")
+    return svg
+
+
+def layout_attempts(graph, **kwargs):
+    """Decides which layouts of a graph run and turns their output into
+    the result of :func:`render_svg`, without running them itself
+
+    The generator yields the graph, the layout program and the timeout of
+    every layout, which should run. The caller sends the output of the
+    layout back or throws :class:`subprocess.TimeoutExpired` into the
+    generator. Its return value is the result. So :func:`render_svg` and
+    :func:`rng2doc.aio.render_svg` share the truncation, the fallbacks and
+    the summary, but run the layouts in their own way.
+
+    :param graph: The graph which should be rendered
+    :type graph: pydot.Dot
+    :param kwargs: Options for the rendering, see :func:`render_svg`
+    :return: A generator of the layouts to run
+    :rtype: generator
+    """
+    max_nodes = kwargs.pop("max_nodes", None)
+    timeout = kwargs.pop("timeout", None)
+    fallback = kwargs.pop("fallback", FALLBACK_LAYOUT)
+    summary = kwargs.pop("summary", None)
+    optimize = kwargs.pop("optimize", None)
+    fragment = kwargs.pop("fragment", False)
+    if summary is None:
+        summary = Counter()
+    name = graph.get_name()
+    graph = limit_graph(graph, max_nodes, summary)
+
+    output = None
+    for prog in layout_programs(fallback):
+        try:
+            output = yield graph, prog, timeout
+            break
+        except subprocess.TimeoutExpired:
+            LOG.warning("Layout of diagram %s with %s took longer than %ss",
+                        name, prog, timeout)
+            summary["timeout"] += 1
+    if output is None:
+        LOG.warning("Omitting diagram %s", name)
+        summary["omitted"] += 1
+        return None
+    if prog != DEFAULT_LAYOUT:
+        summary["fallback"] += 1
+    summary["rendered"] += 1
+    return svg_result(output, optimize, fragment)
+
+
+def render_svg(graph, **kwargs):
+    """Renders a pydot graph into a SVG element
+
+    If the graph has more than max_nodes nodes, it gets truncated. If the
+    layout takes longer than timeout seconds, the fallback layout engine
+    is tried. If this one runs out of time too, no diagram is created.
+    Every fallback is logged and counted in the summary.
+
+    The keyword optimize is a dict of options for :func:`optimize_svg`
+    (None skips the optimization). If fragment is True, the serialized SVG
+    is returned instead of an element.
+
+    :param graph: The graph which should be rendered
+    :type graph: pydot.Dot
+    :param kwargs: Options for the rendering
+    :return: The SVG root element without fixed dimensions, its
+             serialization or None
+    :rtype: etree.Element or bytes
+    """
+    attempts = layout_attempts(graph, **kwargs)
+    try:
+        layout = next(attempts)
+        while True:
+            try:
+                output = run_layout(*layout)
+            except subprocess.TimeoutExpired as error:
+                layout = attempts.throw(error)
+            else:
+                layout = attempts.send(output)
+    except StopIteration as stop:
+        return stop.value
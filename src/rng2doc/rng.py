@@ -2,7 +2,11 @@
 """
 
 # Standard Library
+import hashlib
 import logging
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
 from pkg_resources import resource_filename
 
 # Third Party Libraries
@@ -10,18 +14,34 @@ import pydot
 from lxml import etree
 
 # Local imports
-from .common import NSMAP, RNG_ELEMENT, RNG_REF, RNG_VALUE
+from .checkpoint import has_checkpoint, load_checkpoint, prepare_workdir, save_checkpoint
+from .common import A_DOC, NSMAP, RNG_ELEMENT, SVG_SVG
+from .cost import estimate_cost
+from .ir import Kind, Pattern, Schema
+from .large import parse_large, raise_recursion_limit
+from .simplify import load_cached, simplify, store_cached
+from .render import limit_graph, render_svg
 from .transforms.svg import SVG
 from .transforms.xml import XML
 
 LOG = logging.getLogger(__name__)
 
+#: The element patterns of the RELAX NG tree in a worker process by their id
+WORKER_ELEMENTS = {}
+
 
 def transform(node, output, **kwargs):
     """General transformation of RELAX NG
 
+    The walk follows the patterns of :class:`rng2doc.ir.Schema`, the
+    template functions get their source nodes. If an lxml node is given,
+    the schema of its tree is built first. A choice with more than
+    max_values values gets a single "values" node for all of them. A
+    reference to one of the defines in groups gets a "group" node instead
+    of the attributes of the define, unless it is optional or in a choice.
+
     :param node: The node which should be transformed
-    :type node: etree.Element
+    :type node: :class:`rng2doc.ir.Pattern` or etree.Element
     :param output: The output of the transformation.
     :param kwargs: Options for the transformation
     :return: The same list of etree.Elements with a unique index.
@@ -32,46 +52,91 @@ def transform(node, output, **kwargs):
     optional = kwargs.pop("optional", False)
     template = kwargs.pop("template", XML)
     index = kwargs.pop("index", 0)
+    ref_depth = kwargs.pop("ref_depth", None)
+    depth = kwargs.pop("depth", 0)
+    refs = kwargs.pop("refs", None)
+    max_values = kwargs.pop("max_values", None)
+    groups = kwargs.pop("groups", None)
     append = template.get("append")
+    collapse = template.get("ref")
+    group = template.get("group")
+
+    if not isinstance(node, Pattern):
+        node = Schema(node.getroottree()).pattern(node)
 
     if parent is None:
-        if node.tag != RNG_ELEMENT.text:
+        if node.kind != Kind.ELEMENT:
             return output
         transform_func = template.get(node.tag)
-        transformed_node = transform_func(node, root=True, index=index, **kwargs)
+        transformed_node = transform_func(node.source, root=True, index=index, **kwargs)
         append(transformed_node, output, graph=output, root=True)
         parent = transformed_node
 
-    children = node.getchildren()
+    children = node.children
+    if max_values is not None and node.kind == Kind.CHOICE:
+        values = [child for child in children if child.kind == Kind.VALUE]
+        if len(values) > max_values:
+            # A large enumeration becomes a single node, which also keeps
+            # the documentation of the values
+            children = [child for previous, child in zip((None,) + children, children)
+                        if child.kind != Kind.VALUE and not (
+                            child.tag == A_DOC.text and previous is not None and
+                            previous.kind == Kind.VALUE)]
+            index += 1
+            transformed_node = template["values"]([value.source for value in values],
+                                                  index=index)
+            if choice is not None and template == XML:
+                append(transformed_node, choice)
+                append(choice, parent)
+            else:
+                append(transformed_node, parent, graph=output)
 
     for child in children:
         transform_func = template.get(child.tag)
-        if child.tag == RNG_REF.text:
-            xpath = "//rng:define[@name = '{}']".format(child.get("name"))
-            define = node.xpath(xpath, namespaces=NSMAP).pop()
-            output, index = transform(
-                define, output,
-                index=index,
-                parent=parent, optional=optional, choice=choice,
-                template=template)
-        if child.tag == RNG_VALUE.text and choice is not None and template == XML:
-            transformed_node = transform_func(child)
+        if child.kind == Kind.REF:
+            name = child.name
+            if collapse is not None and ref_depth is not None and depth >= ref_depth:
+                # Stop at the ref boundary and link to the define diagram
+                index += 1
+                append(collapse(child.source, index=index), parent, graph=output)
+                if refs is not None and name not in refs:
+                    refs.append(name)
+            elif (group is not None and groups is not None and name in groups and
+                  not optional and choice is None):
+                # The attributes are documented once in the attribute group
+                append(group(child.source), parent)
+            else:
+                if child.target is None:
+                    raise RuntimeError("Reference to the unknown define {!r}.".format(name))
+                output, index = transform(
+                    child.target, output,
+                    index=index,
+                    parent=parent, optional=optional, choice=choice,
+                    template=template,
+                    ref_depth=ref_depth, depth=depth + 1, refs=refs, max_values=max_values,
+                    groups=groups)
+        if child.kind == Kind.VALUE and choice is not None and template == XML:
+            transformed_node = transform_func(child.source)
             append(transformed_node, choice)
             append(choice, parent)
             output, index = transform(
                 child, output,
                 index=index,
                 parent=transformed_node, optional=optional, choice=None,
-                template=template)
+                template=template,
+                ref_depth=ref_depth, depth=depth, refs=refs, max_values=max_values,
+                groups=groups)
         elif transform_func is None:
             output, index = transform(
                 child, output,
                 index=index,
                 parent=parent, optional=optional, choice=choice,
-                template=template)
+                template=template,
+                ref_depth=ref_depth, depth=depth, refs=refs, max_values=max_values,
+                groups=groups)
         else:
             index += 1
-            transformed_node = transform_func(child, optional=optional, index=index)
+            transformed_node = transform_func(child.source, optional=optional, index=index)
             if transformed_node == "optional" and template == XML:
                 optional = True
                 transformed_node = parent
@@ -81,14 +146,16 @@ def transform(node, output, **kwargs):
                 transformed_node = parent
             else:
                 append(transformed_node, parent, graph=output)
-            if child.tag == RNG_ELEMENT.text:
+            if child.kind == Kind.ELEMENT:
                 continue
 
             output, index = transform(
                 child, output,
                 index=index,
                 parent=transformed_node, optional=optional, choice=choice,
-                template=template)
+                template=template,
+                ref_depth=ref_depth, depth=depth, refs=refs, max_values=max_values,
+                groups=groups)
 
         if optional:
             optional = None
@@ -110,54 +177,868 @@ def add_unique_index(elements):
     return elements
 
 
-def parse(rngfile):
-    """Read RNG file and transform it to the XML-Documentation format
+def structural_path(element):
+    """Returns the path of an element through the RELAX NG tree
 
-     :param rngfilename: path to the RNG file (in XML format)
-     :type rngfilename: str
-     :return: The ElementTree of the new XML document
-     :rtype: etree.ElementTree
+    The path consists of the local names of all ancestors and their name
+    attributes, but not of their positions. So the path does not change,
+    when other patterns are added or removed.
+
+    :param element: A RELAX NG element
+    :type element: etree.Element
+    :return: The structural path
+    :rtype: str
     """
-    LOG.info("Process RNG file %r...", rngfile)
+    steps = []
+    for node in reversed(list(element.iterancestors()) + [element]):
+        step = etree.QName(node).localname
+        if node.get("name") is not None:
+            step += "[{}]".format(node.get("name"))
+        steps.append(step)
+    return "/".join(steps)
+
+
+def add_stable_index(elements):
+    """Adds a unique index derived from the content to all RELAX NG elements.
+
+    The index is a hash of the element name, its define and its structural
+    path. Elements with the same hash are numbered in document order. So
+    the index of an element stays the same, when other parts of the schema
+    change.
+
+    :param elements: A list of RELAX NG elements.
+    :type elements: A list of etree.Element
+    :return: The same list of etree.Elements with a unique index.
+    :rtype: A list of etree.Element
+    """
+    seen = Counter()
+    for element in elements:
+        name = element.get("name", "anyName")
+        define = element.xpath("ancestor::rng:define[1]/@name", namespaces=NSMAP)
+        key = "\n".join([name, "".join(define), structural_path(element)])
+        uuid = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+        seen[uuid] += 1
+        if seen[uuid] > 1:
+            uuid = "{}-{}".format(uuid, seen[uuid])
+        element.attrib["id"] = uuid
+    return elements
+
+
+def graph_digest(graph):
+    """Returns the hash of the DOT source of a graph
+
+    :param graph: The graph
+    :type graph: pydot.Dot
+    :return: The hash of the graph
+    :rtype: str
+    """
+    return hashlib.sha1(graph.to_string().encode("utf-8")).hexdigest()
+
+
+def render_diagram(graph, diagrams, **kwargs):
+    """Renders every structurally identical graph only once
+
+    The graph is identified by a hash of its DOT source. The first graph
+    with a hash is rendered and gets an id derived from the hash. All other
+    graphs with the same hash get a diagram node, which refers to this id.
+    If a dict of fragments is given, the serialized SVG is stored there
+    under its id and every graph gets a diagram node. If a dict of graphs
+    is given, the graph is not rendered at all: its DOT source is stored
+    there under its id and every graph gets a diagram node. The keyword
+    rendered contains the results of :func:`render_jobs` by their hash,
+    which are used instead of rendering the graph.
+
+    :param graph: The graph which should be rendered
+    :type graph: pydot.Dot
+    :param diagrams: The ids of the already rendered diagrams by their hash
+    :type diagrams: dict
+    :param kwargs: Options for :func:`rng2doc.render.render_svg`
+    :return: The SVG root element, a diagram reference or None
+    :rtype: etree.Element
+    """
+    fragments = kwargs.pop("fragments", None)
+    graphs = kwargs.pop("graphs", None)
+    rendered = kwargs.pop("rendered", {})
+    digest = kwargs.pop("digest", None) or graph_digest(graph)
+    summary = kwargs.get("summary")
+    if digest in diagrams:
+        svg_id = diagrams[digest]
+        if svg_id is None:
+            return None
+        if summary is not None:
+            summary["shared"] += 1
+        return etree.Element("diagram", ref=svg_id)
+
+    if graphs is not None:
+        # The diagram is rendered by someone else later
+        svg_id = "diagram-{}".format(digest[:16])
+        diagrams[digest] = svg_id
+        graph = limit_graph(graph, kwargs.get("max_nodes"), summary)
+        graphs[svg_id] = graph.to_string().encode("utf-8")
+        if summary is not None:
+            summary["exported"] += 1
+        return etree.Element("diagram", ref=svg_id)
+    if digest in rendered:
+        svg = rendered[digest]
+        if isinstance(svg, Exception):
+            raise svg
+    else:
+        svg = render_svg(graph, fragment=fragments is not None, **kwargs)
+    if svg is None:
+        diagrams[digest] = None
+        return None
+    svg_id = "diagram-{}".format(digest[:16])
+    diagrams[digest] = svg_id
+    if fragments is not None:
+        # Keep the serialized SVG and splice it into the output later
+        fragments[svg_id] = svg.replace(b"<svg", '<svg id="{}"'.format(svg_id).encode(), 1)
+        return etree.Element("diagram", ref=svg_id)
+    svg.attrib["id"] = svg_id
+    return svg
+
+
+class Job(namedtuple("Job", ["key", "node", "graph", "digest", "refs", "placeholder", "cost"])):
+    """The documentation of an element or define between its transformation
+    and its rendering
+
+    graph is None, if the node is complete, because it was restored from
+    a checkpoint or its transformation failed.
+    """
+    __slots__ = ()
+
+
+def element_graph(element, dupe, refs, **kwargs):
+    """Creates the XML documentation and the graph of one element
+
+    :param element: A RELAX NG element
+    :type element: :class:`rng2doc.ir.Pattern`
+    :param bool dupe: True if other elements have the same name
+    :param refs: Gets the names of the collapsed defines
+    :type refs: list(str)
+    :param kwargs: Options for :func:`transform` and the documentation
+                   node, if a worker process created it already (groups
+                   only affects the documentation node)
+    :return: The documentation node and the graph
+    :rtype: tuple
+    """
+    ref_depth = kwargs.pop("ref_depth", None)
+    max_values = kwargs.pop("max_values", None)
+    groups = kwargs.pop("groups", None)
+    node = kwargs.pop("node", None)
+    if node is None:
+        container, _ = transform(element, etree.Element("documentation"), template=XML,
+                                 dupe=dupe, max_values=max_values, groups=groups)
+        node = container[0]
+
+    name = '"' + (element.name or "anyName") + '"'
+    graph = pydot.Dot(graph_name=name, rankdir="LR", format="svg")
+    graph, _ = transform(element, graph, template=SVG, ref_depth=ref_depth, refs=refs,
+                         max_values=max_values)
+    return node, graph
+
+
+def define_graph(define, refs, **kwargs):
+    """Creates the define node and the graph of a collapsed define
+
+    :param define: A RELAX NG define
+    :type define: :class:`rng2doc.ir.Pattern`
+    :param refs: Gets the names of the collapsed defines
+    :type refs: list(str)
+    :param kwargs: Options for :func:`transform`
+    :return: The define node and the graph
+    :rtype: tuple
+    """
+    ref_depth = kwargs.pop("ref_depth", None)
+    max_values = kwargs.pop("max_values", None)
+    name = define.name
+    graph = pydot.Dot(graph_name='"' + name + '"', rankdir="LR", format="svg")
+    root = SVG["define"](define.source, root=True, index=0)
+    SVG["append"](root, graph, graph=graph, root=True)
+    graph, _ = transform(define, graph, parent=root, template=SVG,
+                         ref_depth=ref_depth, refs=refs, max_values=max_values)
+    return etree.Element("define", name=name), graph
+
+
+def attribute_groups(nodes, schema, groups, summary=None):
+    """Creates the attribute group of every define, which the
+    documentation nodes refer to
+
+    The groups follow the order of their first reference, and a group may
+    refer to further groups itself. A group, which fails, gets an error
+    node instead (see :func:`fail`).
+
+    :param nodes: The documentation nodes of the elements
+    :type nodes: list(etree.Element)
+    :param schema: The patterns of the RELAX NG tree
+    :type schema: :class:`rng2doc.ir.Schema`
+    :param groups: The names of the defines, which are attribute groups
+    :type groups: set(str)
+    :param summary: Counts the failures
+    :type summary: :class:`collections.Counter`
+    :return: The attribute groups
+    :rtype: list(etree.Element)
+    """
+    names = []
+
+    def collect(node):
+        for reference in node.iter("attribute-group"):
+            name = reference.get("ref")
+            if name is not None and name not in names:
+                names.append(name)
+
+    for node in nodes:
+        collect(node)
+    result = []
+    # The list of names grows with the groups, which the groups refer to
+    for name in names:
+        group = etree.Element("attribute-group", name=name)
+        try:
+            transform(schema.defines[name], group, parent=group, template=XML, groups=groups)
+        except Exception as error:
+            group = fail("group:" + name, error, etree.Element("attribute-group", name=name),
+                         summary)
+        result.append(group)
+        collect(group)
+    return result
+
+
+def init_worker(data):
+    """Loads the RELAX NG tree once per worker process
+
+    :param bytes data: The serialized RELAX NG tree with the element ids
+    :return: None
+    """
+    # The tree may be as deep as a large input
+    rngtree = etree.fromstring(data, etree.XMLParser(remove_blank_text=True, huge_tree=True))
+    WORKER_ELEMENTS.clear()
+    WORKER_ELEMENTS.update((element.source.get("id"), element)
+                           for element in Schema(rngtree.getroottree()).elements())
+
+
+def transform_chunk(chunk, max_values=None, groups=None):
+    """Transforms a chunk of elements in a worker process
+
+    :param chunk: The ids of the elements and if they are duplicates
+    :type chunk: list(tuple)
+    :param int max_values: The number of values of a large enumeration
+    :param groups: The names of the defines, which are attribute groups
+    :type groups: set(str)
+    :return: The ids and the serialized documentation nodes
+    :rtype: list(tuple)
+    """
+    results = []
+    for element_id, dupe in chunk:
+        container, _ = transform(WORKER_ELEMENTS[element_id], etree.Element("documentation"),
+                                 template=XML, dupe=dupe, max_values=max_values,
+                                 groups=groups)
+        results.append((element_id, etree.tostring(container[0], encoding="utf-8")))
+    return results
+
+
+def transform_parallel(rngtree, tasks, workers, max_values=None, groups=None):
+    """Transforms the elements into their XML documentation in worker
+    processes
+
+    The RELAX NG tree is sent once to every worker, the elements are sent
+    in chunks. If a chunk fails, its elements are missing in the result
+    and get transformed again by the caller.
+
+    :param rngtree: The RELAX NG tree with the element ids
+    :type rngtree: etree.ElementTree
+    :param tasks: The ids of the elements and if they are duplicates
+    :type tasks: list(tuple)
+    :param int workers: The number of worker processes
+    :param int max_values: The number of values of a large enumeration
+    :param groups: The names of the defines, which are attribute groups
+    :type groups: set(str)
+    :return: The documentation nodes by the element id
+    :rtype: dict
+    """
+    data = etree.tostring(rngtree, encoding="utf-8")
+    # Several chunks per worker even out the different element sizes
+    size = max(1, len(tasks) // (workers * 4))
+    chunks = [tasks[start:start + size] for start in range(0, len(tasks), size)]
+    LOG.info("Transforming %d elements in %d processes", len(tasks), workers)
+
+    nodes = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(data,)) as executor:
+        futures = [executor.submit(transform_chunk, chunk, max_values, groups) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            try:
+                results = future.result()
+            except Exception as error:
+                LOG.warning("A worker failed on %d elements, transforming them again: %s",
+                            len(chunk), error)
+                continue
+            for element_id, node in results:
+                nodes[element_id] = etree.fromstring(node)
+    return nodes
+
+
+def fail(key, error, placeholder, summary=None):
+    """Logs the failure of an element or define and adds an error node to
+    its placeholder
+
+    :param str key: The unique key of the element or define
+    :param error: The exception
+    :type error: Exception
+    :param placeholder: The documentation node in case of an error
+    :type placeholder: etree.Element
+    :param summary: Counts the failures
+    :type summary: :class:`collections.Counter`
+    :return: The placeholder
+    :rtype: etree.Element
+    """
+    LOG.error("Failed to document %s: %s", key, error)
+    LOG.debug("Traceback of %s", key, exc_info=error)
+    if summary is not None:
+        summary["failed"] += 1
+    message = "{}: {}".format(type(error).__name__, error)
+    etree.SubElement(placeholder, "error").text = message
+    return placeholder
+
+
+def prepare_job(key, build, placeholder, diagrams, **kwargs):
+    """Runs a build function or restores its result from a checkpoint
+
+    The keyword workdir is the work directory of the checkpoints (None
+    disables them). If resume is True, a finished result is restored
+    from its checkpoint instead of being built again. A checkpoint, which
+    only refers to the diagram of another result without keeping its
+    fragment, is only restored if the checkpoint of that result was
+    restored before, otherwise the diagram would be missing.
+
+    If the build function fails, the placeholder gets an error node (see
+    :func:`fail`). A failed result gets no checkpoint, so a resumed run
+    tries it again.
+
+    :param str key: The unique key of the result
+    :param build: Creates the documentation node and the graph from a list
+                  for the collapsed defines, see :func:`element_graph`
+    :type build: callable
+    :param placeholder: The documentation node in case of an error
+    :type placeholder: etree.Element
+    :param diagrams: The ids of the already rendered diagrams by their hash
+    :type diagrams: dict
+    :param kwargs: Options for the checkpoints
+    :return: The job
+    :rtype: :class:`Job`
+    """
+    workdir = kwargs.pop("workdir", None)
+    resume = kwargs.pop("resume", False)
+    fragments = kwargs.get("fragments")
+    graphs = kwargs.get("graphs")
+    summary = kwargs.get("summary")
+
+    record = None
+    if resume and workdir is not None:
+        record = load_checkpoint(workdir, key)
+    if record is not None:
+        node, digest, refs, fragment = record
+        diagram = node.find("diagram")
+        svg = node.find(SVG_SVG.text)
+        svg_id = None
+        if diagram is not None:
+            svg_id = diagram.get("ref")
+            if fragment is None and digest not in diagrams:
+                LOG.info("The diagram of %s is not restored, documenting it again", key)
+                record = None
+        elif svg is not None:
+            svg_id = svg.get("id")
+    if record is not None:
+        diagrams.setdefault(digest, svg_id)
+        if fragment is not None and fragments is not None:
+            fragments.setdefault(svg_id, fragment)
+        elif fragment is not None and graphs is not None:
+            graphs.setdefault(svg_id, fragment)
+        if summary is not None:
+            summary["resumed"] += 1
+        return Job(key, node, None, digest, refs, placeholder, None)
+
+    refs = []
+    try:
+        node, graph = build(refs)
+    except Exception as error:
+        return Job(key, fail(key, error, placeholder, summary), None, None, [], placeholder, None)
+    return Job(key, node, graph, graph_digest(graph), refs, placeholder, None)
+
+
+def render_jobs(jobs, diagrams, **kwargs):
+    """Renders the graph of every job, which is not rendered yet
+
+    Every graph is rendered only once. The most expensive graphs are
+    rendered first, so with several threads the last running
+    renderings are short ones. The keyword finish is called with the hash
+    and the result of every graph as soon as it is rendered, in the
+    calling thread.
+
+    :param jobs: The jobs with a cost estimate
+    :type jobs: list(Job)
+    :param diagrams: The ids of the already rendered diagrams by their hash
+    :type diagrams: dict
+    :param kwargs: Options for :func:`rng2doc.render.render_svg`, the
+                   number of threads, the fragments and finish
+    :return: The rendered SVG, None or the exception by the hash
+    :rtype: dict
+    """
+    threads = kwargs.pop("threads", 1)
+    summary = kwargs.pop("summary", None)
+    fragments = kwargs.pop("fragments", None)
+    finish = kwargs.pop("finish", None)
+
+    pending = {}
+    for job in jobs:
+        if job.graph is not None and job.digest not in diagrams:
+            pending.setdefault(job.digest, job)
+    # sorted() is stable, so jobs of the same cost stay in document order
+    order = sorted(pending.values(), key=lambda job: job.cost, reverse=True)
+
+    def render(job):
+        # Every rendering counts for itself, as the threads share no state
+        counter = Counter()
+        try:
+            svg = render_svg(job.graph, fragment=fragments is not None,
+                             summary=counter, **kwargs)
+        except Exception as error:
+            svg = error
+        return job.digest, svg, counter
+
+    rendered = {}
+
+    def done(digest, svg, counter):
+        rendered[digest] = svg
+        if summary is not None:
+            summary.update(counter)
+        if finish is not None:
+            finish(digest, svg)
+
+    if threads > 1:
+        LOG.info("Rendering %d diagrams in %d threads", len(order), threads)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for future in as_completed([executor.submit(render, job) for job in order]):
+                done(*future.result())
+    else:
+        for job in order:
+            done(*render(job))
+    return rendered
+
+
+def finish_job(job, diagrams, **kwargs):
+    """Adds the rendered diagram to the documentation node of a job and
+    saves its checkpoint
+
+    :param job: The job
+    :type job: :class:`Job`
+    :param diagrams: The ids of the already rendered diagrams by their hash
+    :type diagrams: dict
+    :param kwargs: Options for :func:`render_diagram` and the checkpoints
+    :return: The documentation node
+    :rtype: etree.Element
+    """
+    workdir = kwargs.pop("workdir", None)
+    kwargs.pop("resume", None)
+    kwargs.pop("threads", None)
+    if job.graph is None:
+        return job.node
+
+    try:
+        svg = render_diagram(job.graph, diagrams, digest=job.digest, **kwargs)
+    except Exception as error:
+        return fail(job.key, error, job.placeholder, kwargs.get("summary"))
+    if svg is not None:
+        job.node.append(svg)
+
+    if workdir is not None:
+        # The checkpoint keeps the serialized SVG or the DOT source
+        kept = kwargs.get("fragments")
+        if kept is None:
+            kept = kwargs.get("graphs")
+        diagram = job.node.find("diagram")
+        fragment = None
+        if diagram is not None and kept is not None:
+            fragment = kept.get(diagram.get("ref"))
+        save_checkpoint(workdir, job.key, job.node, job.digest, job.refs, fragment)
+    return job.node
+
+
+def share_values(documentation):
+    """Keeps the table of every large enumeration only once
+
+    Like the diagrams, the first table with an id keeps its values and all
+    other tables with this id become a reference to it.
+
+    :param documentation: The XML documentation
+    :type documentation: etree.Element
+    :return: The documentation
+    :rtype: etree.Element
+    """
+    ids = set()
+    for values in list(documentation.iter("values")):
+        values_id = values.get("id")
+        if values_id is None:
+            continue
+        if values_id in ids:
+            shared = etree.Element("values", ref=values_id, count=values.get("count"))
+            shared.tail = values.tail
+            values.getparent().replace(values, shared)
+        ids.add(values_id)
+    return documentation
+
+
+def load_schema(rngfile, **kwargs):
+    """Reads and validates a RNG file
+
+    If simplify is True, the grammar is simplified (see
+    :func:`rng2doc.simplify.simplify`). The keyword cache_dir is a
+    directory for the simplified grammars by the hash of their input file.
+    The keyword dependencies is a list, which gets the paths of the
+    included files of a simplified grammar. If large_input is True, the
+    file and its includes are read with
+    :func:`rng2doc.large.parse_large` and the recursion limit is raised for
+    the deeper nesting (see :func:`rng2doc.large.raise_recursion_limit`).
+
+    :param rngfile: path to the RNG file (in XML format)
+    :type rngfile: str
+    :param kwargs: Options for the simplification
+    :raises: :class:`RuntimeError` if the file is not a valid RELAX NG document
+    :return: The RELAX NG tree
+    :rtype: etree.ElementTree
+    """
+    simplified = kwargs.pop("simplify", False)
+    cache_dir = kwargs.pop("cache_dir", None)
+    large = kwargs.pop("large_input", False)
+    dependencies = kwargs.pop("dependencies", None)
+    if dependencies is None:
+        dependencies = []
+    if not isinstance(rngfile, str):
+        # Only a file has a hash for the cache
+        cache_dir = None
+    if large:
+        raise_recursion_limit()
 
     # Remove all blank lines, which makes the output later much more beautiful.
-    xmlparser = etree.XMLParser(remove_blank_text=True, remove_comments=True)
+    xmlparser = etree.XMLParser(remove_blank_text=True, remove_comments=True, huge_tree=large)
+
+    if simplified and cache_dir is not None:
+        rngtree = load_cached(cache_dir, rngfile, xmlparser, dependencies)
+        if rngtree is not None:
+            return rngtree
 
     relaxng_schema = etree.parse(resource_filename(__package__, "schemas/relaxng.rng"))
     relaxng = etree.RelaxNG(relaxng_schema)
-    rngtree = etree.parse(rngfile, xmlparser)
+    rngtree = parse_large(rngfile) if large else etree.parse(rngfile, xmlparser)
     if not relaxng.validate(rngtree):
         raise RuntimeError("The input file is not a valid RELAX NG document.")
 
+    if simplified:
+        rngtree = simplify(rngtree, dependencies, large)
+        if cache_dir is not None:
+            store_cached(cache_dir, rngfile, rngtree, dependencies)
+    return rngtree
+
+
+def select_subset(schema, **kwargs):
+    """Selects the elements which should be documented
+
+    If prune is True, only the elements which can be reached from the
+    start patterns are selected. The keyword roots is a list of element
+    names to start from instead. The keyword elements is a list of element
+    names, which limits the selection further.
+
+    :param schema: The patterns of the RELAX NG tree
+    :type schema: :class:`rng2doc.ir.Schema`
+    :param kwargs: Options for the selection
+    :return: The selected elements or None for all elements
+    :rtype: set(etree.Element)
+    """
+    prune = kwargs.pop("prune", False)
+    roots = kwargs.pop("roots", None)
+    names = kwargs.pop("elements", None)
+    if not (prune or roots or names):
+        return None
+    if prune or roots:
+        patterns = schema.reachable(roots)
+    else:
+        patterns = schema.elements()
+    if names:
+        patterns = [pattern for pattern in patterns if (pattern.name or "anyName") in names]
+    return set(pattern.source for pattern in patterns)
+
+
+def select_elements(rngtree, stable_ids=False, shard=None, subset=None):
+    """Adds the ids to all elements and selects the elements of a subset
+    and of a shard
+
+    The ids and the duplicates are always determined over all elements,
+    so they do not depend on the selection.
+
+    :param rngtree: The RELAX NG tree
+    :type rngtree: etree.ElementTree
+    :param bool stable_ids: Use :func:`add_stable_index`
+    :param tuple shard: The index of the shard and the number of shards
+    :param subset: The elements to select or None for all elements
+    :type subset: set(etree.Element)
+    :return: The selected elements and the number of elements by their name
+    :rtype: tuple
+    """
     elements = rngtree.xpath("//rng:element", namespaces=NSMAP)
-    elements = add_unique_index(elements)
+    if stable_ids:
+        elements = add_stable_index(elements)
+    else:
+        elements = add_unique_index(elements)
+
+    # Duplicates are counted over all elements, so every shard marks them
+    names = Counter(element.get("name", "anyName") for element in elements)
+    if subset is not None:
+        elements = [element for element in elements if element in subset]
+        LOG.info("Selected %d of %d elements", len(elements), sum(names.values()))
+    if shard is not None:
+        index, count = shard
+        elements = elements[index::count]
+    return elements, names
+
+
+def estimate(rngfile, **kwargs):
+    """Estimates the cost of the diagram of every element without
+    rendering anything
+
+    The keywords ref_depth, max_values, stable_ids, shard, simplify,
+    cache_dir, large_input, prune, roots and elements are the same as in
+    :func:`parse`.
+
+    :param rngfile: path to the RNG file (in XML format)
+    :type rngfile: str
+    :param kwargs: Options for the transformation
+    :return: The element ids, names and costs, the most expensive first
+    :rtype: list(tuple)
+    """
+    ref_depth = kwargs.pop("ref_depth", None)
+    max_values = kwargs.pop("max_values", None)
+    rngtree = load_schema(rngfile, simplify=kwargs.pop("simplify", False),
+                          cache_dir=kwargs.pop("cache_dir", None),
+                          large_input=kwargs.pop("large_input", False))
+    schema = Schema(rngtree)
+    elements, _ = select_elements(rngtree, kwargs.pop("stable_ids", False),
+                                  kwargs.pop("shard", None), select_subset(schema, **kwargs))
+    memo = {}
+    costs = [(element.get("id"), element.get("name", "anyName"),
+              estimate_cost(schema.pattern(element), ref_depth, memo, max_values))
+             for element in elements]
+    return sorted(costs, key=lambda cost: cost[2], reverse=True)
+
+
+def parse(rngfile, **kwargs):
+    """Read RNG file and transform it to the XML-Documentation format
+
+    The keyword ref_depth is the number of references which are expanded in
+    the diagrams, before a link to the define diagram is created instead
+    (None expands all references). A choice with more than max_values values
+    becomes a single node in the diagram and a table of the values, which is
+    kept only once (see :func:`share_values`). If attribute_groups is True,
+    the attributes of a define, which only contains attributes, are
+    documented once in an attribute group (see :func:`attribute_groups`). If
+    stable_ids is True, the elements get ids from :func:`add_stable_index`
+    instead of their position. The keyword shard is a tuple (index, count):
+    only every count-th element, starting at index, is transformed. The
+    keywords prune, roots and elements select a subset of the elements (see
+    :func:`select_subset`). The keyword workdir is a directory for
+    checkpoints of every finished element, which are used again if resume is
+    True and neither the input nor the options changed. An element or
+    define, which fails, gets an error node instead of its documentation
+    (see :func:`fail`).
+
+    If the keyword workers is set, that many processes create the XML
+    documentation of the elements (see :func:`transform_parallel`). All
+    graphs are created afterwards, then the keyword threads is the number
+    of threads which render them, the most expensive first (see
+    :func:`render_jobs`). The checkpoint of an element or define is saved
+    as soon as its diagram is rendered. If the keyword graphs is a dict, nothing is
+    rendered and it gets the DOT source of every diagram instead (see
+    :func:`render_diagram`). The keywords simplify, cache_dir and
+    large_input are passed on to :func:`load_schema`, all other keywords to
+    :func:`render_diagram`.
+
+     :param rngfilename: path to the RNG file (in XML format)
+     :type rngfilename: str
+     :param kwargs: Options for the transformation
+     :return: The ElementTree of the new XML document
+     :rtype: etree.ElementTree
+    """
+    ref_depth = kwargs.pop("ref_depth", None)
+    max_values = kwargs.pop("max_values", None)
+    grouped = kwargs.pop("attribute_groups", False)
+    stable_ids = kwargs.pop("stable_ids", False)
+    shard = kwargs.pop("shard", None)
+    workers = kwargs.pop("workers", None)
+    simplified = kwargs.pop("simplify", False)
+    cache_dir = kwargs.pop("cache_dir", None)
+    large = kwargs.pop("large_input", False)
+    LOG.info("Process RNG file %r...", rngfile)
+
+    # The checkpoints depend on the included files, too
+    dependencies = []
+    rngtree = load_schema(rngfile, simplify=simplified, cache_dir=cache_dir, large_input=large,
+                          dependencies=dependencies)
+    schema = Schema(rngtree)
+    groups = schema.attribute_defines() if grouped else None
+    selection = dict(prune=kwargs.pop("prune", False), roots=kwargs.pop("roots", None),
+                     elements=kwargs.pop("elements", None))
+    subset = select_subset(schema, **selection)
+    elements, names = select_elements(rngtree, stable_ids, shard, subset)
 
     documentation = etree.Element("documentation")
+    if shard is not None:
+        documentation.attrib["shard"] = "{}/{}".format(*shard)
 
-    already_seen = []
+    workdir = kwargs.get("workdir")
+    if workdir is not None:
+        # Checkpoints of a run with other options cannot be reused
+        options = dict(kwargs, ref_depth=ref_depth, max_values=max_values,
+                       attribute_groups=grouped, stable_ids=stable_ids, shard=shard,
+                       simplify=simplified, fragments=kwargs.get("fragments") is not None,
+                       graphs=kwargs.get("graphs") is not None, **selection)
+        for option in ("summary", "workdir", "resume", "threads"):
+            options.pop(option, None)
+        kwargs["resume"] = prepare_workdir(workdir, rngfile, options,
+                                           kwargs.get("resume", False), dependencies)
 
-    for element in elements:
-        name = element.get("name")
-        if name is None:
-            name = "anyName"
-        if name in already_seen:
-            dupe = True
-            previous = documentation.find(f".//element[@name='{name}']")
-            previous.attrib["dupe"] = "true"
-        else:
-            already_seen.append(name)
-            dupe = False
+    refs = []
+    jobs = []
+    diagrams = {}
+    memo = {}
+
+    dupes = [names[element.get("name", "anyName")] > 1 for element in elements]
+    nodes = {}
+    if workers:
+        tasks = [(element.get("id"), dupe) for element, dupe in zip(elements, dupes)
+                 if not (kwargs.get("resume") and
+                         has_checkpoint(workdir, "element:" + element.get("id")))]
+        nodes = transform_parallel(rngtree, tasks, workers, max_values, groups)
+
+    for element, dupe in zip(elements, dupes):
         element_id = element.attrib["id"]
-        documentation, _ = transform(element, documentation, template=XML, dupe=dupe)
-
-        name = '"' + name + '"'
-        graph = pydot.Dot(graph_name=name, rankdir="LR", format="svg")
-        graph, _ = transform(element, graph, template=SVG)
-        svg = etree.fromstring(graph.create_svg())
-        svg.attrib.pop("width")
-        svg.attrib.pop("height")
-
-        # Inject the SVG
-        xpath = "//element[@id={}]".format(element_id)
-        documentation.xpath(xpath).pop().append(svg)
-    return etree.ElementTree(documentation)
+        pattern = schema.pattern(element)
+        job = prepare_job("element:" + element_id,
+                          partial(element_graph, pattern, dupe, ref_depth=ref_depth,
+                                  max_values=max_values, groups=groups,
+                                  node=nodes.get(element_id)),
+                          XML[RNG_ELEMENT](element, root=True, dupe=dupe),
+                          diagrams, **kwargs)
+        jobs.append(job._replace(cost=estimate_cost(pattern, ref_depth, memo, max_values)))
+        refs.extend(ref for ref in job.refs if ref not in refs)
+
+    # The list of define names grows, as every define diagram may collapse
+    # further references itself. Each define gets only one diagram.
+    for name in refs:
+        define = schema.defines[name]
+        job = prepare_job("define:" + name,
+                          partial(define_graph, define, ref_depth=ref_depth,
+                                  max_values=max_values),
+                          etree.Element("define", name=name),
+                          diagrams, **kwargs)
+        jobs.append(job._replace(cost=estimate_cost(define, ref_depth, memo, max_values)))
+        refs.extend(ref for ref in job.refs if ref not in refs)
+
+    finished = {}
+    if kwargs.get("graphs") is None:
+        waiting = {}
+        for job in jobs:
+            if job.graph is not None:
+                waiting.setdefault(job.digest, []).append(job)
+
+        def finish(digest, svg):
+            # The jobs of a diagram are finished and saved as soon as it is
+            # rendered, in document order, so the first one gets the SVG
+            for job in waiting.pop(digest, []):
+                finished[job.key] = finish_job(job, diagrams, rendered={digest: svg}, **kwargs)
+
+        render_jobs(jobs, diagrams, finish=finish, **kwargs)
+    for job in jobs:
+        node = finished.get(job.key)
+        if node is None:
+            node = finish_job(job, diagrams, **kwargs)
+        if shard is not None and job.refs:
+            # Lets merge put the defines in the order of a complete run
+            node.attrib["refs"] = " ".join(job.refs)
+        documentation.append(node)
+    if groups is not None:
+        documentation.extend(attribute_groups(documentation, schema, groups,
+                                              kwargs.get("summary")))
+    return etree.ElementTree(share_values(documentation))
+
+
+def merge(partials):
+    """Merges the XML documentation of all shards
+
+    The elements are put back into their original order, every define
+    diagram, attribute group, SVG and table of values is kept only once.
+    The defines and then the attribute groups follow in the order of their
+    first reference like in :func:`parse`, the defines by the refs
+    attributes, which the shards add to their elements and defines.
+
+    :param partials: The XML documentation files of all shards
+    :type partials: list(str)
+    :return: The ElementTree of the merged XML document
+    :rtype: etree.ElementTree
+    """
+    shards = {}
+    count = None
+    for partial in partials:
+        root = etree.parse(partial).getroot()
+        index, total = (int(number) for number in root.get("shard", "0/1").split("/"))
+        if count is not None and total != count:
+            raise RuntimeError("{} is not a shard of {}.".format(partial, count))
+        count = total
+        shards[index] = root
+    if sorted(shards) != list(range(count)):
+        raise RuntimeError("Missing shards, expected {}.".format(count))
+
+    documentation = etree.Element("documentation")
+    elements = [list(shards[index].iterchildren("element")) for index in range(count)]
+    for position in range(sum(len(shard) for shard in elements)):
+        documentation.append(elements[position % count][position // count])
+
+    def append_referenced(tag, references):
+        # Appends the nodes with a tag in the order of their first reference,
+        # the list of names grows with the references of the appended nodes
+        nodes = {}
+        for index in range(count):
+            for node in shards[index].iterchildren(tag):
+                nodes.setdefault(node.get("name"), node)
+        names = []
+
+        def add(node):
+            for name in references(node):
+                if name not in names:
+                    names.append(name)
+
+        for node in list(documentation):
+            add(node)
+        for name in names:
+            node = nodes.pop(name, None)
+            if node is not None:
+                add(node)
+                documentation.append(node)
+        for node in nodes.values():
+            add(node)
+            documentation.append(node)
+
+    append_referenced("define", lambda node: node.attrib.pop("refs", "").split())
+    append_referenced("attribute-group",
+                      lambda node: [reference.get("ref")
+                                    for reference in node.iter("attribute-group")
+                                    if reference.get("ref") is not None])
+
+    # Let the serialization indent the moved nodes again
+    for node in documentation:
+        node.tail = None
+
+    svg_ids = set()
+    for svg in list(documentation.iter(SVG_SVG.text)):
+        if svg.get("id") in svg_ids:
+            diagram = etree.Element("diagram", ref=svg.get("id"))
+            diagram.tail = svg.tail
+            svg.getparent().replace(svg, diagram)
+        svg_ids.add(svg.get("id"))
+    return etree.ElementTree(share_values(documentation))
@@ -0,0 +1,165 @@
+"""A prebuilt search index for the HTML documentation
+
+The index maps every word of the element names, attribute names, values
+and descriptions to the elements, which contain it. It is split into
+shards by the first character of the words, so the browser only loads
+the shards of the words it searches for. Every shard is a small script,
+which passes its JSON data to ``rng2docSearch.shard``, because browsers
+do not allow to load JSON files from the local file system.
+"""
+
+# Standard Library
+import json
+import os
+import re
+import string
+from collections import Counter
+
+# Third Party Libraries
+from pkg_resources import resource_filename
+
+# Local imports
+from .writer import write_file
+
+#: The directory of the index in the HTML directory
+SEARCH_DIR = "search"
+
+#: The fields of an element, which are searched, by their bit in the index
+FIELDS = (
+    ("name", 1),
+    ("attribute", 2),
+    ("value", 4),
+    ("description", 8),
+)
+
+#: The number of bits of the fields in an entry of the index
+FIELD_BITS = 4
+
+#: The first characters of the words, which have their own shard
+SHARD_CHARACTERS = string.ascii_lowercase + string.digits
+
+#: A word like \w in the search script of the browser
+WORD = re.compile(r"\w+", re.ASCII)
+
+
+def page_names(documentation):
+    """Returns the HTML page of every element like the create-filename
+    template of the HTML stylesheet
+
+    :param documentation: The XML documentation
+    :type documentation: etree.Element
+    :return: The relative URL of the page by the element id
+    :rtype: dict
+    """
+    elements = list(documentation.iterchildren("element"))
+    names = Counter(element.get("name") for element in elements)
+    pages = {}
+    for element in elements:
+        name = element.get("name").replace(":", "_")
+        if names[name] != 1:
+            name = "{}-{}".format(name, element.get("id"))
+        pages[element.get("id")] = "elements/{}.html".format(name)
+    return pages
+
+
+def words(text):
+    """Returns the lower case words of a text
+
+    >>> sorted(words("The xml:lang attribute"))
+    ['attribute', 'lang', 'the', 'xml']
+    """
+    return set(WORD.findall((text or "").lower()))
+
+
+def shard_key(word):
+    """Returns the shard of a word, its first character or "_"
+
+    >>> shard_key("lang"), shard_key("_id")
+    ('l', '_')
+    """
+    return word[0] if word[0] in SHARD_CHARACTERS else "_"
+
+
+def element_words(element, groups=None):
+    """Returns the words of an element with the bits of their fields
+
+    The attributes of a referenced attribute group count as attributes
+    of the element.
+
+    :param element: An element of the XML documentation
+    :type element: etree.Element
+    :param groups: The attribute groups of the documentation by name
+    :type groups: dict
+    :rtype: :class:`collections.Counter`
+    """
+    found = Counter()
+    nodes = [element] + [groups[ref.get("ref")] for ref in element.iter("attribute-group")
+                         if groups and ref.get("ref") in groups]
+    texts = {
+        "name": [element.get("name")],
+        "attribute": [attribute.get("name")
+                      for node in nodes for attribute in node.iter("attribute")],
+        "value": [value.get("name") for node in nodes for value in node.iter("value")],
+        "description": [description.text
+                        for node in nodes for description in node.iter("description")],
+    }
+    for field, bit in FIELDS:
+        for text in texts[field]:
+            for word in words(text):
+                found[word] |= bit
+    return found
+
+
+def build_index(documentation):
+    """Creates the search index of the XML documentation
+
+    Every entry of a word is the position of the element in the list of
+    documents shifted by :data:`FIELD_BITS`, or-ed with the bits of the
+    fields, which contain the word.
+
+    :param documentation: The XML documentation
+    :type documentation: etree.Element
+    :return: The list of documents and the shards by their key
+    :rtype: tuple
+    """
+    pages = page_names(documentation)
+    groups = dict((group.get("name"), group)
+                  for group in documentation.iterchildren("attribute-group"))
+    documents = []
+    shards = {}
+    for position, element in enumerate(documentation.iterchildren("element")):
+        documents.append([element.get("name"), pages[element.get("id")],
+                          element.get("define", "")])
+        for word, bits in sorted(element_words(element, groups).items()):
+            shard = shards.setdefault(shard_key(word), {})
+            shard.setdefault(word, []).append(position << FIELD_BITS | bits)
+    return documents, shards
+
+
+def script(function, *arguments):
+    """Returns a call of a function of rng2docSearch with JSON arguments"""
+    data = ",".join(json.dumps(argument, separators=(",", ":"), sort_keys=True)
+                    for argument in arguments)
+    return "rng2docSearch.{}({});\n".format(function, data).encode("utf-8")
+
+
+def write_search_index(documentation, path, **kwargs):
+    """Writes the search index and the search script into the search
+    directory of the HTML directory
+
+    :param documentation: The XML documentation
+    :type documentation: etree.Element
+    :param str path: The HTML directory
+    :param kwargs: Options for :func:`rng2doc.writer.write_file`
+    :return: None
+    """
+    directory = os.path.join(path, SEARCH_DIR)
+    documents, shards = build_index(documentation)
+    write_file(os.path.join(directory, "index.js"),
+               script("index", dict(documents=documents, shards=sorted(shards),
+                                    fields=[field for field, _ in FIELDS])), **kwargs)
+    for key, shard in shards.items():
+        write_file(os.path.join(directory, "shard-{}.js".format(key)),
+                   script("shard", key, shard), **kwargs)
+    with open(resource_filename(__package__, "js/search.js"), "rb") as source:
+        write_file(os.path.join(directory, "search.js"), source.read(), **kwargs)
@@ -0,0 +1,295 @@
+"""Serving the HTML documentation, whose pages are created on demand
+"""
+
+# Standard Library
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote, urlsplit
+
+# Third Party Libraries
+from lxml import etree
+from pkg_resources import resource_filename
+
+# Local imports
+from .exceptions import FailedPageError
+from .ir import Schema
+from .rng import (attribute_groups,
+                  define_graph,
+                  element_graph,
+                  fail,
+                  load_schema,
+                  render_diagram,
+                  select_elements,
+                  select_subset,
+                  share_values,
+                  transform)
+from .search import page_names
+from .transforms.xml import XML
+
+LOG = logging.getLogger(__name__)
+
+#: The server is only reachable from this machine
+HOST = "127.0.0.1"
+
+#: The number of values on a page of a large enumeration, like the
+#: values_size parameter of the HTML stylesheet
+VALUES_PAGE_SIZE = 500
+
+
+class LazyDocumentation:
+    """The HTML documentation of a RELAX NG grammar, whose pages are
+    created when they are requested for the first time
+
+    The grammar is loaded and the XML documentation of all elements is
+    created once, as every page lists the parents of its element. The
+    diagram of a page is only rendered, when the page is requested. The
+    last cache_size pages are kept, but not the pages whose diagram failed.
+
+    The keywords ref_depth, max_values, attribute_groups, stable_ids,
+    simplify, cache_dir, large_input, prune, roots and elements are the
+    same as in :func:`rng2doc.rng.parse`, all other keywords are passed on
+    to :func:`rng2doc.rng.render_diagram`.
+
+    :param rngfile: path to the RNG file (in XML format)
+    :type rngfile: str
+    :param int cache_size: The maximum number of cached pages
+    :param kwargs: Options for the transformation
+    """
+
+    def __init__(self, rngfile, cache_size=128, **kwargs):
+        self.ref_depth = kwargs.pop("ref_depth", None)
+        self.max_values = kwargs.pop("max_values", None)
+        grouped = kwargs.pop("attribute_groups", False)
+        stable_ids = kwargs.pop("stable_ids", False)
+        rngtree = load_schema(rngfile, simplify=kwargs.pop("simplify", False),
+                              cache_dir=kwargs.pop("cache_dir", None),
+                              large_input=kwargs.pop("large_input", False))
+        self.schema = Schema(rngtree)
+        groups = self.schema.attribute_defines() if grouped else None
+        subset = select_subset(self.schema, prune=kwargs.pop("prune", False),
+                               roots=kwargs.pop("roots", None),
+                               elements=kwargs.pop("elements", None))
+        elements, names = select_elements(rngtree, stable_ids, subset=subset)
+        # A server has no shards, checkpoints or output files
+        for option in ("shard", "workdir", "resume", "threads", "workers", "fragments"):
+            kwargs.pop(option, None)
+        self.options = kwargs
+
+        self.documentation = etree.Element("documentation")
+        self.elements = {}
+        for element in elements:
+            pattern = self.schema.pattern(element)
+            dupe = names[element.get("name", "anyName")] > 1
+            transform(pattern, self.documentation, template=XML, dupe=dupe,
+                      max_values=self.max_values, groups=groups)
+            self.elements[element.get("id")] = (pattern, dupe, self.documentation[-1])
+        if groups is not None:
+            self.documentation.extend(attribute_groups(self.documentation, self.schema, groups))
+        share_values(self.documentation)
+
+        self.pages = {"index.html": "index"}
+        for element_id, page in page_names(self.documentation).items():
+            self.pages[page] = "element:" + element_id
+        for name in self.schema.defines:
+            self.pages["defines/{}.html".format(name.replace(":", "_"))] = "define:" + name
+        for group in self.documentation.iterchildren("attribute-group"):
+            name = group.get("name")
+            self.pages["groups/{}.html".format(name.replace(":", "_"))] = "group:" + name
+        for values in self.documentation.iter("values"):
+            if values.get("id") is not None:
+                for number in range(1, -(-int(values.get("count")) // VALUES_PAGE_SIZE) + 1):
+                    name = "{}-{}".format(values.get("id"), number)
+                    self.pages["values/{}.html".format(name)] = "values:" + name
+
+        self.xslt = etree.XSLT(etree.parse(resource_filename(__package__, "xslt/html.xslt")))
+        # The documentation tree and the XSLT are shared by all requests
+        self.lock = threading.Lock()
+        self.page = lru_cache(maxsize=cache_size)(self.render_page)
+
+    def popular(self, count):
+        """Returns the keys of the pages of the elements with the most
+        parents, which are probably opened most often
+
+        :param int count: The number of pages
+        :rtype: list(str)
+        """
+        parents = Counter(child.get("id") for child in self.documentation.iter("child"))
+        ranking = sorted(self.elements, key=lambda element_id: parents[element_id],
+                         reverse=True)
+        return ["element:" + element_id for element_id in ranking[:count]]
+
+    def warm(self, count, threads=1):
+        """Creates the index page and the pages of the most popular
+        elements in advance
+
+        :param int count: The number of element pages
+        :param int threads: The number of pages created in parallel
+        :return: None
+        """
+        keys = ["index"] + self.popular(count)
+        LOG.info("Creating %d pages in advance", len(keys))
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(self.warm_page, keys))
+
+    def warm_page(self, key):
+        """Creates a page in advance, a failed diagram is rendered again
+        when the page is requested
+
+        :param str key: The key of the page
+        :return: None
+        """
+        try:
+            self.page(key)
+        except FailedPageError:
+            pass
+
+    def render_page(self, key):
+        """Creates the HTML page with a key and renders its diagram
+
+        A failed diagram becomes an error message on the page, like in
+        :func:`rng2doc.rng.parse`. The page is raised with a
+        :class:`rng2doc.exceptions.FailedPageError` then, so the cache of
+        :attr:`page` does not keep it.
+
+        :param str key: "index", "element:<id>", "define:<name>",
+                        "group:<name>" or "values:<id>-<page>"
+        :raises: :class:`rng2doc.exceptions.FailedPageError`
+        :return: The HTML page
+        :rtype: bytes
+        """
+        kind, _, name = key.partition(":")
+        if kind in ("index", "group", "values"):
+            with self.lock:
+                return bytes(self.xslt(self.documentation, page=etree.XSLT.strparam(key),
+                                       filename="'index.html'"))
+        if kind == "element":
+            pattern, dupe, node = self.elements[name]
+            build = partial(element_graph, pattern, dupe, ref_depth=self.ref_depth,
+                            max_values=self.max_values, node=node)
+        else:
+            node = etree.Element("define", name=name)
+            build = partial(define_graph, self.schema.defines[name], ref_depth=self.ref_depth,
+                            max_values=self.max_values)
+
+        # The diagram is rendered without the lock, only the shared
+        # documentation tree is changed for the transformation
+        content = etree.Element("content")
+        failed = None
+        try:
+            _, graph = build([])
+            svg = render_diagram(graph, {}, **self.options)
+        except Exception as error:
+            failed = error
+            fail(key, error, content)
+        else:
+            if svg is not None:
+                content.append(svg)
+
+        with self.lock:
+            added = node.getparent() is None
+            if added:
+                self.documentation.append(node)
+            diagrams = list(content)
+            node.extend(diagrams)
+            try:
+                page = bytes(self.xslt(self.documentation, page=etree.XSLT.strparam(key),
+                                       filename="'index.html'"))
+            finally:
+                for diagram in diagrams:
+                    node.remove(diagram)
+                if added:
+                    self.documentation.remove(node)
+        if failed is not None:
+            raise FailedPageError("The diagram of {} failed".format(key), page) from failed
+        return page
+
+
+class DocumentationHandler(BaseHTTPRequestHandler):
+    """Answers the requests for the pages of a :class:`LazyDocumentation`,
+    which is the documentation attribute of the server
+    """
+
+    def do_GET(self):
+        """Sends the requested page
+
+        A page whose diagram failed is sent with its error message, but
+        with the status 500 like a page which could not be created at all.
+        """
+        path = unquote(urlsplit(self.path).path).lstrip("/") or "index.html"
+        key = self.server.documentation.pages.get(path)
+        if key is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        status = HTTPStatus.OK
+        try:
+            page = self.server.documentation.page(key)
+        except FailedPageError as error:
+            status = HTTPStatus.INTERNAL_SERVER_ERROR
+            page = error.page
+        except Exception as error:
+            LOG.error("Failed to create %s: %s", path, error)
+            LOG.debug("Traceback of %s", path, exc_info=error)
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR)
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, message_format, *args):
+        """Logs the requests with the logger of the module"""
+        LOG.debug("%s %s", self.address_string(), message_format % args)
+
+
+class DocumentationServer(ThreadingMixIn, HTTPServer):
+    """A HTTP server, which answers every request in its own thread
+
+    :param documentation: The documentation to serve
+    :type documentation: :class:`LazyDocumentation`
+    :param int port: The port on localhost
+    """
+    daemon_threads = True
+
+    def __init__(self, documentation, port):
+        super().__init__((HOST, port), DocumentationHandler)
+        self.documentation = documentation
+
+
+def serve(rngfile, port=8000, **kwargs):
+    """Serves the HTML documentation of a RNG file on localhost until the
+    server is interrupted with Ctrl+C
+
+    The keyword cache_size is the number of cached pages, warm the number
+    of pages of popular elements, which are created before the server
+    starts (see :meth:`LazyDocumentation.warm`), and threads the number of
+    threads for them. All other keywords are passed on to
+    :class:`LazyDocumentation`.
+
+    :param rngfile: path to the RNG file (in XML format)
+    :type rngfile: str
+    :param int port: The port on localhost
+    :param kwargs: Options for the documentation
+    :return: None
+    """
+    cache_size = kwargs.pop("cache_size", 128)
+    warm = kwargs.pop("warm", 0)
+    threads = kwargs.pop("threads", 1)
+    documentation = LazyDocumentation(rngfile, cache_size, **kwargs)
+    if warm:
+        documentation.warm(warm, threads)
+    server = DocumentationServer(documentation, port)
+    LOG.info("Serving the documentation of %r on http://%s:%d/",
+             rngfile, HOST, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        LOG.info("Server stopped")
+    finally:
+        server.server_close()
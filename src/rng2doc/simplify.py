@@ -0,0 +1,316 @@
+"""Simplification of RELAX NG grammars before the transformation
+
+The rules follow section 4 of the RELAX NG specification as far as they
+matter for the documentation: includes are resolved, div elements are
+flattened, combined defines are merged and references to defines without
+elements are replaced by the content of the define.
+"""
+
+# Standard Library
+import copy
+import hashlib
+import json
+import logging
+import os
+from urllib.parse import urljoin
+
+# Third Party Libraries
+from lxml import etree
+
+# Local imports
+from .common import (RNG_DEFINE,
+                     RNG_DIV,
+                     RNG_ELEMENT,
+                     RNG_GRAMMAR,
+                     RNG_GROUP,
+                     RNG_INCLUDE,
+                     RNG_REF,
+                     RNG_START)
+from .large import parse_large
+from .writer import write_file
+
+LOG = logging.getLogger(__name__)
+
+#: Changes with the simplification rules and invalidates the cache
+VERSION = "1"
+
+#: Attributes, which are inherited by the descendants of a pattern
+INHERITED_ATTRIBUTES = ("ns", "datatypeLibrary")
+
+
+def unwrap(node, parent=None):
+    """Replaces a node by its children, which inherit its ns and
+    datatypeLibrary attributes
+
+    :param node: The node which should be replaced
+    :type node: etree.Element
+    :param parent: The node which should get the children at its start
+                   instead of the parent of node
+    :type parent: etree.Element
+    :return: None
+    """
+    if parent is None:
+        parent = node.getparent()
+        position = parent.index(node)
+        parent.remove(node)
+    else:
+        position = 0
+    for child in reversed(list(node)):
+        for attribute in INHERITED_ATTRIBUTES:
+            if node.get(attribute) is not None and child.get(attribute) is None:
+                child.attrib[attribute] = node.get(attribute)
+        parent.insert(position, child)
+
+
+def inherited(node, attribute):
+    """Returns the value of an inherited attribute of a node, which is
+    empty if neither the node nor one of its ancestors has it
+
+    :param node: A pattern of the grammar
+    :type node: etree.Element
+    :param str attribute: ns or datatypeLibrary
+    :rtype: str
+    """
+    if node.get(attribute) is not None:
+        return node.get(attribute)
+    for ancestor in node.iterancestors():
+        if ancestor.get(attribute) is not None:
+            return ancestor.get(attribute)
+    return ""
+
+
+def flatten_divs(root):
+    """Replaces every div by its content
+
+    :param root: The root of the grammar
+    :type root: etree.Element
+    :return: None
+    """
+    for div in list(root.iter(RNG_DIV.text)):
+        unwrap(div)
+
+
+def resolve_includes(root, base_url, dependencies, large=False):
+    """Replaces every include by the content of the included grammar
+
+    The defines and the start of an include override the ones of the
+    included grammar.
+
+    :param root: The root of the grammar
+    :type root: etree.Element
+    :param str base_url: The URL of the grammar
+    :param dependencies: Gets the paths of all included files
+    :type dependencies: list(str)
+    :param bool large: Read the included files with
+                       :func:`rng2doc.large.parse_large`
+    :return: None
+    """
+    for include in list(root.iter(RNG_INCLUDE.text)):
+        href = urljoin(base_url or "", include.get("href"))
+        dependencies.append(href)
+        if large:
+            included = parse_large(href).getroot()
+        else:
+            parser = etree.XMLParser(remove_blank_text=True, remove_comments=True)
+            included = etree.parse(href, parser).getroot()
+        resolve_includes(included, href, dependencies, large)
+        flatten_divs(included)
+        flatten_divs(include)
+
+        overrides = set(define.get("name") for define in include.iterchildren(RNG_DEFINE.text))
+        for define in list(included.iterchildren(RNG_DEFINE.text)):
+            if define.get("name") in overrides:
+                included.remove(define)
+        if include.find(RNG_START.text) is not None:
+            for start in list(included.iterchildren(RNG_START.text)):
+                included.remove(start)
+
+        for attribute in INHERITED_ATTRIBUTES:
+            if include.get(attribute) is not None and included.get(attribute) is None:
+                included.attrib[attribute] = include.get(attribute)
+        unwrap(included, include)
+        unwrap(include)
+
+
+def merge_combined(root):
+    """Merges all defines with the same name and all starts into one,
+    combined by their combine attribute
+
+    :param root: The root of the grammar
+    :type root: etree.Element
+    :return: None
+    """
+    for grammar in root.iter(RNG_GRAMMAR.text):
+        parts = {}
+        for node in grammar.iterchildren(RNG_DEFINE.text, RNG_START.text):
+            parts.setdefault((node.tag, node.get("name")), []).append(node)
+
+        for (_, name), nodes in parts.items():
+            if len(nodes) < 2:
+                continue
+            combine = next((node.get("combine") for node in nodes
+                            if node.get("combine") is not None), None)
+            if combine is None:
+                LOG.warning("%r is defined %d times without combine, keeping the last one",
+                            name or "start", len(nodes))
+                for node in nodes[:-1]:
+                    grammar.remove(node)
+                continue
+
+            pattern = etree.Element(etree.QName(RNG_DEFINE.namespace, combine))
+            for node in nodes:
+                if len(node) > 1:
+                    group = etree.SubElement(pattern, RNG_GROUP.text)
+                    group.extend(node)
+                else:
+                    pattern.extend(node)
+            first = nodes[0]
+            first.attrib.pop("combine", None)
+            first.append(pattern)
+            for node in nodes[1:]:
+                grammar.remove(node)
+
+
+def inline_refs(root):
+    """Replaces every reference to a define without elements by the content
+    of the define and removes these defines
+
+    The content is inserted without a group, just like
+    :func:`rng2doc.rng.transform` expands a reference. The defines get
+    their inherited ns and datatypeLibrary attributes first (section 4.8
+    of the specification), so the content keeps them at the place of the
+    reference.
+
+    :param root: The root of the grammar
+    :type root: etree.Element
+    :return: None
+    """
+    if root.tag != RNG_GRAMMAR.text or root.find(".//" + RNG_GRAMMAR.text) is not None:
+        # The references of nested grammars have their own scope
+        return
+    defines = {define.get("name"): define for define in root.iterchildren(RNG_DEFINE.text)
+               if next(define.iter(RNG_ELEMENT.text), None) is None}
+
+    for define in defines.values():
+        for attribute in INHERITED_ATTRIBUTES:
+            define.attrib[attribute] = inherited(define, attribute)
+
+    # Every round inlines one more level of references, deeper levels
+    # than defines can only exist with (invalid) recursive defines
+    for _ in range(len(defines) + 1):
+        refs = [ref for ref in root.iter(RNG_REF.text) if ref.get("name") in defines]
+        if not refs:
+            break
+        for ref in refs:
+            content = copy.deepcopy(defines[ref.get("name")])
+            unwrap(content, ref)
+            unwrap(ref)
+
+    for define in defines.values():
+        root.remove(define)
+
+
+def simplify(rngtree, dependencies=None, large=False):
+    """Simplifies a RELAX NG grammar
+
+    :param rngtree: The RELAX NG tree
+    :type rngtree: etree.ElementTree
+    :param dependencies: Gets the paths of all included files
+    :type dependencies: list(str)
+    :param bool large: Read the included files with
+                       :func:`rng2doc.large.parse_large`
+    :return: The simplified RELAX NG tree
+    :rtype: etree.ElementTree
+    """
+    if dependencies is None:
+        dependencies = []
+    root = rngtree.getroot()
+    resolve_includes(root, rngtree.docinfo.URL, dependencies, large)
+    flatten_divs(root)
+    merge_combined(root)
+    inline_refs(root)
+    return rngtree
+
+
+def file_digest(path):
+    """Returns the hash of the content of a file
+
+    :param str path: The path to the file
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as data:
+        for chunk in iter(lambda: data.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_paths(cache_dir, rngfile):
+    """Returns the paths of the cached grammar and its manifest
+
+    The cache key is the hash of the absolute path and the content of the
+    input file and the version of the simplification rules, as the same
+    file includes other files from another directory.
+
+    :param str cache_dir: The cache directory
+    :param str rngfile: The path to the RNG file
+    :rtype: tuple
+    """
+    key = hashlib.sha256("{}\n{}\n{}".format(
+        VERSION, os.path.abspath(rngfile), file_digest(rngfile)).encode("utf-8"))
+    name = os.path.join(cache_dir, key.hexdigest())
+    return name + ".rng", name + ".json"
+
+
+def load_cached(cache_dir, rngfile, parser, dependencies=None):
+    """Loads the simplified grammar of a RNG file from the cache
+
+    A cached grammar is only used, if it belongs to the same input file
+    and none of its included files changed.
+
+    :param str cache_dir: The cache directory
+    :param str rngfile: The path to the RNG file
+    :param parser: The parser for the cached grammar
+    :type parser: etree.XMLParser
+    :param dependencies: Gets the paths of all included files of a cached
+                         grammar
+    :type dependencies: list(str)
+    :return: The simplified RELAX NG tree or None
+    :rtype: etree.ElementTree
+    """
+    grammar, manifest = cache_paths(cache_dir, rngfile)
+    try:
+        with open(manifest) as manifestfile:
+            content = json.load(manifestfile)
+        if content["input"] != os.path.abspath(rngfile):
+            return None
+        included = content["dependencies"]
+        if any(file_digest(path) != digest for path, digest in included):
+            LOG.info("An included file changed, simplifying %r again", rngfile)
+            return None
+        rngtree = etree.parse(grammar, parser)
+    except (OSError, ValueError, KeyError, etree.XMLSyntaxError):
+        return None
+    LOG.info("Using the simplified grammar %r", grammar)
+    if dependencies is not None:
+        dependencies.extend(path for path, _ in included)
+    return rngtree
+
+
+def store_cached(cache_dir, rngfile, rngtree, dependencies):
+    """Saves the simplified grammar of a RNG file in the cache
+
+    :param str cache_dir: The cache directory
+    :param str rngfile: The path to the RNG file
+    :param rngtree: The simplified RELAX NG tree
+    :type rngtree: etree.ElementTree
+    :param dependencies: The paths of all included files
+    :type dependencies: list(str)
+    :return: None
+    """
+    grammar, manifest = cache_paths(cache_dir, rngfile)
+    dependencies = [(path, file_digest(path)) for path in dependencies]
+    write_file(grammar, etree.tostring(rngtree, encoding="utf-8"))
+    write_file(manifest, json.dumps(dict(input=os.path.abspath(rngfile),
+                                         dependencies=dependencies),
+                                    indent=2).encode("utf-8"))
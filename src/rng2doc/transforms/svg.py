@@ -28,6 +28,9 @@ from ..common import (RNG_ANY_NAME,  # A_DOC,; RNG_DEFINE,
 
 LOG = logging.getLogger(__name__)
 
+#: The number of values in the node of a large enumeration
+VALUES_SHOWN = 3
+
 
 def transform_element_svg(node, **kwargs):
     """Transforms a RELAX NG element into a graphviz node.
@@ -115,6 +118,26 @@ def transform_value_svg(node, **kwargs):
     return pydot.Node(name=identifier, **graphviz_attributes)
 
 
+def transform_values_svg(nodes, **kwargs):
+    """Transforms the RELAX NG values of a large enumeration into a single
+    graphviz node, which shows the first values and their number.
+    """
+    names = [node.attrib["datatypeLibrary"] if node.text is None else node.text
+             for node in nodes[:VALUES_SHOWN]]
+    name = '"' + " | ".join(names) + " ... ({} values)".format(len(nodes)) + '"'
+
+    graphviz_attributes = {
+        "label": name,
+        "shape": "box",
+        "style": "filled",
+        "fillcolor": "#a2a4aa",
+    }
+    index = kwargs.pop("index", False)
+    identifier = "node{}".format(index)
+
+    return pydot.Node(name=identifier, **graphviz_attributes)
+
+
 def transform_param_svg(node, **kwargs):
     """Transforms a RELAX NG param into a graphviz node.
     """
@@ -321,6 +344,51 @@ def transform_div_svg(node, **kwargs):
     return pydot.Node(name=identifier, **graphviz_attributes)
 
 
+def define_url(name):
+    """Returns the relative URL of the HTML page of a define diagram.
+    """
+    return "../defines/{}.html".format(name.replace(":", "_"))
+
+
+def transform_define_svg(node, **kwargs):
+    """Transforms a RELAX NG define into the root node of a define diagram.
+    """
+    name = '"' + node.get("name") + '"'
+
+    graphviz_attributes = {
+        "label": name,
+        "shape": "component",
+        "style": "filled",
+        "fillcolor": "#d9f2d0",
+    }
+
+    index = kwargs.pop("index", False)
+    identifier = "node{}".format(index)
+
+    return pydot.Node(name=identifier, **graphviz_attributes)
+
+
+def transform_ref_svg(node, **kwargs):
+    """Transforms a collapsed RELAX NG ref into a graphviz node, which links
+    to the diagram of the referenced define.
+    """
+    name = node.get("name")
+
+    graphviz_attributes = {
+        "label": '"' + name + '"',
+        "shape": "component",
+        "style": "filled",
+        "fillcolor": "#d9f2d0",
+        "URL": '"' + define_url(name) + '"',
+        "target": "_top",
+    }
+
+    index = kwargs.pop("index", False)
+    identifier = "node{}".format(index)
+
+    return pydot.Node(name=identifier, **graphviz_attributes)
+
+
 def transform_a_doc_svg(node, **kwargs):
     """Transforms a documentation string into a graphviz node.
     """
@@ -368,4 +436,7 @@ SVG = {
     RNG_DIV: transform_div_svg,
     # A_DOC: transform_a_doc_svg,
     "append": append_method_svg,
+    "define": transform_define_svg,
+    "ref": transform_ref_svg,
+    "values": transform_values_svg,
 }
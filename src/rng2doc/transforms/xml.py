@@ -2,6 +2,7 @@
 """
 
 # Standard Library
+import hashlib
 import logging
 
 # Third Party Libraries
@@ -70,7 +71,7 @@ def transform_element(node, **kwargs):
         if namespace:
             element_namespace.text = namespace
     else:
-        element = etree.Element("child", id=attributes["id"])
+        element = etree.Element("child", id=attributes["id"], name=attributes["name"])
     return element
 
 
@@ -150,6 +151,28 @@ def transform_value(node, **kwargs):
     return value
 
 
+def transform_values(nodes, **kwargs):
+    """Transforms the RELAX NG values of a large enumeration into one
+    table, whose id is a hash of the values
+    """
+    values = etree.Element("values", count=str(len(nodes)))
+    digest = hashlib.sha1()
+    for node in nodes:
+        value = transform_value(node)
+        digest.update(value.get("name").encode("utf-8") + b"\0")
+        digest.update((value.findtext("description") or "").encode("utf-8") + b"\0")
+        values.append(value)
+    values.attrib["id"] = digest.hexdigest()[:16]
+    return values
+
+
+def transform_attribute_group(node, **kwargs):
+    """Transforms a RELAX NG ref to a define of attributes into a reference
+    to its attribute group
+    """
+    return etree.Element("attribute-group", ref=node.get("name"))
+
+
 def transform_optional(node, **kwargs):
     """Sets the optional flag.
     """
@@ -173,4 +196,6 @@ XML = {
     RNG_VALUE: transform_value,
     A_DOC: transform_description,
     "append": append_method_xml,
+    "values": transform_values,
+    "group": transform_attribute_group,
 }
@@ -0,0 +1,133 @@
+"""Writing the output files atomically and only if their content changed
+"""
+
+# Standard Library
+import gzip
+import io
+import logging
+import os
+import tempfile
+from collections import Counter
+
+LOG = logging.getLogger(__name__)
+
+#: File extensions which get precompressed siblings
+COMPRESSIBLE = (".html", ".svg", ".js")
+
+#: Supported compression formats by their file extension
+COMPRESSIONS = ("gz", "br")
+
+
+def compress(data, compression):
+    """Compresses data reproducibly
+
+    :param bytes data: The data which should be compressed
+    :param str compression: The compression format (gz, br)
+    :raises: :class:`RuntimeError` if the format is not available
+    :return: The compressed data
+    :rtype: bytes
+    """
+    if compression == "gz":
+        # A fixed mtime keeps the compressed file stable for the same data
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=9, mtime=0) as compressed:
+            compressed.write(data)
+        return buffer.getvalue()
+    if compression == "br":
+        try:
+            import brotli
+        except ImportError:
+            raise RuntimeError("The br compression needs the brotli module.")
+        return brotli.compress(data)
+    raise RuntimeError("Unknown compression {!r}.".format(compression))
+
+
+def write_file(file_path, data, **kwargs):
+    """Writes data atomically to a file, if its content changed
+
+    The data is written into a temporary file in the same directory, which
+    replaces the file afterwards. A file with the same content is not
+    touched, so its mtime stays the same. For HTML and SVG files each
+    format of compressions gets a sibling with the compressed data.
+
+    :param str file_path: The path to the file
+    :param bytes data: The new content of the file
+    :param kwargs: Options for writing
+    :return: True if the file was written
+    :rtype: bool
+    """
+    compressions = kwargs.pop("compressions", ())
+    stats = kwargs.pop("stats", None)
+    if stats is None:
+        stats = Counter()
+
+    try:
+        with open(file_path, "rb") as current:
+            changed = current.read() != data
+    except FileNotFoundError:
+        changed = True
+
+    if file_path.endswith(COMPRESSIBLE):
+        for compression in compressions:
+            sibling = "{}.{}".format(file_path, compression)
+            if changed or not os.path.exists(sibling):
+                write_file(sibling, compress(data, compression), stats=stats)
+
+    if not changed:
+        stats["unchanged"] += 1
+        return False
+
+    path = os.path.dirname(file_path) or "."
+    os.makedirs(path, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=path, prefix=".rng2doc-")
+    try:
+        with os.fdopen(descriptor, "wb") as temp:
+            temp.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    stats["written"] += 1
+    return True
+
+
+def sync_tree(source, destination, **kwargs):
+    """Writes all files of the source directory into the destination
+    directory with :func:`write_file`
+
+    The keyword prune names the subdirectories, which hold only generated
+    files. A file in one of them, which is not in the source directory
+    anymore, is deleted together with its compressed siblings. All other
+    files of the destination directory are kept.
+
+    :param str source: The directory with the new files
+    :param str destination: The directory which should be updated
+    :param kwargs: Options for :func:`write_file`
+    :return: None
+    """
+    prune = kwargs.pop("prune", ())
+    stats = kwargs.pop("stats", None)
+    if stats is None:
+        stats = Counter()
+    for root, _, filenames in os.walk(source):
+        relative = os.path.relpath(root, source)
+        for filename in sorted(filenames):
+            with open(os.path.join(root, filename), "rb") as new:
+                data = new.read()
+            write_file(os.path.normpath(os.path.join(destination, relative, filename)),
+                       data, stats=stats, **kwargs)
+
+    for directory in prune:
+        for root, _, filenames in os.walk(os.path.join(destination, directory)):
+            relative = os.path.relpath(root, destination)
+            for filename in sorted(filenames):
+                original, extension = os.path.splitext(filename)
+                if extension[1:] not in COMPRESSIONS or not original.endswith(COMPRESSIBLE):
+                    original = filename
+                # A compressed sibling stays as long as its file stays
+                if os.path.exists(os.path.join(source, relative, original)):
+                    continue
+                LOG.debug("Deleting %s", os.path.join(root, filename))
+                os.unlink(os.path.join(root, filename))
+                stats["deleted"] += 1
@@ -0,0 +1,238 @@
+"""Generated RELAX NG schemas for the benchmark
+
+The schemas imitate the shape of large real world schemas instead of
+copying them: every generator takes a size and returns the same grammar
+for the same size, so the baselines of different runs are comparable.
+
+* docbook: shared attribute sets, a large choice of inline elements, which
+  contain each other, documented elements and recursive sections
+* xhtml: nested attribute modules, block and inline content models with
+  interleave and small enumerations
+* svg: many presentation attributes, a large color enumeration and
+  datatypes with parameters
+* deep: a long chain of references without elements
+* wide: one element with a choice of all others, which all share a child
+* annotated: mostly annotations of a schema generator, which are not
+  documented
+"""
+
+# Third Party Libraries
+from lxml import etree
+from lxml.builder import ElementMaker
+
+RNG_NS = "http://relaxng.org/ns/structure/1.0"
+A_NS = "http://relaxng.org/ns/compatibility/annotations/1.0"
+XSD = "http://www.w3.org/2001/XMLSchema-datatypes"
+GENERATOR_NS = "urn:x-rng2doc-benchmark:generator"
+
+R = ElementMaker(namespace=RNG_NS, nsmap={None: RNG_NS, "a": A_NS, "g": GENERATOR_NS})
+A = ElementMaker(namespace=A_NS)
+G = ElementMaker(namespace=GENERATOR_NS)
+
+
+def ref(name):
+    return R.ref(name=name)
+
+
+def optional_attributes(names, documented=False):
+    attributes = []
+    for name in names:
+        attribute = R.attribute(name=name)
+        if documented:
+            attribute.insert(0, A.documentation("The {} attribute".format(name)))
+        attributes.append(R.optional(attribute))
+    return attributes
+
+
+def enumeration(name, values):
+    return R.attribute(R.choice(*[R.value(value) for value in values]), name=name)
+
+
+def grammar(start, defines):
+    return R.grammar(R.start(ref(start)), *defines, datatypeLibrary=XSD)
+
+
+def docbook(size):
+    """A grammar like DocBook 5 with size elements"""
+    inlines = ["inline{}".format(number) for number in range(size // 2)]
+    blocks = ["block{}".format(number) for number in range(size - len(inlines) - 2)]
+    defines = [
+        R.define(*optional_attributes(
+            ["id", "lang", "base", "role", "remap", "xreflabel", "revisionflag",
+             "dir", "arch", "audience", "condition", "conformance", "os", "revision",
+             "security", "userlevel", "vendor", "wordsize", "annotations", "version"],
+            documented=True), name="db.common.attributes"),
+        R.define(*optional_attributes(
+            ["linkend", "linkends", "href", "type", "linkrole", "arcrole", "linktitle",
+             "show", "actuate"]),
+            name="db.common.linking.attributes"),
+        R.define(R.choice(R.text(), *[ref(name) for name in inlines]), name="db.inlines"),
+        R.define(R.choice(*[ref(name) for name in blocks]), name="db.blocks"),
+        R.define(R.element(
+            A.documentation("A book"),
+            ref("db.common.attributes"),
+            R.element(R.zeroOrMore(ref("db.inlines")), name="title"),
+            R.oneOrMore(ref("section")), name="book"), name="book"),
+        R.define(R.element(
+            A.documentation("A section, which contains blocks and other sections"),
+            ref("db.common.attributes"),
+            R.element(R.zeroOrMore(ref("db.inlines")), name="title"),
+            R.zeroOrMore(R.choice(ref("db.blocks"), ref("section"))),
+            name="section"), name="section"),
+    ]
+    for number, name in enumerate(inlines):
+        defines.append(R.define(R.element(
+            A.documentation("The inline element {}".format(number)),
+            ref("db.common.attributes"),
+            ref("db.common.linking.attributes"),
+            R.optional(enumeration("class", ["a", "b", "c", "d", "e"])),
+            R.zeroOrMore(ref("db.inlines")), name=name), name=name))
+    for number, name in enumerate(blocks):
+        defines.append(R.define(R.element(
+            A.documentation("The block element {}".format(number)),
+            ref("db.common.attributes"),
+            R.optional(R.element(R.zeroOrMore(ref("db.inlines")), name="title")),
+            R.oneOrMore(R.choice(ref("db.inlines"), ref(blocks[(number + 1) % len(blocks)]))),
+            name=name), name=name))
+    return grammar("book", defines)
+
+
+def xhtml(size):
+    """A grammar like modular XHTML with size elements"""
+    inlines = ["span{}".format(number) for number in range(size // 2)]
+    blocks = ["div{}".format(number) for number in range(size - len(inlines) - 1)]
+    events = ["on" + event for event in (
+        "click", "dblclick", "mousedown", "mouseup", "mouseover", "mousemove", "mouseout",
+        "keypress", "keydown", "keyup")]
+    defines = [
+        R.define(R.optional(R.attribute(R.data(type="ID"), name="id")),
+                 *optional_attributes(["class", "style", "title"]), name="Core.attrib"),
+        R.define(R.optional(R.attribute(R.data(type="language"), name="lang")),
+                 R.optional(enumeration("dir", ["ltr", "rtl"])), name="I18n.attrib"),
+        R.define(*optional_attributes(events), name="Events.attrib"),
+        R.define(ref("Core.attrib"), ref("I18n.attrib"), ref("Events.attrib"),
+                 name="Common.attrib"),
+        R.define(R.zeroOrMore(R.choice(R.text(), *[ref(name) for name in inlines])),
+                 name="Inline.model"),
+        R.define(R.zeroOrMore(R.choice(R.text(), *[ref(name) for name in inlines + blocks])),
+                 name="Flow.model"),
+        R.define(R.element(
+            ref("I18n.attrib"),
+            R.interleave(R.element(R.text(), name="title"),
+                         R.zeroOrMore(R.element(ref("Core.attrib"), R.empty(), name="meta"))),
+            R.element(ref("Common.attrib"), ref("Flow.model"), name="body"),
+            name="html"), name="html"),
+    ]
+    for number, name in enumerate(inlines):
+        defines.append(R.define(R.element(
+            ref("Common.attrib"), ref("Inline.model"), name=name), name=name))
+    for number, name in enumerate(blocks):
+        defines.append(R.define(R.element(
+            ref("Common.attrib"),
+            R.optional(enumeration("align", ["left", "center", "right", "justify"])),
+            ref("Flow.model") if number % 2 else ref("Inline.model"),
+            name=name), name=name))
+    return grammar("html", defines)
+
+
+#: The color keywords of CSS, which make a large enumeration
+COLORS = [
+    "{}{}".format(prefix, color)
+    for prefix in ("", "dark", "light", "medium", "pale", "deep")
+    for color in ("red", "green", "blue", "cyan", "magenta", "yellow", "gray", "orange",
+                  "violet", "pink", "brown", "olive", "slate", "sea", "sky", "steel",
+                  "turquoise", "orchid", "salmon", "khaki", "goldenrod", "coral", "aqua",
+                  "lime", "navy")
+]
+
+
+def svg(size):
+    """A grammar like SVG with size elements"""
+    shapes = ["shape{}".format(number) for number in range(size - 1)]
+    presentation = ["presentation{}".format(number) for number in range(40)]
+    defines = [
+        R.define(*[R.optional(R.attribute(R.ref(name="Color.datatype"), name=name))
+                   for name in ("fill", "stroke", "stop-color", "flood-color",
+                                "lighting-color")],
+                 *[R.optional(enumeration(name, ["inherit", "auto", "none", name]))
+                   for name in presentation],
+                 name="Presentation.attrib"),
+        R.define(R.choice(*[R.value(color) for color in COLORS],
+                          R.data(R.param("#[0-9a-fA-F]{6}", name="pattern"), type="string")),
+                 name="Color.datatype"),
+        R.define(*[R.optional(R.attribute(R.data(R.param("0", name="minInclusive"),
+                                                 type="decimal"), name=name))
+                   for name in ("x", "y", "width", "height", "rx", "ry")],
+                 name="Geometry.attrib"),
+        R.define(R.zeroOrMore(R.choice(*[ref(name) for name in shapes])), name="Shapes.model"),
+        R.define(R.element(ref("Presentation.attrib"), ref("Shapes.model"), name="svg"),
+                 name="svg"),
+    ]
+    for number, name in enumerate(shapes):
+        content = ref("Shapes.model") if number % 4 == 0 else R.empty()
+        defines.append(R.define(R.element(
+            ref("Presentation.attrib"), ref("Geometry.attrib"), content, name=name),
+            name=name))
+    return grammar("svg", defines)
+
+
+def deep(size):
+    """A grammar with ten elements, which refer to a chain of size defines"""
+    defines = [R.define(R.element(*[R.element(ref("chain0"), name="e{}".format(number))
+                                    for number in range(10)], name="root"), name="root")]
+    for number in range(size):
+        content = [R.optional(R.attribute(name="a{}".format(number)))]
+        if number + 1 < size:
+            content.append(ref("chain{}".format(number + 1)))
+        defines.append(R.define(*content, name="chain{}".format(number)))
+    return grammar("root", defines)
+
+
+def wide(size):
+    """A grammar with a choice of size elements, which share a child"""
+    names = ["item{}".format(number) for number in range(size)]
+    defines = [
+        R.define(R.element(R.zeroOrMore(R.choice(*[ref(name) for name in names])),
+                           name="root"), name="root"),
+        R.define(R.element(R.text(), name="leaf"), name="leaf"),
+    ]
+    for name in names:
+        defines.append(R.define(R.element(
+            R.attribute(name="id"), R.optional(ref("leaf")), name=name), name=name))
+    return grammar("root", defines)
+
+
+def annotated(size):
+    """A grammar with size elements, whose defines carry the source model
+    of a schema generator"""
+    names = ["record{}".format(number) for number in range(size)]
+    defines = [R.define(R.element(R.zeroOrMore(R.choice(*[ref(name) for name in names])),
+                                  name="root"), name="root")]
+    for number, name in enumerate(names):
+        source = G.source(*[G.field(G.description("Field {} of {}".format(field, name) * 4),
+                                    name="field{}".format(field), type="string")
+                            for field in range(20)], table=name)
+        defines.append(R.define(source, R.element(
+            A.documentation("The record {}".format(number)),
+            G.mapping(column="id"),
+            R.attribute(R.data(type="ID"), name="id"),
+            *optional_attributes(["field{}".format(field) for field in range(5)]),
+            name=name), name=name))
+    return grammar("root", defines)
+
+
+#: The generators by the name of their schema
+SCHEMAS = dict(docbook=docbook, xhtml=xhtml, svg=svg, deep=deep, wide=wide,
+               annotated=annotated)
+
+
+def write_schema(name, size, path):
+    """Writes a generated schema into a file
+
+    :param str name: The name of the schema in :data:`SCHEMAS`
+    :param int size: The size of the schema, about the number of elements
+    :param str path: The RNG file
+    :return: None
+    """
+    etree.ElementTree(SCHEMAS[name](size)).write(path, pretty_print=True,
+                                                 xml_declaration=True, encoding="UTF-8")
@@ -0,0 +1,296 @@
+"""Runs the benchmark and compares it with the baselines
+
+Usage:
+    benchmark.run [options] [CASE...]
+
+Arguments:
+    CASE                  The cases to run, all if none is given
+
+Options:
+    -h, --help            Shows this help
+    --update              Write the measurements into the baselines
+    --baselines=<FILE>    The JSON file of the baselines, defaults to
+                          baselines.json next to this script
+    --output=<FILE>       Write the measurements as JSON into FILE
+    --repeat=<N>          Measure every size N times and keep the fastest
+                          run [default: 2]
+
+Every case creates the documentation of a generated schema (see
+:mod:`benchmark.corpus`) at two sizes, each in its own process. The phases
+parse, xml (the serialization) and html (the HTML stylesheet) record their
+CPU time, which does not depend on the load of the machine, their wall
+time, the peak RSS of the process after the phase and the size of their
+output.
+
+Rendering the diagrams is out of scope: parse creates the DOT sources like
+the dot output format, so graphviz does not run and the benchmark measures
+rng2doc only. The time of the layouts depends on the installed graphviz
+and is bounded by the --timeout and --max-nodes options instead.
+
+A case fails, if the CPU time of a phase grows faster with the size of the
+schema than in the baseline (see :func:`scaling_exponent`), if its peak RSS
+grows from the smaller to the larger size by more than
+:data:`RSS_TOLERANCE` times the growth in the baseline plus
+:data:`RSS_SLACK_KB` or if the output size changes by more than
+:data:`BYTES_TOLERANCE`. The absolute times and the peak RSS itself depend
+on the machine and the platform, so they are only reported.
+
+Run it from the top directory with the tests on the Python path::
+
+    PYTHONPATH=tests python -m benchmark.run
+"""
+
+# Standard Library
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Third Party Libraries
+from docopt import docopt
+from lxml import etree
+
+# My Stuff
+from benchmark.corpus import write_schema
+from rng2doc.cli import output
+from rng2doc.rng import parse
+
+#: The cases by their name: the schema, the options of parse and the sizes
+CASES = {
+    "docbook": ("docbook", {}, (80, 240)),
+    "docbook-grouped": ("docbook", dict(ref_depth=1, attribute_groups=True), (80, 240)),
+    "xhtml": ("xhtml", {}, (80, 240)),
+    "svg": ("svg", {}, (15, 45)),
+    "svg-values": ("svg", dict(max_values=20), (30, 90)),
+    "deep": ("deep", {}, (200, 800)),
+    "wide": ("wide", {}, (800, 2400)),
+    "annotated": ("annotated", {}, (400, 1200)),
+    "annotated-large": ("annotated", dict(large_input=True), (400, 1200)),
+}
+
+#: The phases of a case in their order
+PHASES = ("parse", "xml", "html")
+
+#: How much the scaling exponent of a phase may exceed its baseline
+EXPONENT_TOLERANCE = 0.4
+
+#: Phases, which are faster than this number of seconds at the smaller
+#: size, are too noisy for a scaling exponent
+MIN_SECONDS = 0.2
+
+#: The factor, by which the growth of the peak RSS may exceed its baseline
+RSS_TOLERANCE = 1.5
+
+#: The growth of the peak RSS in kB, which is allowed in addition, as the
+#: allocators of the platforms differ
+RSS_SLACK_KB = 16 * 1024
+
+#: The relative change of the output size, which is allowed
+BYTES_TOLERANCE = 0.1
+
+#: The default file of the baselines
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+
+def directory_size(path):
+    """Returns the size of all files below a directory in bytes"""
+    return sum(os.path.getsize(os.path.join(root, filename))
+               for root, _, filenames in os.walk(path) for filename in filenames)
+
+
+def peak_rss():
+    """Returns the peak RSS of the process in kB"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes instead of kB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def clock():
+    """Returns the CPU time and the wall time in seconds"""
+    return time.process_time(), time.perf_counter()
+
+
+def measure(name, size):
+    """Creates the documentation of a case at one size
+
+    :param str name: The name of the case in :data:`CASES`
+    :param int size: The size of the schema
+    :return: The CPU seconds, wall seconds, peak RSS in kB and output bytes
+             of every phase
+    :rtype: dict
+    """
+    schema, options, _ = CASES[name]
+    phases = {}
+
+    def record(phase, start, size_bytes):
+        cpu, wall = clock()
+        phases[phase] = dict(seconds=cpu - start[0], wall=wall - start[1], bytes=size_bytes,
+                             rss_kb=peak_rss())
+
+    with tempfile.TemporaryDirectory(prefix="rng2doc-benchmark-") as path:
+        rngfile = os.path.join(path, "schema.rng")
+        write_schema(schema, size, rngfile)
+        start = clock()
+        graphs = {}
+        result = parse(rngfile, graphs=graphs, **options)
+        record("parse", start, sum(len(source) for source in graphs.values()))
+        start = clock()
+        data = etree.tostring(result, pretty_print=True, xml_declaration=True, encoding="UTF-8")
+        record("xml", start, len(data))
+        start = clock()
+        output(result, os.path.join(path, "index.html"), "html")
+        record("html", start, directory_size(os.path.join(path, "html")))
+    return phases
+
+
+def measure_process(name, size):
+    """Runs :func:`measure` in a new process, so the peak RSS only belongs
+    to this case and size
+
+    :param str name: The name of the case in :data:`CASES`
+    :param int size: The size of the schema
+    :return: The result of :func:`measure`
+    :rtype: dict
+    """
+    tests = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [tests, env.get("PYTHONPATH")]))
+    process = subprocess.run(
+        [sys.executable, "-c",
+         "import json, sys; from benchmark.run import measure; "
+         "print(json.dumps(measure(sys.argv[1], int(sys.argv[2]))))", name, str(size)],
+        stdout=subprocess.PIPE, env=env, check=True)
+    return json.loads(process.stdout.decode("utf-8").splitlines()[-1])
+
+
+def scaling_exponent(sizes, seconds):
+    """Returns the exponent k of the time of a phase, which grows like
+    size**k
+
+    >>> round(scaling_exponent((10, 40), (1.0, 16.0)), 2)
+    2.0
+    """
+    small, large = sizes
+    if min(seconds) <= 0:
+        return 0.0
+    return math.log(seconds[1] / seconds[0]) / math.log(large / small)
+
+
+def run_case(name, repeat=2):
+    """Measures a case at both sizes
+
+    :param str name: The name of the case in :data:`CASES`
+    :param int repeat: The number of runs of every size, the fastest counts
+    :return: The sizes and per phase the CPU seconds, wall seconds and peak
+             RSS of both sizes, the scaling exponent of the CPU seconds and
+             the output size of the larger one
+    :rtype: dict
+    """
+    sizes = CASES[name][2]
+    runs = [[measure_process(name, size) for _ in range(repeat)] for size in sizes]
+    phases = {}
+    for phase in PHASES:
+        seconds = [min(run[phase]["seconds"] for run in size_runs) for size_runs in runs]
+        phases[phase] = dict(seconds=[round(second, 4) for second in seconds],
+                             wall=[round(min(run[phase]["wall"] for run in size_runs), 4)
+                                   for size_runs in runs],
+                             exponent=round(scaling_exponent(sizes, seconds), 3),
+                             rss_kb=[min(run[phase]["rss_kb"] for run in size_runs)
+                                     for size_runs in runs],
+                             bytes=runs[-1][0][phase]["bytes"])
+    return dict(sizes=list(sizes), phases=phases)
+
+
+def compare(name, measured, baseline):
+    """Compares the measurements of a case with its baseline
+
+    :param str name: The name of the case
+    :param dict measured: The result of :func:`run_case`
+    :param baseline: The baseline of the case or None
+    :type baseline: dict
+    :return: The failures
+    :rtype: list(str)
+    """
+    if baseline is None:
+        return ["{}: no baseline".format(name)]
+    if baseline["sizes"] != measured["sizes"]:
+        return ["{}: the baseline has the sizes {}".format(name, baseline["sizes"])]
+    failures = []
+    for phase in PHASES:
+        now, then = measured["phases"][phase], baseline["phases"][phase]
+        label = "{} {}".format(name, phase)
+        if (min(now["seconds"]) >= MIN_SECONDS and
+                now["exponent"] > then["exponent"] + EXPONENT_TOLERANCE):
+            failures.append("{}: scales with size**{:.2f} instead of size**{:.2f}".format(
+                label, now["exponent"], then["exponent"]))
+        growth = now["rss_kb"][1] - now["rss_kb"][0]
+        allowed = then["rss_kb"][1] - then["rss_kb"][0]
+        if growth > max(allowed, 0) * RSS_TOLERANCE + RSS_SLACK_KB:
+            failures.append("{}: peak RSS grows by {} kB instead of {} kB".format(
+                label, growth, allowed))
+        if abs(now["bytes"] - then["bytes"]) > then["bytes"] * BYTES_TOLERANCE:
+            failures.append("{}: {} bytes of output instead of {}".format(
+                label, now["bytes"], then["bytes"]))
+    return failures
+
+
+def report(results, baselines):
+    """Prints the measurements next to their baselines"""
+    print("{:<16} {:<6} {:>17} {:>8} {:>13} {:>15} {:>11}".format(
+        "case", "phase", "CPU seconds", "wall", "exponent", "RSS (MB)", "bytes"))
+    for name, measured in results.items():
+        baseline = baselines.get(name, {}).get("phases", {})
+        for phase in PHASES:
+            now = measured["phases"][phase]
+            then = baseline.get(phase, {}).get("exponent")
+            print("{:<16} {:<6} {:>8.3f} {:>8.3f} {:>8.3f} {:>6.2f} ({:>4}) {:>7.1f} {:>7.1f} "
+                  "{:>11}".format(
+                      name, phase, now["seconds"][0], now["seconds"][1], now["wall"][1],
+                      now["exponent"], "-" if then is None else "{:.2f}".format(then),
+                      now["rss_kb"][0] / 1024, now["rss_kb"][1] / 1024, now["bytes"]))
+
+
+def main(cliargs=None):
+    """Runs the benchmark
+
+    :param list(str) cliargs: Arguments to parse or None (=use ``sys.argv``)
+    :return: 1 if a case got worse than its baseline, otherwise 0
+    :rtype: int
+    """
+    args = docopt(__doc__, argv=cliargs)
+    names = args['CASE'] or sorted(CASES)
+    unknown = set(names) - set(CASES)
+    if unknown:
+        print("Unknown cases: {}".format(", ".join(sorted(unknown))), file=sys.stderr)
+        return 1
+    baselines_path = args['--baselines'] or BASELINES
+    baselines = {}
+    if os.path.exists(baselines_path):
+        with open(baselines_path, encoding="utf-8") as baselines_file:
+            baselines = json.load(baselines_file)
+
+    results = dict((name, run_case(name, int(args['--repeat']))) for name in names)
+    report(results, baselines)
+    if args['--output']:
+        with open(args['--output'], "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+    if args['--update']:
+        baselines.update(results)
+        with open(baselines_path, "w", encoding="utf-8") as baselines_file:
+            json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+            baselines_file.write("\n")
+        return 0
+
+    failures = [failure for name in names
+                for failure in compare(name, results[name], baselines.get(name))]
+    for failure in failures:
+        print("FAILED " + failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# Standard Library
+import asyncio
+import io
+import subprocess
+from collections import Counter
+from unittest.mock import patch
+
+# Third Party Libraries
+import pydot
+import pytest
+from lxml import etree
+
+# My Stuff
+from rng2doc import aio
+from rng2doc.rng import parse
+
+GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+  <start><element name="root"><ref name="content"/><ref name="content"/></element></start>
+  <define name="content">
+    <element name="a"><attribute name="x"/><ref name="leaf"/></element>
+  </define>
+  <define name="leaf"><element name="b"><empty/></element></define>
+</grammar>"""
+
+GROUP_GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+  <start>
+    <element name="root"><ref name="common"/><element name="a"><ref name="common"/></element></element>
+  </start>
+  <define name="common"><attribute name="id"/></define>
+</grammar>"""
+
+SVG = b"""<svg xmlns="http://www.w3.org/2000/svg" width="1pt" height="2pt"><g/></svg>"""
+
+
+def complete(coroutine):
+    # Like asyncio.run, which only exists since Python 3.7
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def collect(rngfile, **kwargs):
+    async def run():
+        return [result async for result in aio.iterparse(rngfile, **kwargs)]
+    return complete(run())
+
+
+@pytest.mark.parametrize('script,error', [
+    ("#!/bin/sh\ncat\n", None),
+    ("#!/bin/sh\nexec sleep 5\n", subprocess.TimeoutExpired),
+    ("#!/bin/sh\necho broken >&2\nexit 3\n", RuntimeError),
+])
+def test_run_layout(tmpdir, script, error):
+    prog = tmpdir.join("layout")
+    prog.write(script)
+    prog.chmod(0o755)
+    graph = pydot.Dot(graph_name="test")
+    if error is None:
+        assert complete(aio.run_layout(graph, str(prog), 1)) == graph.to_string().encode()
+    else:
+        with pytest.raises(error):
+            complete(aio.run_layout(graph, str(prog), 0.2))
+
+
+@pytest.mark.parametrize('grammar,ref_depth,grouped', [
+    (GRAMMAR, None, False),
+    (GRAMMAR, 0, False),
+    (GROUP_GRAMMAR, None, True),
+])
+def test_parse(grammar, ref_depth, grouped):
+    with patch('rng2doc.render.run_layout', return_value=SVG):
+        expected = parse(io.StringIO(grammar), ref_depth=ref_depth, attribute_groups=grouped)
+
+    async def layout(graph, prog, timeout=None):
+        return SVG
+
+    with patch('rng2doc.aio.run_layout', side_effect=layout):
+        result = complete(aio.parse(io.StringIO(grammar), ref_depth=ref_depth,
+                                    attribute_groups=grouped))
+    assert etree.tostring(result) == etree.tostring(expected)
+    assert (result.find("attribute-group") is not None) == grouped
+
+
+def test_iterparse_concurrency():
+    running = Counter()
+
+    async def layout(graph, prog, timeout=None):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return SVG
+
+    summary = Counter()
+    with patch('rng2doc.aio.run_layout', side_effect=layout):
+        results = collect(io.StringIO(GRAMMAR), ref_depth=0, concurrency=2, summary=summary)
+    assert sorted(result.key for result in results) == [
+        "define:content", "define:leaf", "element:0", "element:1", "element:2"]
+    assert sorted(result.position for result in results) == list(range(5))
+    assert running["max"] <= 2
+    assert summary["rendered"] == 5
+
+
+def test_iterparse_errors():
+    async def layout(graph, prog, timeout=None):
+        if graph.get_name() == '"a"':
+            raise RuntimeError("dot crashed")
+        return SVG
+
+    summary = Counter()
+    with patch('rng2doc.aio.run_layout', side_effect=layout):
+        results = collect(io.StringIO(GRAMMAR), summary=summary)
+    errors = dict((result.key, result.node.findtext("error")) for result in results)
+    assert errors == {"element:0": None, "element:1": "RuntimeError: dot crashed",
+                      "element:2": None}
+    assert summary["failed"] == 1
+
+
+def test_iterparse_timeout():
+    async def layout(graph, prog, timeout=None):
+        if prog == "dot":
+            raise subprocess.TimeoutExpired(prog, timeout)
+        return SVG
+
+    summary = Counter()
+    with patch('rng2doc.aio.run_layout', side_effect=layout):
+        collect(io.StringIO(GRAMMAR), summary=summary, timeout=1)
+    assert summary == Counter(timeout=3, fallback=3, rendered=3)
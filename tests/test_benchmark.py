@@ -0,0 +1,51 @@
+# Third Party Libraries
+import pytest
+from lxml import etree
+
+# My Stuff
+from benchmark.corpus import SCHEMAS, write_schema
+from benchmark.run import CASES, compare
+from rng2doc.rng import parse
+
+
+@pytest.mark.parametrize('name', sorted(SCHEMAS))
+def test_corpus(tmpdir, name):
+    rngfile = str(tmpdir.join("schema.rng"))
+    write_schema(name, 12, rngfile)
+    etree.RelaxNG(file=rngfile)
+    graphs = {}
+    result = parse(rngfile, graphs=graphs)
+    assert result.getroot().find("element") is not None
+    assert graphs
+    # The same size gives the same schema
+    assert etree.tostring(SCHEMAS[name](12)) == etree.tostring(SCHEMAS[name](12))
+
+
+def test_cases():
+    for schema, _, (small, large) in CASES.values():
+        assert schema in SCHEMAS and small < large
+
+
+def measurement(exponent=1.0, seconds=(0.5, 2.0), rss_kb=(100000, 200000), size=100):
+    phase = dict(exponent=exponent, seconds=list(seconds), wall=list(seconds),
+                 rss_kb=list(rss_kb), bytes=size)
+    return dict(sizes=[10, 40], phases=dict(parse=phase, xml=phase, html=phase))
+
+
+def test_compare():
+    baseline = measurement()
+    assert compare("case", measurement(exponent=1.2, rss_kb=(150000, 290000), size=105),
+                   baseline) == []
+    assert compare("case", measurement(), None) == ["case: no baseline"]
+    assert compare("case", measurement(), dict(baseline, sizes=[5, 20])) == [
+        "case: the baseline has the sizes [5, 20]"]
+    failures = compare("case", measurement(exponent=2.0, rss_kb=(100000, 400000), size=50),
+                       baseline)
+    assert len(failures) == 9
+    assert "case parse: scales with size**2.00 instead of size**1.00" in failures
+    assert "case html: peak RSS grows by 300000 kB instead of 100000 kB" in failures
+    assert "case xml: 50 bytes of output instead of 100" in failures
+    # Too fast to measure the scaling
+    assert compare("case", measurement(exponent=2.0, seconds=(0.01, 0.16)), baseline) == []
+    # A higher peak RSS of another platform does not matter, only its growth
+    assert compare("case", measurement(rss_kb=(300000, 410000)), baseline) == []
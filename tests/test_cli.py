@@ -69,3 +69,206 @@ def test_checkargs_with_DocoptExit():
     from docopt import DocoptExit
     with pytest.raises(DocoptExit):
         checkargs({'RNGFILE': None, '--output-format': 'xml'})
+
+
+DOCUMENTATION = """<documentation>
+  <element id="0" name="test" dupe="false">
+    <namespace/>
+    <svg xmlns="http://www.w3.org/2000/svg" id="diagram-0123"><g/></svg>
+  </element>
+  <element id="1" name="other" dupe="false">
+    <namespace/>
+    <diagram ref="diagram-0123"/>
+  </element>
+</documentation>"""
+
+
+@pytest.mark.parametrize('external_svg', [False, True], ids=['inline', 'external'])
+def test_output_html_svg(tmpdir, external_svg):
+    from rng2doc.cli import output
+    result = etree.ElementTree(etree.XML(DOCUMENTATION))
+    output(result, str(tmpdir.join("index.html")), "html", external_svg=external_svg)
+    htmldir = tmpdir.join("html")
+    page = htmldir.join("elements", "other.html").read()
+    assert htmldir.join("svg", "diagram-0123.svg").check() == external_svg
+    assert ('data="../svg/diagram-0123.svg"' in page) == external_svg
+    assert ("<svg" in page) != external_svg
+
+
+def test_output_html_external_svg_links(tmpdir):
+    from rng2doc.cli import output
+    result = etree.ElementTree(etree.XML("""<documentation>
+      <element id="0" name="test" dupe="false">
+        <namespace/>
+        <svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"
+             id="diagram-0123"><a xlink:href="../defines/content.html" target="_top"/></svg>
+      </element>
+      <define name="content"/>
+    </documentation>"""))
+    output(result, str(tmpdir.join("index.html")), "html", external_svg=True)
+    htmldir = tmpdir.join("html")
+    page = htmldir.join("elements", "test.html").read()
+    assert '<object class="diagram" type="image/svg+xml" data="../svg/diagram-0123.svg">' in page
+    # The link in the SVG file leads to the page of the define
+    svg = etree.parse(str(htmldir.join("svg", "diagram-0123.svg")))
+    link = svg.getroot()[0].get("{http://www.w3.org/1999/xlink}href")
+    assert htmldir.join("svg", link).check()
+
+
+def test_output_html_prune(tmpdir):
+    from rng2doc.cli import output
+    htmldir = tmpdir.mkdir("html")
+    for name in ("elements/removed.html", "svg/diagram-old.svg", "custom.css"):
+        htmldir.join(name).write("old", ensure=True)
+    result = etree.ElementTree(etree.XML(DOCUMENTATION))
+    output(result, str(tmpdir.join("index.html")), "html", external_svg=True)
+    assert sorted(path.basename for path in htmldir.join("svg").listdir()) == [
+        "diagram-0123.svg"]
+    assert not htmldir.join("elements", "removed.html").check()
+    assert htmldir.join("custom.css").check()
+
+
+@pytest.mark.parametrize('search_index', [False, True], ids=['plain', 'search'])
+def test_output_html_search(tmpdir, search_index):
+    from rng2doc.cli import output
+    result = etree.ElementTree(etree.XML(DOCUMENTATION))
+    output(result, str(tmpdir.join("index.html")), "html", search_index=search_index)
+    htmldir = tmpdir.join("html")
+    index = htmldir.join("index.html").read()
+    assert htmldir.join("search", "index.js").check() == search_index
+    assert htmldir.join("search", "shard-t.js").check() == search_index
+    assert ('src="search/search.js"' in index) == search_index
+    assert ('id="search"' in index) == search_index
+
+
+def test_output_html_values(tmpdir):
+    from rng2doc.cli import output
+    result = etree.ElementTree(etree.XML("""<documentation>
+      <element id="0" name="test" dupe="false">
+        <attribute name="code">
+          <type name="enum"><values id="0123" count="2"><value name="a"/><value name="b"/></values></type>
+        </attribute>
+      </element>
+      <element id="1" name="other" dupe="false">
+        <type name="enum"><values ref="0123" count="2"/></type>
+      </element>
+    </documentation>"""))
+    output(result, str(tmpdir.join("index.html")), "html")
+    htmldir = tmpdir.join("html")
+    assert htmldir.join("values").listdir() == [htmldir.join("values", "0123-1.html")]
+    page = htmldir.join("values", "0123-1.html").read()
+    assert "<code>a</code>" in page and "<code>b</code>" in page
+    assert 'href="../elements/test.html"' in page and 'href="../elements/other.html"' in page
+    for name in ("test", "other"):
+        assert 'href="../values/0123-1.html"' in htmldir.join("elements", name + ".html").read()
+
+
+def test_output_html_index_size(tmpdir):
+    from rng2doc.cli import output
+    result = etree.ElementTree(etree.XML(DOCUMENTATION))
+    output(result, str(tmpdir.join("index.html")), "html", index_size=1)
+    htmldir = tmpdir.join("html")
+    index = htmldir.join("index.html").read()
+    assert 'href="index/1.html"' in index
+    assert 'href="elements/other.html"' not in index
+    pages = sorted(htmldir.join("index").listdir())
+    assert pages and all(page.ext == ".html" for page in pages)
+    assert any('href="../elements/other.html"' in page.read() for page in pages)
+
+
+def test_output_html_attribute_groups(tmpdir):
+    from rng2doc.cli import output
+    result = etree.ElementTree(etree.XML("""<documentation>
+      <element id="0" name="test" dupe="false"><attribute-group ref="xml:common"/></element>
+      <attribute-group name="xml:common">
+        <attribute name="id"/><attribute name="role"/>
+      </attribute-group>
+    </documentation>"""))
+    output(result, str(tmpdir.join("index.html")), "html")
+    htmldir = tmpdir.join("html")
+    page = htmldir.join("groups", "xml_common.html").read()
+    assert "Attribute group" in page and 'href="../elements/test.html"' in page
+    element = htmldir.join("elements", "test.html").read()
+    assert 'href="../groups/xml_common.html"' in element
+    assert "<code>id</code>, <code>role</code>" in element
+
+
+def test_profile_table():
+    from rng2doc.cli import profile_table
+    profile = etree.ElementTree(etree.XML("""<profile>
+      <template rank="1" match="" name="create-filename" mode="" calls="10" time="50"/>
+      <template rank="2" match="element" name="" mode="visualize" calls="4" time="250"/>
+    </profile>"""))
+    assert profile_table(profile).splitlines() == [
+        " time (ms)    calls   avg (ms)  template",
+        "      2.50        4      0.625  match=element mode=visualize",
+        "      0.50       10      0.050  create-filename",
+        "      3.00       14             2 templates",
+    ]
+
+
+def test_output_html_profile_xslt(tmpdir):
+    from rng2doc.cli import output
+    result = etree.ElementTree(etree.XML(DOCUMENTATION))
+    output(result, str(tmpdir.join("index.html")), "html", profile_xslt=True)
+    table = tmpdir.join("index.xslt-profile.txt").read()
+    assert "create-filename" in table and "match=element mode=visualize" in table
+    profile = etree.parse(str(tmpdir.join("index.xslt-profile.xml")))
+    assert profile.getroot().tag == "profile"
+    assert not tmpdir.join("html", "index.xslt-profile.txt").check()
+
+
+@patch('rng2doc.cli.os.path.exists')
+def test_checkargs_search_index_needs_html(mock_exists):
+    mock_exists.return_value = True
+    with pytest.raises(RuntimeError):
+        checkargs({'RNGFILE': 'fake.rng', '--output-format': 'xml', '--search-index': True})
+
+
+@patch('rng2doc.cli.os.path.exists')
+def test_checkargs_index_size(mock_exists):
+    mock_exists.return_value = True
+    for fmt, size in (('xml', '10'), ('html', '0')):
+        with pytest.raises(RuntimeError):
+            checkargs({'RNGFILE': 'fake.rng', '--output-format': fmt, '--index-size': size})
+
+
+@patch('rng2doc.cli.os.path.exists')
+def test_checkargs_dot(mock_exists):
+    mock_exists.return_value = True
+    checkargs({'RNGFILE': 'fake.rng', '--output-format': 'dot', '--output': 'out/doc.xml'})
+    with pytest.raises(RuntimeError):
+        checkargs({'RNGFILE': 'fake.rng', '--output-format': 'dot'})
+    with pytest.raises(RuntimeError):
+        checkargs({'inject': True, 'MANIFEST': 'dot/manifest.json', '--output-format': 'dot',
+                   '--output': 'out/doc.xml'})
+
+
+@patch('rng2doc.cli.os.path.exists')
+def test_checkargs_fallback_layout(mock_exists):
+    mock_exists.return_value = True
+    for layout in ('neato', 'None', 'FDP'):
+        checkargs({'RNGFILE': 'fake.rng', '--output-format': 'xml',
+                   '--fallback-layout': layout})
+    for layout in ('rm', '/usr/bin/twopi', 'dot'):
+        with pytest.raises(RuntimeError):
+            checkargs({'RNGFILE': 'fake.rng', '--output-format': 'xml',
+                       '--fallback-layout': layout})
+
+
+@patch('rng2doc.cli.os.path.exists')
+def test_checkargs_inject_notfound(mock_exists):
+    mock_exists.return_value = False
+    with pytest.raises(FileNotFoundError):
+        checkargs({'inject': True, 'MANIFEST': 'dot/manifest.json', '--output-format': 'html'})
+
+
+@patch('rng2doc.cli.os.path.exists')
+def test_checkargs_profile_xslt(mock_exists):
+    mock_exists.return_value = True
+    checkargs({'RNGFILE': 'fake.rng', '--output-format': 'html', '--output': 'index.html',
+               '--profile-xslt': True})
+    for fmt, out in (('xml', 'out.xml'), ('html', None)):
+        with pytest.raises(RuntimeError):
+            checkargs({'RNGFILE': 'fake.rng', '--output-format': fmt, '--output': out,
+                       '--profile-xslt': True})
@@ -0,0 +1,66 @@
+# Third Party Libraries
+import pytest
+from lxml import etree
+
+# My Stuff
+from rng2doc.common import NSMAP
+from rng2doc.cost import Cost, estimate_cost
+from rng2doc.ir import Schema
+
+GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+  <start>
+    <element name="root">
+      <ref name="content"/>
+      <element name="nested"><ref name="content"/></element>
+    </element>
+  </start>
+  <define name="content">
+    <choice>
+      <ref name="attlist"/>
+      <text/>
+      <empty/>
+    </choice>
+  </define>
+  <define name="attlist">
+    <attribute name="test"><text/></attribute>
+  </define>
+</grammar>"""
+
+
+@pytest.mark.parametrize('name,ref_depth,expected', [
+    # root, nested, choice, attribute, text, text, empty
+    ("root", None, Cost(7, 4, 3)),
+    # root, nested, collapsed content
+    ("root", 0, Cost(3, 2, 0)),
+    # root, nested, choice, collapsed attlist, text, empty
+    ("root", 1, Cost(6, 3, 3)),
+    ("nested", None, Cost(6, 4, 3)),
+])
+def test_estimate_cost(name, ref_depth, expected):
+    tree = etree.XML(GRAMMAR).getroottree()
+    element = tree.xpath("//rng:element[@name = '{}']".format(name), namespaces=NSMAP)[0]
+    assert estimate_cost(Schema(tree).pattern(element), ref_depth) == expected
+
+
+def test_estimate_cost_max_values():
+    tree = etree.XML("""<element name="root" xmlns="http://relaxng.org/ns/structure/1.0">
+      <choice><value>a</value><value>b</value><value>c</value><text/></choice>
+    </element>""").getroottree()
+    pattern = Schema(tree).pattern(tree.getroot())
+    # root, choice, 3 values, text
+    assert estimate_cost(pattern) == Cost(6, 3, 4)
+    # root, choice, values, text
+    assert estimate_cost(pattern, max_values=2) == Cost(4, 3, 2)
+
+
+def test_estimate_cost_memo():
+    schema = Schema(etree.XML(GRAMMAR).getroottree())
+    memo = {}
+    for element in schema.elements():
+        estimate_cost(element, memo=memo)
+    assert set(memo) == {("content", None), ("attlist", None)}
+
+
+def test_cost_order():
+    assert sorted([Cost(2, 5, 1), Cost(10, 1, 0), Cost(2, 1, 0)], reverse=True) == [
+        Cost(10, 1, 0), Cost(2, 5, 1), Cost(2, 1, 0)]
@@ -0,0 +1,96 @@
+# Standard Library
+import io
+import json
+from collections import Counter
+from unittest.mock import patch
+
+# Third Party Libraries
+import pytest
+from lxml import etree
+
+# My Stuff
+from rng2doc.cli import output
+from rng2doc.dot import DOT_DIR, MANIFEST, diagram_users, inject_svg, load_manifest
+from rng2doc.rng import parse
+
+GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+  <start><element name="root"><ref name="content"/><ref name="content"/></element></start>
+  <define name="content">
+    <element name="a"><attribute name="x"/><ref name="leaf"/></element>
+  </define>
+  <define name="leaf"><element name="b"><empty/></element></define>
+</grammar>"""
+
+SVG = b"""<?xml version="1.0"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="1pt" height="2pt"><g/></svg>"""
+
+
+def export(tmpdir, **kwargs):
+    graphs = {}
+    summary = Counter()
+    with patch('rng2doc.rng.render_svg') as mock_render:
+        result = parse(io.StringIO(GRAMMAR), graphs=graphs, summary=summary, **kwargs)
+    assert mock_render.call_count == 0
+    output(result, str(tmpdir.join("doc.xml")), "dot", graphs=graphs)
+    return result, graphs, summary
+
+
+def test_parse_graphs(tmpdir):
+    result, graphs, summary = export(tmpdir, ref_depth=0)
+    refs = set(diagram.get("ref") for diagram in result.iter("diagram"))
+    assert refs == set(graphs)
+    assert summary == Counter(exported=5)
+    assert all(source.startswith(b"digraph") for source in graphs.values())
+    users = diagram_users(result.getroot())
+    assert sorted(key for keys in users.values() for key in keys) == [
+        "define:content", "define:leaf", "element:0", "element:1", "element:2"]
+
+
+def test_write_graphs(tmpdir):
+    _, graphs, _ = export(tmpdir, ref_depth=0)
+    dotdir = tmpdir.join(DOT_DIR)
+    manifest = load_manifest(str(dotdir.join(MANIFEST)))
+    assert manifest["documentation"] == "../doc.xml"
+    assert [entry["id"] for entry in manifest["diagrams"]] == sorted(
+        graphs, key=lambda svg_id: (-len(graphs[svg_id]), svg_id))
+    for entry in manifest["diagrams"]:
+        assert dotdir.join(entry["dot"]).read_binary() == graphs[entry["id"]]
+        assert entry["svg"] == entry["id"] + ".svg"
+
+
+def test_load_manifest_version(tmpdir):
+    manifest = tmpdir.join(MANIFEST)
+    manifest.write(json.dumps(dict(version=0)))
+    with pytest.raises(RuntimeError):
+        load_manifest(str(manifest))
+
+
+@pytest.mark.parametrize('fragments', [None, {}])
+def test_inject_svg(tmpdir, fragments):
+    export(tmpdir)
+    dotdir = tmpdir.join(DOT_DIR)
+    manifest = load_manifest(str(dotdir.join(MANIFEST)))
+    for entry in manifest["diagrams"]:
+        dotdir.join(entry["svg"]).write_binary(SVG)
+    result = inject_svg(str(dotdir.join(MANIFEST)), fragments=fragments)
+
+    expected_fragments = None if fragments is None else {}
+    with patch('rng2doc.render.run_layout', return_value=SVG):
+        expected = parse(io.StringIO(GRAMMAR), fragments=expected_fragments)
+    assert etree.tostring(result) == etree.tostring(expected)
+    assert fragments == expected_fragments
+
+
+def test_inject_svg_missing(tmpdir):
+    result, _, _ = export(tmpdir)
+    dotdir = tmpdir.join(DOT_DIR)
+    missing, broken, *others = load_manifest(str(dotdir.join(MANIFEST)))["diagrams"]
+    dotdir.join(broken["svg"]).write_binary(b"<svg")
+    for entry in others:
+        dotdir.join(entry["svg"]).write_binary(SVG)
+    summary = Counter()
+    injected = inject_svg(str(dotdir.join(MANIFEST)), summary=summary)
+    assert summary == Counter(injected=len(others), omitted=1, failed=1)
+    assert injected.find("diagram") is None
+    svg_ids = sorted(svg.get("id") for svg in injected.iter("{*}svg"))
+    assert svg_ids == sorted(entry["id"] for entry in others)
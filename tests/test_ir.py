@@ -0,0 +1,88 @@
+# Third Party Libraries
+import pytest
+from lxml import etree
+
+# My Stuff
+from rng2doc.common import NSMAP
+from rng2doc.ir import Kind, Pattern, Schema
+
+GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+  <!-- A comment -->
+  <start>
+    <element name="root">
+      <ref name="content"/>
+      <element name="nested"><choice><value>a</value><ref name="missing"/></choice></element>
+    </element>
+  </start>
+  <define name="content"><text/></define>
+  <define name="content"><empty/></define>
+</grammar>"""
+
+
+def test_schema():
+    tree = etree.XML(GRAMMAR).getroottree()
+    schema = Schema(tree)
+    assert [element.name for element in schema.elements()] == ["root", "nested"]
+    root = schema.elements()[0]
+    assert root.source is tree.xpath("//rng:element", namespaces=NSMAP)[0]
+    assert [child.kind for child in root.children] == [Kind.REF, Kind.ELEMENT]
+    # The last define of a name wins
+    assert root.children[0].target is schema.defines["content"]
+    assert schema.defines["content"].children[0].tag == "{%s}empty" % NSMAP["rng"]
+    choice = root.children[1].children[0]
+    assert [child.kind for child in choice.children] == [Kind.VALUE, Kind.REF]
+    assert choice.children[1].target is None
+
+
+def test_pattern_slots():
+    pattern = Pattern(etree.Element("{%s}element" % NSMAP["rng"], name="test"))
+    assert pattern.kind == Kind.ELEMENT
+    assert pattern.children == ()
+    assert not hasattr(pattern, "__dict__")
+
+
+REACHABLE_GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+  <start><element name="root"><ref name="content"/></element></start>
+  <define name="content">
+    <element name="a"><element name="b"><empty/></element></element>
+  </define>
+  <define name="unused"><element name="c"><ref name="content"/></element></define>
+</grammar>"""
+
+
+@pytest.mark.parametrize('roots,expected', [
+    (None, ["a", "b", "root"]),
+    (["c"], ["a", "b", "c"]),
+    (["b", "root"], ["a", "b", "root"]),
+])
+def test_reachable(roots, expected):
+    schema = Schema(etree.XML(REACHABLE_GRAMMAR).getroottree())
+    assert sorted(pattern.name for pattern in schema.reachable(roots)) == expected
+
+
+def test_reachable_unknown_root():
+    schema = Schema(etree.XML(REACHABLE_GRAMMAR).getroottree())
+    with pytest.raises(RuntimeError):
+        schema.reachable(["unknown"])
+
+
+GROUP_GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0"
+                     xmlns:a="http://relaxng.org/ns/compatibility/annotations/1.0">
+  <start><element name="root"><ref name="common"/><ref name="mixed"/></element></start>
+  <define name="common">
+    <a:documentation>Common attributes</a:documentation>
+    <attribute name="id"/>
+    <optional><attribute name="role"/></optional>
+    <ref name="more"/>
+  </define>
+  <define name="more"><zeroOrMore><attribute><anyName/></attribute></zeroOrMore></define>
+  <define name="mixed"><attribute name="x"/><text/></define>
+  <define name="loop"><attribute name="y"/><ref name="loop"/></define>
+  <define name="content"><ref name="mixed"/></define>
+</grammar>"""
+
+
+def test_attribute_defines():
+    schema = Schema(etree.XML(GROUP_GRAMMAR).getroottree())
+    # Recursive defines are not grouped
+    assert sorted(schema.attribute_defines()) == ["common", "more"]
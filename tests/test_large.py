@@ -0,0 +1,96 @@
+# Standard Library
+import io
+import sys
+from unittest.mock import patch
+
+# Third Party Libraries
+import pytest
+from lxml import etree
+
+# My Stuff
+from rng2doc.large import parse_large, raise_recursion_limit
+from rng2doc.simplify import simplify
+
+ANNOTATED = """<grammar xmlns="http://relaxng.org/ns/structure/1.0"
+    xmlns:a="http://relaxng.org/ns/compatibility/annotations/1.0" xmlns:x="urn:x-test">
+  <x:info><x:generator version="1"><x:option/></x:generator></x:info>
+  <start>
+    <element name="root">
+      <a:documentation>The <x:b>root</x:b> element</a:documentation>
+      <x:appinfo/>
+      <choice><value>a</value><x:note/><value>b</value></choice>
+    </element>
+  </start>
+</grammar>"""
+
+EXPECTED = ('<grammar xmlns="http://relaxng.org/ns/structure/1.0" '
+            'xmlns:a="http://relaxng.org/ns/compatibility/annotations/1.0" '
+            'xmlns:x="urn:x-test"><start><element name="root">'
+            '<a:documentation>The <x:b>root</x:b> element</a:documentation>'
+            '<choice><value>a</value><value>b</value></choice></element></start></grammar>')
+
+
+def nested(depth):
+    pattern = "<empty/>"
+    for _ in range(depth):
+        pattern = "<group>{}</group>".format(pattern)
+    return ('<grammar xmlns="http://relaxng.org/ns/structure/1.0">'
+            '<start><element name="root">{}</element></start></grammar>'.format(pattern))
+
+
+@pytest.mark.parametrize('chunk_size', [7, 1 << 16])
+def test_parse_large(tmpdir, chunk_size):
+    rng = tmpdir.join("test.rng")
+    rng.write(ANNOTATED)
+    with patch('rng2doc.large.CHUNK_SIZE', chunk_size):
+        rngtree = parse_large(str(rng))
+    assert etree.tostring(rngtree, encoding="unicode") == EXPECTED
+    assert rngtree.docinfo.URL == str(rng)
+
+
+def test_parse_large_file_object():
+    rngtree = parse_large(io.StringIO(ANNOTATED))
+    assert etree.tostring(rngtree, encoding="unicode") == EXPECTED
+    assert rngtree.docinfo.URL is None
+
+
+def test_parse_large_limits():
+    data = nested(300).encode("utf-8")
+    with pytest.raises(etree.XMLSyntaxError):
+        etree.parse(io.BytesIO(data))
+    rngtree = parse_large(io.BytesIO(data))
+    assert len(rngtree.getroot().findall(".//{*}group")) == 300
+
+
+def test_parse_large_entities(tmpdir):
+    secret = tmpdir.join("secret.txt")
+    secret.write("secret")
+    rng = io.StringIO("""<!DOCTYPE grammar [<!ENTITY secret SYSTEM "{}">]>
+    <grammar xmlns="http://relaxng.org/ns/structure/1.0" xmlns:a="{}">
+      <start>
+        <element name="root"><a:documentation>&secret;</a:documentation><empty/></element>
+      </start>
+    </grammar>""".format(secret, "http://relaxng.org/ns/compatibility/annotations/1.0"))
+    assert b"secret<" not in etree.tostring(parse_large(rng))
+
+
+def test_simplify_large(tmpdir):
+    tmpdir.join("included.rng").write(ANNOTATED)
+    rng = tmpdir.join("test.rng")
+    rng.write("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <include href="included.rng"/>
+    </grammar>""")
+    result = etree.tostring(simplify(parse_large(str(rng)), large=True), encoding="unicode")
+    assert "appinfo" not in result and "generator" not in result
+    assert "documentation" in result
+
+
+def test_raise_recursion_limit():
+    limit = sys.getrecursionlimit()
+    try:
+        raise_recursion_limit(limit + 100)
+        assert sys.getrecursionlimit() == limit + 100
+        raise_recursion_limit(limit)
+        assert sys.getrecursionlimit() == limit + 100
+    finally:
+        sys.setrecursionlimit(limit)
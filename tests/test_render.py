@@ -0,0 +1,117 @@
+# Standard Library
+import subprocess
+from collections import Counter
+from unittest.mock import patch
+
+# Third Party Libraries
+import pydot
+import pytest
+
+# My Stuff
+from rng2doc.render import layout_programs, render_svg, truncate_graph
+
+SVG = b"""<svg xmlns="http://www.w3.org/2000/svg" width="10pt" height="10pt"/>"""
+
+
+def chain(length):
+    graph = pydot.Dot(graph_name="test")
+    for index in range(length):
+        graph.add_node(pydot.Node(name="node{}".format(index)))
+        if index:
+            graph.add_edge(pydot.Edge("node{}".format(index - 1), "node{}".format(index)))
+    return graph
+
+
+def test_truncate_graph():
+    graph = truncate_graph(chain(10), 4)
+    names = [node.get_name() for node in graph.get_nodes()]
+    assert names == ["node0", "node1", "node2", "node3", "more0"]
+    edges = [(edge.get_source(), edge.get_destination()) for edge in graph.get_edges()]
+    assert ("node3", "more0") in edges
+    assert ("node3", "node4") not in edges
+
+
+@patch('rng2doc.render.run_layout')
+def test_render_svg_truncated(mock_layout):
+    mock_layout.return_value = SVG
+    summary = Counter()
+    svg = render_svg(chain(10), max_nodes=5, summary=summary)
+    assert "width" not in svg.attrib
+    assert summary == Counter(truncated=1, rendered=1)
+    assert len(mock_layout.call_args[0][0].get_nodes()) == 6
+
+
+@pytest.mark.parametrize('results,fallback,expected', [
+    ([subprocess.TimeoutExpired("dot", 1), SVG], "twopi",
+     Counter(timeout=1, fallback=1, rendered=1)),
+    ([subprocess.TimeoutExpired("dot", 1), subprocess.TimeoutExpired("twopi", 1)], "twopi",
+     Counter(timeout=2, omitted=1)),
+    ([subprocess.TimeoutExpired("dot", 1)], None,
+     Counter(timeout=1, omitted=1)),
+    ],
+    ids=['fallback', 'omitted', 'no-fallback'],
+)
+@patch('rng2doc.render.run_layout')
+def test_render_svg_timeout(mock_layout, results, fallback, expected):
+    mock_layout.side_effect = results
+    summary = Counter()
+    svg = render_svg(chain(3), timeout=1, fallback=fallback, summary=summary)
+    assert summary == expected
+    assert (svg is None) == ("omitted" in expected)
+
+
+def test_layout_programs():
+    assert layout_programs("neato") == ["dot", "neato"]
+    assert layout_programs(None) == ["dot"]
+    with pytest.raises(ValueError):
+        layout_programs("rm")
+
+
+GRAPHVIZ_SVG = b"""<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN"
+ "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">
+<!-- Generated by graphviz -->
+<svg width="62pt" height="44pt" viewBox="0.00 0.00 62.00 44.00"
+     xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">
+<g id="graph0" class="graph" transform="scale(1 1) rotate(0) translate(4 40)">
+<title>test</title>
+<!-- node0 -->
+<g id="node1" class="node">
+<title>node0</title>
+<polygon fill="#c0ffee" stroke="black" points="54.0001,-36 -0.0001,-36 0,0 54,0"/>
+<text text-anchor="middle" x="27.123456" y="-13.8" font-family="Times,serif" font-size="14.00">a</text>
+</g>
+<g id="node2" class="node">
+<polygon fill="#c0ffee" stroke="black" points="1.5,2.25"/>
+<text text-anchor="middle" x="1" y="2" font-family="Times,serif" font-size="14.00">b</text>
+</g>
+</g>
+</svg>
+"""
+
+
+@pytest.mark.parametrize('fragment', [False, True], ids=['element', 'fragment'])
+@patch('rng2doc.render.run_layout')
+def test_render_svg_optimized(mock_layout, fragment):
+    from lxml import etree
+    mock_layout.return_value = GRAPHVIZ_SVG
+    svg = render_svg(chain(2), optimize=dict(precision=1), fragment=fragment)
+    if fragment:
+        svg = etree.fromstring(svg)
+    ns = {"svg": "http://www.w3.org/2000/svg"}
+    assert svg.get("width") is None
+    assert svg.xpath("//comment() | //svg:title | //*[@id]", namespaces=ns) == []
+    assert svg.xpath("//svg:polygon/@points", namespaces=ns)[0] == "54,-36 0,-36 0,0 54,0"
+    assert svg.xpath("//svg:text/@x", namespaces=ns)[0] == "27.1"
+    classes = svg.xpath("//svg:polygon/@class", namespaces=ns)
+    assert len(classes) == 2 and classes[0] == classes[1]
+    assert svg.xpath("//svg:polygon/@fill", namespaces=ns) == []
+    assert "font-size:14.00px" in svg.find("svg:style", ns).text
+
+
+@patch('rng2doc.render.run_layout')
+def test_render_svg_fragment(mock_layout):
+    mock_layout.return_value = GRAPHVIZ_SVG
+    fragment = render_svg(chain(2), fragment=True)
+    assert fragment.startswith(b"<svg viewBox=")
+    assert fragment.endswith(b"</svg>")
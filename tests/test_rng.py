@@ -1,5 +1,9 @@
 # Standard Library
 import io
+import os
+import sys
+import time
+from collections import Counter
 from unittest.mock import patch
 
 # Third Party Libraries
@@ -8,6 +12,8 @@ from lxml import etree
 from lxml.etree import RelaxNGParseError, XMLSyntaxError
 
 # My Stuff
+from rng2doc.checkpoint import checkpoint_path
+from rng2doc.common import SVG_SVG
 from rng2doc.exceptions import NoMatchinRootException
 from rng2doc.rng import parse, transform
 
@@ -914,3 +920,482 @@ def test_transform_namespaces(xml, expected):
     assert isinstance(result, etree._ElementTree)
     for xpath, expected_value in expected:
         assert result.xpath(xpath) == expected_value
+
+
+REF_GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+  <start>
+    <element name="test1">
+      <ref name="test1.content"/>
+    </element>
+  </start>
+
+  <define name="test1.content">
+    <ref name="test1.attlist"/>
+    <text/>
+  </define>
+
+  <define name="test1.attlist">
+    <attribute name="test_attribute"><text/></attribute>
+  </define>
+</grammar>"""
+
+
+@pytest.mark.parametrize('ref_depth,expected_refs,expected_links', [
+    (None, [], 0),
+    (0, ['test1.content'], 1),
+    (1, ['test1.attlist'], 1),
+    (2, [], 0),
+    ],
+    ids=['expand', 'depth0', 'depth1', 'depth2'],
+)
+def test_transform_collapsed_refs(ref_depth, expected_refs, expected_links):
+    import pydot
+    from rng2doc.transforms.svg import SVG
+
+    element = etree.XML(REF_GRAMMAR, PARSER).find(".//{*}element")
+    graph = pydot.Dot(graph_name="test1")
+    refs = []
+    graph, _ = transform(element, graph, template=SVG, ref_depth=ref_depth, refs=refs)
+    links = [node for node in graph.get_nodes() if "URL" in node.get_attributes()]
+    assert refs == expected_refs
+    assert len(links) == expected_links
+
+
+def test_parse_collapsed_refs():
+    result = parse(io.StringIO(REF_GRAMMAR), ref_depth=0)
+    assert result.xpath("/documentation/define/@name") == ['test1.content', 'test1.attlist']
+    assert result.xpath("count(/documentation/define/*[local-name() = 'svg'])") == 2
+    # The XML documentation still expands all references
+    assert result.xpath("count(//element[@name = 'test1']/attribute)") == 1
+
+
+@patch('rng2doc.rng.render_svg')
+def test_render_diagram_once(mock_render):
+    import pydot
+    from collections import Counter
+    from rng2doc.rng import render_diagram
+
+    def graph(label):
+        graph = pydot.Dot(graph_name="test")
+        graph.add_node(pydot.Node(name="node0", label=label))
+        return graph
+
+    mock_render.side_effect = lambda graph, **kwargs: etree.Element("svg")
+    diagrams = {}
+    summary = Counter()
+    first = render_diagram(graph("a"), diagrams, summary=summary)
+    second = render_diagram(graph("a"), diagrams, summary=summary)
+    third = render_diagram(graph("b"), diagrams, summary=summary)
+    assert mock_render.call_count == 2
+    assert first.get("id").startswith("diagram-")
+    assert second.tag == "diagram" and second.get("ref") == first.get("id")
+    assert third.get("id") != first.get("id")
+    assert summary["shared"] == 1
+
+
+def test_parse_shared_diagrams():
+    xml = """<element name="root" xmlns="http://relaxng.org/ns/structure/1.0">
+          <element name="test"><text/></element>
+          <element name="test"><text/></element>
+        </element>"""
+    result = parse(io.StringIO(xml))
+    svg_id = result.xpath("//element[@name = 'test'][1]/*[local-name() = 'svg']/@id")
+    assert result.xpath("//element[@name = 'test'][2]/diagram/@ref") == svg_id
+
+
+def test_add_stable_index():
+    from rng2doc.common import NSMAP
+    from rng2doc.rng import add_stable_index
+
+    grammar = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <start><ref name="root"/></start>
+      {}
+      <define name="root">
+        <element name="root">
+          <choice>
+            <element name="test"><text/></element>
+            <element name="test"><empty/></element>
+          </choice>
+        </element>
+      </define>
+    </grammar>"""
+
+    def ids(extra):
+        tree = etree.XML(grammar.format(extra), PARSER)
+        elements = add_stable_index(tree.xpath("//rng:element", namespaces=NSMAP))
+        return {(element.get("name"), element.get("id")) for element in elements}
+
+    before = ids("")
+    after = ids('<define name="new"><element name="new"><text/></element></define>')
+    assert len(before) == 3
+    assert before < after
+    first, second = sorted(uuid for name, uuid in before if name == "test")
+    assert second == first + "-2"
+
+
+def test_merge(tmpdir):
+    from rng2doc.rng import merge
+
+    partials = []
+    for shard, elements in enumerate([("0", "2"), ("1",)]):
+        documentation = etree.Element("documentation", shard="{}/2".format(shard))
+        for element_id in elements:
+            element = etree.SubElement(documentation, "element", id=element_id)
+            svg = etree.SubElement(element, "{http://www.w3.org/2000/svg}svg", id="diagram-0")
+        etree.SubElement(documentation, "define", name="shared")
+        partial = tmpdir.join("part{}.xml".format(shard))
+        partial.write_binary(etree.tostring(documentation))
+        partials.append(str(partial))
+
+    result = merge(reversed(partials))
+    assert result.xpath("/documentation/element/@id") == ["0", "1", "2"]
+    assert result.xpath("count(/documentation/define)") == 1
+    assert result.xpath("count(//*[local-name() = 'svg'])") == 1
+    assert result.xpath("count(//diagram[@ref = 'diagram-0'])") == 2
+
+    with pytest.raises(RuntimeError):
+        merge(partials[:1])
+
+
+def test_parse_resume(tmpdir):
+    rng = tmpdir.join("test.rng")
+    rng.write(REF_GRAMMAR)
+    workdir = str(tmpdir.join("work"))
+    first = parse(str(rng), ref_depth=0, workdir=workdir)
+
+    with patch('rng2doc.rng.render_svg') as mock_render:
+        summary = {"resumed": 0}
+        resumed = parse(str(rng), ref_depth=0, workdir=workdir, resume=True, summary=summary)
+    assert not mock_render.called
+    assert summary["resumed"] == len(first.getroot())
+    assert etree.tostring(resumed) == etree.tostring(first)
+
+    # Other options invalidate the checkpoints
+    with patch('rng2doc.rng.render_svg', return_value=None) as mock_render:
+        parse(str(rng), ref_depth=1, workdir=workdir, resume=True)
+    assert mock_render.called
+
+
+def test_parse_resume_missing_owner(tmpdir):
+    rng = tmpdir.join("test.rng")
+    rng.write("""<element name="root" xmlns="http://relaxng.org/ns/structure/1.0">
+      <element name="item"><text/></element>
+      <element name="item"><text/></element>
+    </element>""")
+    workdir = str(tmpdir.join("work"))
+    first = parse(str(rng), workdir=workdir)
+    owner, shared = first.xpath("/documentation/element[@name = 'item']")
+    assert shared.find("diagram").get("ref") == owner.find(SVG_SVG.text).get("id")
+
+    # The checkpoint of the element with the diagram is lost
+    os.unlink(checkpoint_path(workdir, "element:" + owner.get("id")))
+    summary = Counter()
+    resumed = parse(str(rng), workdir=workdir, resume=True, summary=summary)
+    assert summary["resumed"] == 1
+    assert etree.tostring(resumed) == etree.tostring(first)
+
+
+@pytest.mark.parametrize('threads', [1, 2])
+def test_parse_resume_interrupted(tmpdir, threads):
+    rng = tmpdir.join("test.rng")
+    rng.write(REF_GRAMMAR)
+    workdir = tmpdir.join("work")
+    with patch('rng2doc.rng.render_svg', return_value=None):
+        expected = parse(str(rng), ref_depth=0)
+    calls = []
+
+    def interrupt(graph, **kwargs):
+        calls.append(graph.get_name())
+        if len(calls) > 2:
+            # Gives the other threads the time to hand over their diagrams
+            time.sleep(0.2)
+            raise KeyboardInterrupt()
+        return None
+
+    with patch('rng2doc.rng.render_svg', side_effect=interrupt):
+        with pytest.raises(KeyboardInterrupt):
+            parse(str(rng), ref_depth=0, workdir=str(workdir), threads=threads)
+    # The diagrams, which were rendered before the interruption, are saved
+    saved = len(list(workdir.join("checkpoints").visit("*.xml")))
+    assert saved == 2
+
+    summary = Counter()
+    with patch('rng2doc.rng.render_svg', return_value=None) as mock_render:
+        resumed = parse(str(rng), ref_depth=0, workdir=str(workdir), resume=True,
+                        threads=threads, summary=summary)
+    assert summary["resumed"] == saved
+    assert mock_render.call_count == len(expected.getroot()) - saved
+    assert etree.tostring(resumed) == etree.tostring(expected)
+
+
+@pytest.mark.parametrize('cache', [False, True])
+def test_parse_resume_includes(tmpdir, cache):
+    rng = tmpdir.join("test.rng")
+    rng.write("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <include href="base.rng"/>
+      <start><element name="root"><ref name="content"/></element></start>
+    </grammar>""")
+    base = tmpdir.join("base.rng")
+    base.write("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <define name="content"><element name="old"><empty/></element></define>
+    </grammar>""")
+    options = dict(simplify=True, workdir=str(tmpdir.join("work")))
+    if cache:
+        options["cache_dir"] = str(tmpdir.join("cache"))
+    with patch('rng2doc.rng.render_svg', return_value=None):
+        parse(str(rng), **options)
+        base.write(base.read().replace("old", "new"))
+        summary = Counter()
+        result = parse(str(rng), resume=True, summary=summary, **options)
+    assert summary["resumed"] == 0
+    assert sorted(result.xpath("/documentation/element/@name")) == ["new", "root"]
+
+
+def test_parse_isolates_errors():
+    xml = """<element name="root" xmlns="http://relaxng.org/ns/structure/1.0">
+          <element name="test1"><text/></element>
+          <element name="test2"><text/></element>
+        </element>"""
+    summary = {"failed": 0}
+
+    def render(graph, **kwargs):
+        if graph.get_name() == '"test1"':
+            raise RuntimeError("dot crashed")
+        return None
+
+    with patch('rng2doc.rng.render_svg', side_effect=render):
+        result = parse(io.StringIO(xml), summary=summary)
+    assert summary["failed"] == 1
+    assert result.xpath("//element[@name = 'test1']/error/text()") == [
+        "RuntimeError: dot crashed"]
+    assert result.xpath("//element[@name = 'test2']/error") == []
+    assert result.xpath("//element[@name = 'root']/child/@id") == ["1", "2"]
+
+
+@pytest.mark.parametrize('threads', [1, 3])
+def test_parse_longest_first(threads):
+    xml = """<element name="small" xmlns="http://relaxng.org/ns/structure/1.0">
+          <element name="large">
+            <attribute name="a"/><attribute name="b"/><attribute name="c"/>
+          </element>
+          <element name="medium"><attribute name="a"/></element>
+        </element>"""
+    order = []
+
+    def render(graph, **kwargs):
+        order.append(graph.get_name())
+        return None
+
+    with patch('rng2doc.rng.render_svg', side_effect=render):
+        result = parse(io.StringIO(xml), threads=threads)
+    if threads == 1:
+        assert order == ['"large"', '"small"', '"medium"']
+    else:
+        assert sorted(order) == ['"large"', '"medium"', '"small"']
+    assert result.xpath("/documentation/element/@name") == ["small", "large", "medium"]
+
+
+def test_estimate():
+    from rng2doc.rng import estimate
+    xml = """<element name="small" xmlns="http://relaxng.org/ns/structure/1.0">
+          <element name="large"><attribute name="a"/><attribute name="b"/></element>
+        </element>"""
+    with patch('rng2doc.rng.render_svg') as mock_render:
+        costs = estimate(io.StringIO(xml))
+    assert not mock_render.called
+    assert [(element_id, name, cost.nodes) for element_id, name, cost in costs] == [
+        ("1", "large", 3), ("0", "small", 2)]
+
+
+def test_parse_workers():
+    xml = """<grammar xmlns="http://relaxng.org/ns/structure/1.0"
+                      xmlns:a="http://relaxng.org/ns/compatibility/annotations/1.0">
+      <start>
+        <element name="root" ns="urn:x-test">
+          <a:documentation>The root</a:documentation>
+          <ref name="content"/>
+          <element name="test"><choice><value>a</value><value>b</value></choice></element>
+          <element name="test"><optional><attribute name="c"/></optional></element>
+        </element>
+      </start>
+      <define name="content"><element name="content"><text/></element></define>
+    </grammar>"""
+    with patch('rng2doc.rng.render_svg', return_value=None):
+        sequential = parse(io.StringIO(xml))
+        parallel = parse(io.StringIO(xml), workers=2)
+    assert etree.tostring(parallel) == etree.tostring(sequential)
+
+
+def test_parse_workers_fallback():
+    xml = """<element name="root" xmlns="http://relaxng.org/ns/structure/1.0"><text/></element>"""
+    with patch('rng2doc.rng.render_svg', return_value=None), \
+            patch('rng2doc.rng.transform_parallel', return_value={}) as mock_parallel:
+        result = parse(io.StringIO(xml), workers=2)
+    assert mock_parallel.called
+    assert result.xpath("/documentation/element/@name") == ["root"]
+
+
+def test_parse_simplify(tmpdir):
+    rng = tmpdir.join("test.rng")
+    rng.write(REF_GRAMMAR)
+    with patch('rng2doc.rng.render_svg', return_value=None):
+        plain = parse(str(rng))
+        simple = parse(str(rng), simplify=True, cache_dir=str(tmpdir.join("cache")))
+        with patch('rng2doc.rng.simplify') as mock_simplify:
+            cached = parse(str(rng), simplify=True, cache_dir=str(tmpdir.join("cache")))
+    assert not mock_simplify.called
+    assert etree.tostring(simple) == etree.tostring(plain)
+    assert etree.tostring(cached) == etree.tostring(plain)
+
+
+def test_parse_large_input():
+    annotated = REF_GRAMMAR.replace(
+        "<text/>", '<x:appinfo xmlns:x="urn:x-test"><x:generated/></x:appinfo><text/>')
+    with patch('rng2doc.rng.render_svg', return_value=None):
+        plain = parse(io.StringIO(REF_GRAMMAR))
+        large = parse(io.StringIO(annotated), large_input=True)
+    assert etree.tostring(large) == etree.tostring(plain)
+
+
+def test_parse_large_input_deep():
+    pattern = '<attribute name="deepest"/>'
+    for _ in range(1000):
+        pattern = "<group>{}</group>".format(pattern)
+    deep = ('<grammar xmlns="http://relaxng.org/ns/structure/1.0">'
+            '<start><element name="root">{}</element></start></grammar>'.format(pattern))
+    with pytest.raises(XMLSyntaxError):
+        parse(io.StringIO(deep))
+    limit = sys.getrecursionlimit()
+    try:
+        with patch('rng2doc.rng.render_svg', return_value=None):
+            result = parse(io.StringIO(deep), large_input=True)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert result.xpath("/documentation/element/attribute/@name") == ["deepest"]
+
+
+SUBSET_GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+  <start><element name="root"><ref name="content"/></element></start>
+  <define name="content">
+    <element name="a"><element name="b"><empty/></element></element>
+  </define>
+  <define name="unused"><element name="c"><ref name="content"/></element></define>
+</grammar>"""
+
+
+@pytest.mark.parametrize('selection,expected', [
+    ({}, ["root", "a", "b", "c"]),
+    ({"prune": True}, ["root", "a", "b"]),
+    ({"roots": ["c"]}, ["a", "b", "c"]),
+    ({"elements": ["a", "c"]}, ["a", "c"]),
+    ({"prune": True, "elements": ["a", "c"]}, ["a"]),
+])
+def test_parse_subset(selection, expected):
+    with patch('rng2doc.rng.render_svg', return_value=None):
+        result = parse(io.StringIO(SUBSET_GRAMMAR), **selection)
+    assert result.xpath("/documentation/element/@name") == expected
+    # The ids do not depend on the selection
+    assert result.xpath("/documentation/element[@name = 'a']/@id") in ([], ["1"])
+    assert result.xpath("//element[@name = 'a']/child/@name") in ([], ["b"])
+
+
+ENUM_GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0"
+                     xmlns:a="http://relaxng.org/ns/compatibility/annotations/1.0">
+  <start>
+    <element name="root">
+      <ref name="code"/>
+      <element name="item"><ref name="code"/></element>
+    </element>
+  </start>
+  <define name="code">
+    <attribute name="code">
+      <choice>
+        <value>de</value>
+        <a:documentation>German</a:documentation>
+        <value>en</value>
+        <value>fr</value>
+        <text/>
+      </choice>
+    </attribute>
+  </define>
+</grammar>"""
+
+
+@pytest.mark.parametrize('max_values,expected_nodes', [
+    # root, attribute, choice, 3 values, text, item
+    (None, 8),
+    (3, 8),
+    # root, attribute, choice, values, text, item
+    (2, 6),
+])
+def test_transform_max_values(max_values, expected_nodes):
+    import pydot
+    from rng2doc.transforms.svg import SVG
+
+    element = etree.XML(ENUM_GRAMMAR, PARSER).find(".//{*}element")
+    graph, _ = transform(element, pydot.Dot(graph_name="root"), template=SVG,
+                         max_values=max_values)
+    assert len(graph.get_nodes()) == expected_nodes
+
+
+def test_parse_max_values():
+    with patch('rng2doc.rng.render_svg', return_value=None):
+        result = parse(io.StringIO(ENUM_GRAMMAR), max_values=2)
+    values = result.xpath("//element[@name = 'root']/attribute/type/values")[0]
+    assert values.get("count") == "3"
+    assert [value.get("name") for value in values] == ["de", "en", "fr"]
+    assert values.findtext("value/description") == "German"
+    # The attribute does not get the descriptions of the values
+    assert result.xpath("//element[@name = 'root']/attribute/description") == []
+    # The second table is only a reference to the first one
+    shared = result.xpath("//element[@name = 'item']/attribute/type/values")[0]
+    assert shared.attrib == {"ref": values.get("id"), "count": "3"}
+
+
+GROUP_GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+  <start>
+    <element name="root">
+      <ref name="common"/>
+      <optional><ref name="link"/></optional>
+      <element name="item"><ref name="common"/><ref name="link"/></element>
+    </element>
+  </start>
+  <define name="common"><attribute name="id"/><ref name="link"/></define>
+  <define name="link"><attribute name="href"/></define>
+</grammar>"""
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_parse_attribute_groups(workers):
+    with patch('rng2doc.rng.render_svg', return_value=None):
+        plain = parse(io.StringIO(GROUP_GRAMMAR))
+        result = parse(io.StringIO(GROUP_GRAMMAR), attribute_groups=True, workers=workers)
+    assert plain.xpath("//attribute-group") == []
+    root, item = result.xpath("/documentation/element")
+    assert [ref.get("ref") for ref in root.iterchildren("attribute-group")] == ["common"]
+    # An optional reference keeps its attributes
+    assert [attribute.get("name") for attribute in root.iterchildren("attribute")] == ["href"]
+    assert [ref.get("ref") for ref in item.iterchildren("attribute-group")] == ["common", "link"]
+    assert item.find("attribute") is None
+    groups = result.xpath("/documentation/attribute-group")
+    assert [group.get("name") for group in groups] == ["common", "link"]
+    assert [node.get("name") or node.get("ref") for node in groups[0]] == ["id", "link"]
+    assert groups[1].find("attribute").get("name") == "href"
+
+
+def test_parse_attribute_group_error():
+    # An empty value without a datatype library cannot be documented
+    xml = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <start><element name="root"><ref name="broken"/><ref name="link"/></element></start>
+      <define name="broken"><attribute name="kind"><value/></attribute></define>
+      <define name="link"><attribute name="href"/></define>
+    </grammar>"""
+    summary = Counter()
+    with patch('rng2doc.rng.render_svg', return_value=None):
+        result = parse(io.StringIO(xml), ref_depth=0, attribute_groups=True, summary=summary)
+    broken, link = result.xpath("/documentation/attribute-group")
+    assert broken.get("name") == "broken"
+    assert broken.findtext("error") == "KeyError: 'datatypeLibrary'"
+    assert link.find("attribute").get("name") == "href"
+    assert summary["failed"] == 2
+    assert result.xpath("/documentation/define[@name = 'broken']/error") != []
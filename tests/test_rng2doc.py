@@ -68,3 +68,73 @@ def test_checkargs_empty_rng(mock_exists, mock_parse):
     mock_exists.return_value = True
     mock_parse.side_effect = xmltree
     assert main(['fake.rng']) == 20
+
+
+@pytest.mark.parametrize('options', [
+    [], ["--ref-depth=0"], ["--ref-depth=0", "--attribute-groups"]],
+    ids=['expanded', 'collapsed', 'grouped'])
+def test_main_shards(tmpdir, options):
+    """Runs every shard as a separate process and merges their output"""
+    import subprocess
+    import sys
+    rng = tmpdir.join("test.rng")
+    rng.write("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <start>
+        <element name="root">
+          <element name="test1"><ref name="late"/><text/></element>
+          <element name="test2"><ref name="test.content"/></element>
+          <element name="test1"><ref name="inner"/><ref name="test.content"/></element>
+        </element>
+      </start>
+      <define name="test.content"><attribute name="test"/><ref name="nested"/></define>
+      <define name="late"><attribute name="late"/></define>
+      <define name="inner"><element name="inner"><empty/></element></define>
+      <define name="nested"><attribute name="nested"/></define>
+    </grammar>""")
+    partials = []
+    for shard in range(2):
+        partial = str(tmpdir.join("part{}.xml".format(shard)))
+        subprocess.run([sys.executable, "-m", rng2doc.__package__,
+                        "--shard", "{}/2".format(shard), "-o", partial, str(rng)] + options,
+                       check=True)
+        partials.append(partial)
+    merged = str(tmpdir.join("merged.xml"))
+    complete = str(tmpdir.join("complete.xml"))
+    assert main(["merge", "-o", merged] + partials) == 0
+    assert main(["-o", complete, str(rng)] + options) == 0
+    assert tmpdir.join("merged.xml").read() == tmpdir.join("complete.xml").read()
+
+
+def test_main_incomplete(tmpdir):
+    from rng2doc.exceptions import IncompleteDocumentationError
+    rng = tmpdir.join("test.rng")
+    rng.write("""<element name="root" xmlns="http://relaxng.org/ns/structure/1.0">
+          <text/>
+        </element>""")
+    with patch('rng2doc.rng.render_svg', side_effect=RuntimeError("dot crashed")):
+        result = main(["-o", str(tmpdir.join("test.xml")), str(rng)])
+    assert result == errorcode(IncompleteDocumentationError())
+    assert tmpdir.join("test.xml").read().count("<error>") == 1
+
+
+def test_main_dry_run(tmpdir, capsys):
+    rng = tmpdir.join("test.rng")
+    rng.write("""<element name="root" xmlns="http://relaxng.org/ns/structure/1.0">
+          <text/>
+        </element>""")
+    with patch('rng2doc.rng.render_svg') as mock_render:
+        assert main(["--dry-run", str(rng)]) == 0
+    assert not mock_render.called
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split() == ["2", "2", "0", "root", "(0)"]
+
+
+def test_main_serve(tmpdir):
+    rng = tmpdir.join("test.rng")
+    rng.write("""<element name="root" xmlns="http://relaxng.org/ns/structure/1.0">
+          <text/>
+        </element>""")
+    with patch('rng2doc.cli.serve') as mock_serve:
+        assert main(["serve", "--port=8080", "--warm=5", "--ref-depth=1", str(rng)]) == 0
+    mock_serve.assert_called_once_with(str(rng), port=8080, cache_size=128, warm=5,
+                                       ref_depth=1, fallback="twopi", threads=1)
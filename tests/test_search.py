@@ -0,0 +1,73 @@
+# Standard Library
+import json
+import os
+
+# Third Party Libraries
+from lxml import etree
+
+# My Stuff
+from rng2doc.search import FIELD_BITS, build_index, page_names, write_search_index
+
+DOCUMENTATION = """<documentation>
+  <element id="0" name="para" dupe="false">
+    <description>A paragraph of text</description>
+    <attribute name="role"><use>optional</use></attribute>
+    <child id="1"/>
+  </element>
+  <element id="1" name="xml:lang" dupe="true" define="lang">
+    <attribute name="Type">
+      <value name="Para"><description>Like a paragraph</description></value>
+    </attribute>
+  </element>
+  <element id="2" name="xml:lang" dupe="true"/>
+  <define name="lang"/>
+</documentation>"""
+
+
+def documentation():
+    return etree.XML(DOCUMENTATION)
+
+
+def test_page_names():
+    assert page_names(documentation()) == {
+        "0": "elements/para.html",
+        "1": "elements/xml_lang-1.html",
+        "2": "elements/xml_lang-2.html",
+    }
+
+
+def test_build_index():
+    documents, shards = build_index(documentation())
+    assert documents == [["para", "elements/para.html", ""],
+                         ["xml:lang", "elements/xml_lang-1.html", "lang"],
+                         ["xml:lang", "elements/xml_lang-2.html", ""]]
+    assert sorted(shards) == ["a", "l", "o", "p", "r", "t", "x"]
+    # para is the name of element 0 and a value of element 1
+    assert shards["p"]["para"] == [0 << FIELD_BITS | 1, 1 << FIELD_BITS | 4]
+    assert shards["p"]["paragraph"] == [0 << FIELD_BITS | 8, 1 << FIELD_BITS | 8]
+    assert shards["r"]["role"] == [0 << FIELD_BITS | 2]
+    assert shards["t"]["type"] == [1 << FIELD_BITS | 2]
+    assert shards["l"]["lang"] == [1 << FIELD_BITS | 1, 2 << FIELD_BITS | 1]
+
+
+def test_write_search_index(tmpdir):
+    write_search_index(documentation(), str(tmpdir))
+    files = sorted(os.listdir(str(tmpdir.join("search"))))
+    assert files == ["index.js", "search.js", "shard-a.js", "shard-l.js", "shard-o.js",
+                     "shard-p.js", "shard-r.js", "shard-t.js", "shard-x.js"]
+    index = tmpdir.join("search", "index.js").read()
+    assert index.startswith("rng2docSearch.index({") and index.endswith(");\n")
+    data = json.loads(index[len("rng2docSearch.index("):-len(");\n")])
+    assert data["shards"] == ["a", "l", "o", "p", "r", "t", "x"]
+    assert data["fields"] == ["name", "attribute", "value", "description"]
+    shard = tmpdir.join("search", "shard-r.js").read()
+    assert shard == 'rng2docSearch.shard("r",{"role":[2]});\n'
+
+
+def test_build_index_attribute_groups():
+    documentation = etree.XML("""<documentation>
+      <element id="0" name="para" dupe="false"><attribute-group ref="common"/></element>
+      <attribute-group name="common"><attribute name="role"/></attribute-group>
+    </documentation>""")
+    _, shards = build_index(documentation)
+    assert shards["r"]["role"] == [0 << FIELD_BITS | 2]
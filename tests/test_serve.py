@@ -0,0 +1,174 @@
+# Standard Library
+import io
+import threading
+from unittest.mock import patch
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+# Third Party Libraries
+import pytest
+from lxml import etree
+
+# My Stuff
+from rng2doc.exceptions import FailedPageError
+from rng2doc.serve import DocumentationServer, LazyDocumentation
+
+GRAMMAR = """<grammar xmlns="http://relaxng.org/ns/structure/1.0" xmlns:a="urn:x-test:a">
+  <start><element name="root"><ref name="content"/><ref name="content"/></element></start>
+  <define name="content">
+    <element name="a:b"><element name="leaf"><empty/></element></element>
+  </define>
+  <define name="other"><element name="leaf"><text/></element></define>
+</grammar>"""
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg"><title>{}</title></svg>"""
+
+
+def render(graph, **kwargs):
+    return etree.fromstring(SVG.format(graph.get_name().strip('"')))
+
+
+@pytest.fixture
+def documentation():
+    return LazyDocumentation(io.StringIO(GRAMMAR), cache_size=2, ref_depth=0)
+
+
+def test_pages(documentation):
+    assert sorted(documentation.pages.items()) == [
+        ("defines/content.html", "define:content"),
+        ("defines/other.html", "define:other"),
+        ("elements/a_b-1.html", "element:1"),
+        ("elements/leaf-2.html", "element:2"),
+        ("elements/leaf-3.html", "element:3"),
+        ("elements/root.html", "element:0"),
+        ("index.html", "index"),
+    ]
+
+
+def test_render_page(documentation):
+    with patch('rng2doc.rng.render_svg', side_effect=render) as mock_render:
+        page = documentation.page("element:1").decode("utf-8")
+        assert documentation.page("element:1").decode("utf-8") == page
+    assert mock_render.call_count == 1
+    assert "<title>a:b</title>" in page
+    assert 'href="leaf-2.html"' in page
+    assert 'href="root.html"' in page
+    # The shared documentation does not keep the diagram
+    assert documentation.elements["1"][2].find("{http://www.w3.org/2000/svg}svg") is None
+
+
+def test_render_page_lru(documentation):
+    with patch('rng2doc.rng.render_svg', side_effect=render) as mock_render:
+        for key in ("element:0", "element:1", "element:2", "element:0"):
+            documentation.page(key)
+    assert mock_render.call_count == 4
+    assert documentation.page.cache_info().currsize == 2
+
+
+def test_render_page_define(documentation):
+    with patch('rng2doc.rng.render_svg', side_effect=render):
+        page = documentation.page("define:content").decode("utf-8")
+    assert "<title>content</title>" in page
+    assert documentation.documentation.find("define") is None
+
+
+def test_render_page_error(documentation):
+    with patch('rng2doc.rng.render_svg', side_effect=RuntimeError("dot crashed")):
+        with pytest.raises(FailedPageError) as error:
+            documentation.page("element:0")
+    assert "RuntimeError: dot crashed" in error.value.page.decode("utf-8")
+    assert documentation.elements["0"][2].find("error") is None
+    # The failed page is not cached, so the diagram is rendered again
+    assert documentation.page.cache_info().currsize == 0
+    with patch('rng2doc.rng.render_svg', side_effect=render):
+        assert b"<title>root</title>" in documentation.page("element:0")
+
+
+def test_render_page_index(documentation):
+    with patch('rng2doc.rng.render_svg', side_effect=render) as mock_render:
+        page = documentation.page("index").decode("utf-8")
+    assert mock_render.call_count == 0
+    assert 'href="elements/a_b-1.html"' in page
+
+
+def test_render_page_values():
+    grammar = """<element name="root" xmlns="http://relaxng.org/ns/structure/1.0">
+      <attribute name="code"><choice><value>de</value><value>en</value></choice></attribute>
+    </element>"""
+    documentation = LazyDocumentation(io.StringIO(grammar), max_values=1)
+    values_id = documentation.documentation.find(".//values").get("id")
+    key = documentation.pages["values/{}-1.html".format(values_id)]
+    with patch('rng2doc.rng.render_svg', side_effect=render) as mock_render:
+        page = documentation.page(key).decode("utf-8")
+        element = documentation.page("element:0").decode("utf-8")
+    assert mock_render.call_count == 1
+    assert "<code>de</code>" in page and "<code>en</code>" in page
+    assert 'href="../values/{}-1.html"'.format(values_id) in element
+
+
+def test_render_page_attribute_group():
+    grammar = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <start><element name="root"><ref name="common"/></element></start>
+      <define name="common"><attribute name="id"/></define>
+    </grammar>"""
+    documentation = LazyDocumentation(io.StringIO(grammar), attribute_groups=True)
+    key = documentation.pages["groups/common.html"]
+    with patch('rng2doc.rng.render_svg', side_effect=render) as mock_render:
+        page = documentation.page(key).decode("utf-8")
+        element = documentation.page("element:0").decode("utf-8")
+    assert mock_render.call_count == 1
+    assert 'href="../elements/root.html"' in page
+    assert 'href="../groups/common.html"' in element
+
+
+def test_warm(documentation):
+    assert documentation.popular(1) == ["element:1"]
+    with patch('rng2doc.rng.render_svg', side_effect=render) as mock_render:
+        documentation.warm(1)
+    assert mock_render.call_count == 1
+    assert documentation.page.cache_info().currsize == 2
+
+
+def test_server(documentation):
+    server = DocumentationServer(documentation, 0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    url = "http://127.0.0.1:{}/".format(server.server_address[1])
+    try:
+        with patch('rng2doc.rng.render_svg', side_effect=render):
+            with urlopen(url + "elements/root.html") as response:
+                assert response.headers["Content-Type"] == "text/html; charset=utf-8"
+                assert b"<title>root</title>" in response.read()
+            with urlopen(url) as response:
+                assert b"elements/root.html" in response.read()
+        with pytest.raises(HTTPError) as error:
+            urlopen(url + "elements/missing.html")
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_server_error(documentation):
+    server = DocumentationServer(documentation, 0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    url = "http://127.0.0.1:{}/".format(server.server_address[1])
+    try:
+        with patch('rng2doc.rng.render_svg', side_effect=RuntimeError("dot crashed")):
+            with pytest.raises(HTTPError) as error:
+                urlopen(url + "elements/root.html")
+        assert error.value.code == 500
+        assert b"RuntimeError: dot crashed" in error.value.read()
+        with patch.object(documentation, 'xslt', side_effect=etree.XSLTApplyError("broken")):
+            with pytest.raises(HTTPError) as error:
+                urlopen(url)
+        assert error.value.code == 500
+        with patch('rng2doc.rng.render_svg', side_effect=render):
+            with urlopen(url + "elements/root.html") as response:
+                assert b"<title>root</title>" in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
@@ -0,0 +1,140 @@
+# Standard Library
+import io
+
+# Third Party Libraries
+import pytest
+from lxml import etree
+
+# My Stuff
+from rng2doc.common import NSMAP
+from rng2doc.simplify import load_cached, simplify, store_cached
+
+PARSER = etree.XMLParser(remove_blank_text=True)
+
+
+def simplified(xml):
+    tree = etree.parse(io.BytesIO(xml.encode("utf-8")), PARSER)
+    return etree.tostring(simplify(tree), encoding="unicode")
+
+
+def test_flatten_divs():
+    result = simplified("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <div ns="urn:x-test">
+        <start><element name="root"><empty/></element></start>
+        <div><define name="unused"><element name="x"><empty/></element></define></div>
+      </div>
+    </grammar>""")
+    assert "div" not in result
+    assert '<start ns="urn:x-test">' in result
+    assert '<define name="unused" ns="urn:x-test">' in result
+
+
+def test_merge_combined():
+    result = simplified("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <start><element name="root"><ref name="content"/></element></start>
+      <define name="content"><element name="a"><empty/></element></define>
+      <define name="content" combine="choice">
+        <element name="b"><empty/></element>
+        <element name="c"><empty/></element>
+      </define>
+    </grammar>""")
+    tree = etree.XML(result)
+    defines = tree.xpath("//rng:define", namespaces=NSMAP)
+    assert len(defines) == 1
+    assert defines[0].get("combine") is None
+    assert tree.xpath("local-name(//rng:define/*)", namespaces=NSMAP) == "choice"
+    assert tree.xpath("//rng:define/rng:choice/rng:group/rng:element/@name",
+                      namespaces=NSMAP) == ["b", "c"]
+
+
+def test_inline_refs():
+    result = simplified("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <start><element name="root"><ref name="attlist"/><ref name="content"/></element></start>
+      <define name="attlist"><ref name="common"/><attribute name="a"/></define>
+      <define name="common"><attribute name="id"/></define>
+      <define name="content"><element name="child"><empty/></element></define>
+    </grammar>""")
+    tree = etree.XML(result)
+    assert tree.xpath("//rng:define/@name", namespaces=NSMAP) == ["content"]
+    assert tree.xpath("//rng:element[@name = 'root']/*/@name", namespaces=NSMAP) == [
+        "id", "a", "content"]
+
+
+def test_inline_refs_inherited():
+    result = simplified("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <start>
+        <element name="root" ns="urn:x-root" datatypeLibrary="urn:x-types">
+          <ref name="foreign"/><ref name="plain"/>
+        </element>
+      </start>
+      <div ns="urn:x-foreign"><define name="foreign"><attribute name="a"/></define></div>
+      <define name="plain"><attribute name="b"><data type="int"/></attribute></define>
+    </grammar>""")
+    tree = etree.XML(result)
+    foreign, plain = tree.xpath("//rng:attribute", namespaces=NSMAP)
+    assert foreign.get("ns") == "urn:x-foreign"
+    # Without an inherited attribute the content does not take the ones
+    # of its new parent
+    assert plain.get("ns") == "" and plain.get("datatypeLibrary") == ""
+
+
+def test_resolve_includes(tmpdir):
+    tmpdir.join("base.rng").write("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <start><element name="base"><ref name="content"/></element></start>
+      <define name="content"><element name="old"><empty/></element></define>
+    </grammar>""")
+    main = tmpdir.join("main.rng")
+    main.write("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <include href="base.rng">
+        <define name="content"><element name="new"><empty/></element></define>
+      </include>
+    </grammar>""")
+    dependencies = []
+    tree = simplify(etree.parse(str(main), PARSER), dependencies)
+    assert tree.xpath("//rng:element/@name", namespaces=NSMAP) == ["base", "new"]
+    assert dependencies == [str(tmpdir.join("base.rng"))]
+
+
+def test_cache(tmpdir):
+    rng = tmpdir.join("test.rng")
+    rng.write("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <include href="base.rng"/>
+    </grammar>""")
+    base = tmpdir.join("base.rng")
+    base.write("""<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <start><element name="base"><empty/></element></start>
+    </grammar>""")
+    cache_dir = str(tmpdir.join("cache"))
+    assert load_cached(cache_dir, str(rng), PARSER) is None
+
+    dependencies = []
+    tree = simplify(etree.parse(str(rng), PARSER), dependencies)
+    store_cached(cache_dir, str(rng), tree, dependencies)
+    cached = load_cached(cache_dir, str(rng), PARSER)
+    assert etree.tostring(cached) == etree.tostring(tree)
+
+    base.write(base.read().replace("base", "changed"))
+    assert load_cached(cache_dir, str(rng), PARSER) is None
+
+
+def test_cache_same_input(tmpdir):
+    main = """<grammar xmlns="http://relaxng.org/ns/structure/1.0">
+      <include href="common.rng"/>
+    </grammar>"""
+    cache_dir = str(tmpdir.join("cache"))
+    trees = []
+    for name in ("a", "b"):
+        directory = tmpdir.mkdir(name)
+        directory.join("main.rng").write(main)
+        directory.join("common.rng").write("""<grammar
+            xmlns="http://relaxng.org/ns/structure/1.0">
+          <start><element name="from{}"><empty/></element></start>
+        </grammar>""".format(name))
+        rng = str(directory.join("main.rng"))
+        assert load_cached(cache_dir, rng, PARSER) is None
+        dependencies = []
+        trees.append(simplify(etree.parse(rng, PARSER), dependencies))
+        store_cached(cache_dir, rng, trees[-1], dependencies)
+    for name, tree in zip("ab", trees):
+        cached = load_cached(cache_dir, str(tmpdir.join(name, "main.rng")), PARSER)
+        assert cached.xpath("//rng:element/@name", namespaces=NSMAP) == ["from" + name]
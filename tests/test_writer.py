@@ -0,0 +1,66 @@
+# Standard Library
+import gzip
+import os
+from collections import Counter
+
+# Third Party Libraries
+import pytest
+
+# My Stuff
+from rng2doc.writer import sync_tree, write_file
+
+
+def test_write_file_unchanged(tmpdir):
+    path = str(tmpdir.join("sub", "test.xml"))
+    stats = Counter()
+    assert write_file(path, b"<a/>", stats=stats)
+    os.utime(path, (0, 0))
+    assert not write_file(path, b"<a/>", stats=stats)
+    assert os.stat(path).st_mtime == 0
+    assert write_file(path, b"<b/>", stats=stats)
+    assert stats == Counter(written=2, unchanged=1)
+    assert tmpdir.join("sub").listdir() == [tmpdir.join("sub", "test.xml")]
+
+
+def test_write_file_compressed(tmpdir):
+    html = tmpdir.join("test.html")
+    write_file(str(html), b"<html/>", compressions=["gz"])
+    assert gzip.decompress(tmpdir.join("test.html.gz").read_binary()) == b"<html/>"
+    write_file(str(tmpdir.join("test.xml")), b"<a/>", compressions=["gz"])
+    assert not tmpdir.join("test.xml.gz").check()
+
+
+def test_write_file_unknown_compression(tmpdir):
+    with pytest.raises(RuntimeError):
+        write_file(str(tmpdir.join("test.svg")), b"<svg/>", compressions=["zip"])
+
+
+def test_sync_tree(tmpdir):
+    source = tmpdir.mkdir("source")
+    source.mkdir("elements").join("a.html").write_binary(b"a")
+    source.join("index.html").write_binary(b"index")
+    destination = tmpdir.mkdir("destination")
+    destination.mkdir("elements").join("a.html").write_binary(b"a")
+    stats = Counter()
+    sync_tree(str(source), str(destination), stats=stats)
+    assert destination.join("index.html").read_binary() == b"index"
+    assert stats == Counter(written=1, unchanged=1)
+
+
+def test_sync_tree_prune(tmpdir):
+    source = tmpdir.mkdir("source")
+    source.mkdir("elements").join("a.html").write_binary(b"a")
+    destination = tmpdir.mkdir("destination")
+    elements = destination.mkdir("elements")
+    for name in ("a.html", "a.html.gz", "b.html", "b.html.gz", "b.html.br"):
+        elements.join(name).write_binary(b"old")
+    destination.mkdir("svg").join("b.svg").write_binary(b"svg")
+    destination.join("custom.css").write_binary(b"css")
+    stats = Counter()
+    sync_tree(str(source), str(destination), prune=["elements", "values"], stats=stats,
+              compressions=["gz"])
+    assert sorted(path.basename for path in elements.listdir()) == ["a.html", "a.html.gz"]
+    assert gzip.decompress(elements.join("a.html.gz").read_binary()) == b"a"
+    assert destination.join("svg", "b.svg").check()
+    assert destination.join("custom.css").check()
+    assert stats == Counter(written=2, deleted=3)